@@ -1,4 +1,5 @@
 import os
+import asyncio
 import google.generativeai as genai
 from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, HTTPException, Header, Query
@@ -6,15 +7,13 @@ from firebase_admin import firestore, auth
 from typing import List, Optional
 from pydantic import BaseModel
 
+from services.llm_gateway import llm_gateway
+from services.firebase_setup import async_db
+
 # ✅ CONFIGURE GEMINI (Make sure to set your API Key)
 # genai.configure(api_key="YOUR_GEMINI_API_KEY") 
 
 router = APIRouter()
-db = firestore.client()
-from firebase_admin import firestore
-
-router = APIRouter()
-db = firestore.client()
 
 class ReferralRequest(BaseModel):
     new_user_uid: str
@@ -56,8 +55,8 @@ async def verify_admin(x_user_id: str):
     if not x_user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    user_ref = db.collection("users").document(x_user_id)
-    user_doc = user_ref.get()
+    user_ref = async_db.collection("users").document(x_user_id)
+    user_doc = await user_ref.get()
 
     if not user_doc.exists:
         raise HTTPException(status_code=404, detail="User not found")
@@ -67,6 +66,11 @@ async def verify_admin(x_user_id: str):
 
     return True
 
+async def count_query(query) -> int:
+    """Server-side COUNT aggregation: one round trip, no documents transferred."""
+    result = await query.count().get()
+    return int(result[0][0].value) if result and result[0] else 0
+
 # ==========================================
 # 🏫 SCHOOLS
 # ==========================================
@@ -76,10 +80,12 @@ async def get_all_schools(x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
     schools = []
     try:
-        docs = db.collection("schools").stream()
-        for doc in docs:
+        docs = [doc async for doc in async_db.collection("schools").stream()]
+        teacher_counts = await asyncio.gather(*(
+            count_query(async_db.collection("teachers").where("schoolId", "==", doc.id)) for doc in docs
+        ))
+        for doc, teacher_count in zip(docs, teacher_counts):
             data = doc.to_dict()
-            teacher_count = len(list(db.collection("teachers").where("schoolId", "==", doc.id).stream()))
             
             created_at = data.get("createdAt", "")
             if hasattr(created_at, 'strftime'): created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
@@ -113,14 +119,14 @@ async def get_all_schools(x_user_id: str = Header(None, alias="X-User-ID")):
 @router.post("/schools/topup")
 async def top_up_school(action: SchoolTopUpRequest, x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
-    school_ref = db.collection("schools").document(action.school_id)
-    doc_snap = school_ref.get()
+    school_ref = async_db.collection("schools").document(action.school_id)
+    doc_snap = await school_ref.get()
 
     if not doc_snap.exists:
-        query = db.collection("schools").where("adminId", "==", action.school_id).stream()
-        found_docs = list(query)
+        query = async_db.collection("schools").where("adminId", "==", action.school_id).stream()
+        found_docs = [doc async for doc in query]
         if found_docs:
-            school_ref = db.collection("schools").document(found_docs[0].id)
+            school_ref = async_db.collection("schools").document(found_docs[0].id)
             doc_snap = found_docs[0]
         else:
             raise HTTPException(404, f"School with ID {action.school_id} not found")
@@ -154,7 +160,7 @@ async def top_up_school(action: SchoolTopUpRequest, x_user_id: str = Header(None
     if action.teachers_to_add is not None:
         update_data["maxTeachers"] = action.teachers_to_add
 
-    school_ref.update(update_data)
+    await school_ref.update(update_data)
     
     s_data = doc_snap.to_dict()
     return {
@@ -175,7 +181,7 @@ async def top_up_school(action: SchoolTopUpRequest, x_user_id: str = Header(None
 @router.get("/users")
 async def get_all_users(x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
-    db_docs = {d.id: d.to_dict() for d in db.collection("users").stream()}
+    db_docs = {d.id: d.to_dict() async for d in async_db.collection("users").stream()}
     auth_users = auth.list_users().iterate_all()
     users = []
     
@@ -225,14 +231,14 @@ async def top_up_user(action: UserTopUpRequest, x_user_id: str = Header(None, al
 
     new_expiry = now + timedelta(days=days_to_add)
 
-    user_ref = db.collection("users").document(action.target_uid)
-    user_doc = user_ref.get()
+    user_ref = async_db.collection("users").document(action.target_uid)
+    user_doc = await user_ref.get()
     
     user_name = "Valued Teacher"
     if user_doc.exists:
         user_name = user_doc.to_dict().get("name", "Valued Teacher")
     
-    user_ref.update({
+    await user_ref.update({
         "credits": firestore.Increment(credits),
         "is_approved": True,
         "subscriptionPlan": plan,
@@ -256,7 +262,7 @@ async def top_up_user(action: UserTopUpRequest, x_user_id: str = Header(None, al
 async def delete_user(uid: str, x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
     try:
-        db.collection("users").document(uid).delete()
+        await async_db.collection("users").document(uid).delete()
         try: auth.delete_user(uid)
         except: pass
         return {"status": "success"}
@@ -269,7 +275,6 @@ async def delete_user(uid: str, x_user_id: str = Header(None, alias="X-User-ID")
 
 async def generate_email_content(user_name: str, goal: str):
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
         prompt = f"""
         Act as a Customer Success Manager for 'BooxClash' (Education Platform).
         Write a short email to a user named '{user_name}'.
@@ -282,8 +287,7 @@ async def generate_email_content(user_name: str, goal: str):
         - Under 70 words.
         - Include a Subject line at the top.
         """
-        response = model.generate_content(prompt)
-        return response.text
+        return await llm_gateway.generate_text(prompt, label="generate_email_content")
     except Exception as e:
         print(f"AI Gen Error: {e}")
         return f"Subject: We miss you!\n\nHi {user_name},\n\nWe noticed you haven't been active lately. {goal}\n\nBest,\nBooxClash Team"
@@ -305,7 +309,7 @@ async def start_campaign(action: CampaignRequest, x_user_id: str = Header(None,
 
     for uid in action.target_uids:
         try:
-            doc = db.collection("users").document(uid).get()
+            doc = await async_db.collection("users").document(uid).get()
             if not doc.exists: continue
             
             data = doc.to_dict()
@@ -336,26 +340,29 @@ async def get_all_content(type: str = Query(...), x_user_id: str = Header(None,
     await verify_admin(x_user_id)
     cmap = {"scheme": "generated_schemes", "weekly": "generated_weekly_plans", "lesson": "generated_lesson_plans"}
     if type not in cmap: raise HTTPException(400, "Invalid content type")
-    docs = db.collection(cmap[type]).order_by("createdAt", direction=firestore.Query.DESCENDING).limit(50).stream()
-    return [{**d.to_dict(), "id": d.id, "createdAt": str(d.to_dict().get("createdAt"))} for d in docs]
+    docs = async_db.collection(cmap[type]).order_by("createdAt", direction=firestore.Query.DESCENDING).limit(50).stream()
+    return [{**d.to_dict(), "id": d.id, "createdAt": str(d.to_dict().get("createdAt"))} async for d in docs]
 
 
 @router.delete("/content/delete")
 async def delete_content(action: ContentAction, x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
-    db.collection(action.collection_name).document(action.doc_id).delete()
+    await async_db.collection(action.collection_name).document(action.doc_id).delete()
     return {"status": "success"}
 
 
 @router.get("/stats")
 async def get_stats(x_user_id: str = Header(None, alias="X-User-ID")):
     await verify_admin(x_user_id)
-    def count_collection(name): return len(list(db.collection(name).stream()))
+    users, schools, schemes, lessons = await asyncio.gather(*(
+        count_query(async_db.collection(name))
+        for name in ("users", "schools", "generated_schemes", "generated_lesson_plans")
+    ))
     return {
-        "total_users": count_collection("users"),
-        "total_schools": count_collection("schools"),
-        "total_schemes": count_collection("generated_schemes"),
-        "total_lessons": count_collection("generated_lesson_plans")
+        "total_users": users,
+        "total_schools": schools,
+        "total_schemes": schemes,
+        "total_lessons": lessons
     }
 
 @router.post("/api/reward-referral")
@@ -365,19 +372,19 @@ async def reward_referral(req: ReferralRequest):
     """
     try:
         # 1. Look up the referring user
-        referrer_ref = db.collection("users").document(req.referred_by_uid)
-        referrer_doc = referrer_ref.get()
+        referrer_ref = async_db.collection("users").document(req.referred_by_uid)
+        referrer_doc = await referrer_ref.get()
 
         if not referrer_doc.exists:
             return {"status": "ignored", "message": "Referrer not found."}
 
         # 2. Add 10 credits to the person who shared the link!
-        referrer_ref.update({
+        await referrer_ref.update({
             "credits": firestore.Increment(10)
         })
 
         # 3. (Optional) Log the referral for analytics
-        db.collection("referral_logs").add({
+        await async_db.collection("referral_logs").add({
             "referrer_uid": req.referred_by_uid,
             "new_user_uid": req.new_user_uid,
             "reward_credits": 10,
@@ -6,6 +6,8 @@ from fastapi.responses import JSONResponse
 # 🆕 Import the LLM generation function and file manager
 from services.catchup_llm import generate_catchup_lesson_plan
 from services.file_manager import save_catchup_plan
+from services.document_cache import document_cache
+from services.llm_gateway import set_request_tenant
 
 # IMPORT YOUR CREDIT CHECKER HERE
 from services.credit_manager import check_and_deduct_credit
@@ -52,9 +54,8 @@ async def get_catchup_activities(
 
     # Read and return the JSON data
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return JSONResponse(content=data)
+        data = document_cache.get(file_path)
+        return JSONResponse(content=data)
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -74,10 +75,11 @@ async def create_catchup_plan(request: Request):
         
         if not uid:
              raise HTTPException(status_code=400, detail="User ID (uid) is required to generate a plan.")
+        set_request_tenant(school_id, uid)
 
         # 0. 💰 DEDUCT CREDITS FIRST (Cost = 1)
         try:
-            credit_info = check_and_deduct_credit(uid=uid, cost=1, school_id=school_id)
+            credit_info = await check_and_deduct_credit(uid=uid, cost=1, school_id=school_id)
         except Exception as e:
             # 402 Payment Required for insufficient credits/expired sub
             raise HTTPException(status_code=402, detail=str(e))
@@ -101,7 +103,8 @@ async def create_catchup_plan(request: Request):
             attendance={"boys": data.get("boys", 0), "girls": data.get("girls", 0)},
             teacher_name=data.get("teacherName", "Class Teacher"),
             school_name=data.get("school_name", data.get("school", "Primary School")),
-            school_logo=data.get("schoolLogo", None)
+            school_logo=data.get("schoolLogo", None),
+            regenerate=bool(data.get("regenerate", False))
         )
         
         # 2. SAVE TO FIRESTORE 🔥
@@ -114,7 +117,7 @@ async def create_catchup_plan(request: Request):
                 "subject": subject_name,
                 "date": data.get("date", "")
             }
-            save_catchup_plan(uid, school_id, plan, meta_data)
+            await save_catchup_plan(uid, school_id, plan, meta_data)
         
         # 3. Return to frontend
         return {
@@ -1,13 +1,14 @@
 import os
 import httpx
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 
 # Import your custom modules
 from services.llm_exams import generate_localized_exam
 from services.file_manager import save_generated_exam
-from services.syllabus_manager import load_syllabus 
+from services.topic_tree import etag_response, syllabus_topic_list
+from services.llm_gateway import set_request_tenant
 
 # IMPORT YOUR CREDIT CHECKER HERE (Adjust the import path if you named the file differently)
 from services.credit_manager import check_and_deduct_credit
@@ -55,27 +56,16 @@ class DiagramRequest(BaseModel):
 @router.get("/topics", response_model=List[str])
 async def get_syllabus_topics(
     grade: str = Query(..., description="E.g., Grade 6"),
-    subject: str = Query(..., description="E.g., Integrated Science")
+    subject: str = Query(..., description="E.g., Integrated Science"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ):
     """
     Fetches the official syllabus topics for a given grade and subject.
+    Served from the pre-serialized per-syllabus topic list (ETag / 304).
     """
     try:
-        # Load the syllabus using your existing syllabus_manager
-        syllabus_data = load_syllabus(country="zambia", grade=grade, subject=subject)
-        
-        if not syllabus_data:
-            return []
-
-        topics_list = []
-        
-        # Safely extract topic names from the returned list of dictionaries
-        for item in syllabus_data:
-            topic_name = item.get("topic") or item.get("title") or item.get("topic_name") or item.get("name")
-            if topic_name:
-                topics_list.append(str(topic_name))
-                
-        return topics_list
+        payload = syllabus_topic_list(country="zambia", grade=grade, subject=subject)
+        return etag_response(payload, if_none_match)
 
     except Exception as e:
         print(f"❌ Error fetching topics: {e}")
@@ -91,9 +81,11 @@ async def create_exam(req: GenerateExamRequest):
     Generates a localized exam using the LLM and saves it to Firestore.
     Costs 1 Credit.
     """
+    set_request_tenant(req.school_id, req.uid)
+
     # 0. 💰 DEDUCT CREDITS FIRST (Cost = 1)
     try:
-        credit_info = check_and_deduct_credit(uid=req.uid, cost=1, school_id=req.school_id)
+        credit_info = await check_and_deduct_credit(uid=req.uid, cost=1, school_id=req.school_id)
     except Exception as e:
         # 402 Payment Required is standard for insufficient funds/credits
         raise HTTPException(status_code=402, detail=str(e)) 
@@ -111,7 +103,7 @@ async def create_exam(req: GenerateExamRequest):
             raise HTTPException(status_code=500, detail="Failed to generate exam content")
 
         # 2. Save to Firestore using your dual-save manager
-        save_success = save_generated_exam(
+        save_success = await save_generated_exam(
             uid=req.uid,
             subject=req.subject,
             grade=req.grade,
@@ -150,7 +142,7 @@ async def create_diagram(req: DiagramRequest):
     
     # 0. 💰 DEDUCT CREDITS FIRST (Cost = 5)
     try:
-        credit_info = check_and_deduct_credit(uid=req.uid, cost=5, school_id=req.school_id)
+        credit_info = await check_and_deduct_credit(uid=req.uid, cost=5, school_id=req.school_id)
     except Exception as e:
         raise HTTPException(status_code=402, detail=str(e))
 
@@ -13,8 +13,10 @@ from services.file_manager import (
     save_lesson_plan 
 )
 from services.credit_manager import check_and_deduct_credit
-from services.syllabus_manager import get_subjects_for_grade, load_syllabus, load_module
-from services.firebase_setup import db 
+from services.llm_gateway import set_request_tenant
+from services.syllabus_manager import GRADE_MAP, lookup_subjects_for_grade, load_module_ir
+from services.topic_tree import EMPTY_TOPIC_TREE, CachedPayload, etag_response, payload_response, syllabus_topic_tree
+from services.firebase_setup import async_db
 
 # Import the NEW Engine Functions
 from services.llm_teacher_engine_new import (
@@ -25,16 +27,6 @@ from services.llm_teacher_engine_new import (
 
 router = APIRouter()
 
-# ⚡️ CONFIGURATION: STRICT MAPPING
-GRADE_MAP = {
-    "grade 8": "Form 1",
-    "grade 9": "Form 2",
-    "form 3": "Grade 10",
-    "form 4": "Grade 11",
-    "form 5": "Grade 12",
-    "form 6": "Grade 13", 
-}
-
 # --- Request Models ---
 class PlanQuery(BaseModel):
     grade: str
@@ -53,6 +45,7 @@ class NotesRequest(BaseModel):
     topic: str
     subtopic: str
     uid: Optional[str] = None
+    regenerate: bool = False  # skip the response cache
 
 # ==========================================
 # 🚀 ENDPOINTS
@@ -66,10 +59,10 @@ async def get_weekly_plan(
     print(f"📂 Requesting Local Weekly Plan: {query.subject} Grade {query.grade} Week {query.weekNumber}")
     uid = x_user_id if x_user_id else "default_user"
     
-    data = load_weekly_plan(uid=uid, subject=query.subject, grade=query.grade, term=query.term, week=query.weekNumber)
+    data = await load_weekly_plan(uid=uid, subject=query.subject, grade=query.grade, term=query.term, week=query.weekNumber)
 
     if not data and uid != "default_user":
-        data = load_weekly_plan(uid="default_user", subject=query.subject, grade=query.grade, term=query.term, week=query.weekNumber)
+        data = await load_weekly_plan(uid="default_user", subject=query.subject, grade=query.grade, term=query.term, week=query.weekNumber)
 
     if not data:
         raise HTTPException(status_code=404, detail="Weekly Plan file not found locally.")
@@ -81,21 +74,9 @@ async def get_weekly_plan(
 async def get_subjects_endpoint(grade: str):
     """
     Handles fetching subjects with strict curriculum mapping.
+    Served from the precomputed grade -> subjects index (GRADE_MAP applied).
     """
-    normalized_key = grade.lower().strip()
-    target_grade = grade 
-
-    if normalized_key in GRADE_MAP:
-        mapped_grade = GRADE_MAP[normalized_key]
-        print(f"🔄 Mapping Request '{grade}' -> '{mapped_grade}' (File System Source)")
-        target_grade = mapped_grade
-    
-    subjects = get_subjects_for_grade(target_grade)
-    
-    if not subjects:
-        if target_grade != grade:
-             print(f"⚠️ Target '{target_grade}' empty. Retrying original '{grade}'...")
-             subjects = get_subjects_for_grade(grade)
+    target_grade, subjects = lookup_subjects_for_grade(grade)
 
     if not subjects:
         return {"subjects": [], "message": f"No syllabus files found for {grade} (checked {target_grade})"}
@@ -103,115 +84,35 @@ async def get_subjects_endpoint(grade: str):
     return {"subjects": subjects}
 
 
+def _syllabus_topics_payload(country: str, grade: str, subject: str) -> CachedPayload:
+    try:
+        return syllabus_topic_tree(country, grade, subject)
+    except Exception as e:
+        print(f"❌ Error fetching syllabus topics: {e}")
+        return EMPTY_TOPIC_TREE
+
+
 @router.post("/get-syllabus-topics")
 async def get_syllabus_topics(request: SyllabusTopicsRequest):
     """
     Returns a structured list of Topics and Subtopics from the JSON syllabus.
     Now aggregates duplicate topic titles into single entries.
-    """
-    try:
-        normalized_key = request.grade.lower().strip()
-        target_grade = GRADE_MAP.get(normalized_key, request.grade)
 
-        syllabus_data = load_syllabus(request.country, target_grade, request.subject)
-        
-        if not syllabus_data:
-            return {"topics": []}
+    The aggregated tree is built once per syllabus version and served as
+    pre-serialized JSON. Use the GET route to get an ETag / 304.
+    """
+    return payload_response(_syllabus_topics_payload(request.country, request.grade, request.subject))
 
-        topics_list = []
-        
-        # Handle different root structures
-        if isinstance(syllabus_data, list):
-            topics_list = syllabus_data
-        elif isinstance(syllabus_data, dict):
-            topics_list = (
-                syllabus_data.get("topics") or 
-                syllabus_data.get("content") or 
-                syllabus_data.get("units") or 
-                syllabus_data.get("topic_title") or
-                []
-            )
-
-        # ---------------------------------------------------------
-        # 🔄 AGGREGATION LOGIC: Use a dictionary to merge duplicates
-        # ---------------------------------------------------------
-        topics_map = {}  # Key: Topic Title, Value: Topic Dict
-
-        for item in topics_list:
-            if not isinstance(item, dict): continue
-
-            # 1. Extract Title
-            title = (
-                item.get("topic_title") or 
-                item.get("title") or 
-                item.get("theme") or 
-                item.get("unit_title") or 
-                item.get("name") or 
-                item.get("unit") or 
-                item.get("section") or
-                item.get("main_topic") or
-                item.get("subtopic_title")
-            )
-            
-            if not title or not isinstance(title, str):
-                title = "General Topic"
-            
-            title = title.strip() # Normalize title
-
-            # 2. Extract Subtopics
-            raw_subtopics = (
-                item.get("subtopics") or 
-                item.get("content") or 
-                item.get("specific_outcomes") or 
-                item.get("outcomes") or
-                item.get("objectives") or 
-                item.get("children") or
-                item.get("lessons") or
-                []
-            )
-            
-            clean_subtopics = []
-            if isinstance(raw_subtopics, list):
-                for sub in raw_subtopics:
-                    text = ""
-                    if isinstance(sub, str):
-                        text = sub
-                    elif isinstance(sub, dict):
-                        text = (
-                            sub.get("content") or 
-                            sub.get("topic") or 
-                            sub.get("title") or 
-                            sub.get("subtopic") or
-                            sub.get("outcome") or
-                            sub.get("subtopic_title") or
-                            sub.get("description") # Added for specific_outcomes
-                        )
-                    
-                    if text:
-                        clean_subtopics.append(str(text))
-
-            # 3. Merge or Create
-            if title in topics_map:
-                # If topic exists, extend subtopics (avoiding duplicates)
-                current_subs = set(topics_map[title]["subtopics"])
-                for s in clean_subtopics:
-                    if s not in current_subs:
-                        topics_map[title]["subtopics"].append(s)
-                        current_subs.add(s)
-            else:
-                # If topic is new, create entry
-                if title != "General Topic" or clean_subtopics:
-                     topics_map[title] = {
-                        "title": title,
-                        "subtopics": clean_subtopics
-                    }
-
-        # Convert map back to list
-        return {"topics": list(topics_map.values())}
 
-    except Exception as e:
-        print(f"❌ Error fetching syllabus topics: {e}")
-        return {"topics": []}
+@router.get("/get-syllabus-topics")
+async def get_syllabus_topics_cached(
+    grade: str,
+    subject: str,
+    country: str = "Zambia",
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """Same tree as the POST route, with an ETag (304 when the client already has this version)."""
+    return etag_response(_syllabus_topics_payload(country, grade, subject), if_none_match)
 # ✅ NEW ENDPOINT: GENERATE LESSON NOTES
 @router.post("/new/generate-lesson-notes")
 async def generate_lesson_notes_endpoint(request: NotesRequest):
@@ -219,6 +120,7 @@ async def generate_lesson_notes_endpoint(request: NotesRequest):
     Generates Blackboard Notes for a specific lesson topic/subtopic.
     """
     print(f"📝 Generating Notes for: {request.topic} -> {request.subtopic}")
+    set_request_tenant(uid=request.uid)
     
     try:
         # 1. Load Module Data (if available)
@@ -226,7 +128,7 @@ async def generate_lesson_notes_endpoint(request: NotesRequest):
         normalized_key = request.grade.lower().strip()
         target_grade = GRADE_MAP.get(normalized_key, request.grade)
         
-        module_data = load_module("Zambia", target_grade, request.subject)
+        module_data = load_module_ir("Zambia", target_grade, request.subject)
 
         # 2. Call LLM Service
         notes_content = await generate_lesson_notes(
@@ -234,7 +136,8 @@ async def generate_lesson_notes_endpoint(request: NotesRequest):
             subject=request.subject,
             topic=request.topic,
             subtopic=request.subtopic,
-            module_data=module_data
+            module_data=module_data,
+            regenerate=request.regenerate
         )
         
         return {"status": "success", "data": notes_content}
@@ -300,20 +203,18 @@ async def get_analytics_dashboard(
 
         # 2. Helper function to fetch from a specific collection
         async def fetch_collection(collection_name, doc_type_label):
-            ref = db.collection(collection_name)
+            ref = async_db.collection(collection_name)
             query = ref.where('timestamp', '>=', start_date)
             
             # Filter by School ID if provided
             if x_school_id:
                 query = query.where('schoolId', '==', x_school_id)
             
-            # Execute Query
-            # Note: In synchronous Python with Firebase Admin, .stream() is blocking.
-            # We run it in a thread or just execute linearly for simplicity.
+            # Execute Query (async client: the three collections load concurrently)
             docs = query.stream()
             
             results = []
-            for doc in docs:
+            async for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
                 data['type'] = doc_type_label # Manually tag the type based on collection
@@ -330,22 +231,24 @@ async def get_analytics_dashboard(
                 results.append(data)
             return results
 
-        # 3. Fetch Data from ALL 3 Collections
+        # 3. Fetch Data from ALL 3 Collections (plus the school doc) concurrently
         # We assume your collections are named exactly as shown in your screenshot
-        plans_task = fetch_collection('generated_lesson_plans', 'lesson')
-        schemes_task = fetch_collection('generated_schemes', 'scheme')
-        weekly_task = fetch_collection('generated_weekly_plans', 'weekly')
-
-        # Run them (Linear execution is safer for Firebase Admin SDK threads)
-        raw_logs = []
-        raw_logs.extend(await plans_task)
-        raw_logs.extend(await schemes_task)
-        raw_logs.extend(await weekly_task)
+        async def fetch_school():
+            if not x_school_id:
+                return None
+            return await async_db.collection('schools').document(x_school_id).get()
+
+        plans, schemes, weekly, school_doc = await asyncio.gather(
+            fetch_collection('generated_lesson_plans', 'lesson'),
+            fetch_collection('generated_schemes', 'scheme'),
+            fetch_collection('generated_weekly_plans', 'weekly'),
+            fetch_school(),
+        )
+        raw_logs = plans + schemes + weekly
 
-        # 4. Fetch School Credits (New!)
+        # 4. School Credits (New!)
         current_credits = "N/A"
-        if x_school_id:
-            school_doc = db.collection('schools').document(x_school_id).get()
+        if school_doc is not None:
             if school_doc.exists:
                 current_credits = school_doc.to_dict().get('credits', 0)
 
@@ -9,6 +9,10 @@ from fastapi import APIRouter, HTTPException, UploadFile, File # 👈 Added Uplo
 from pydantic import BaseModel
 import google.generativeai as genai
 
+from services.llm_gateway import llm_gateway, set_request_tenant
+from services.llm_cache import llm_cache
+from services.blocking_io import run_blocking
+
 # ==========================================
 # ROUTER (NO PREFIX HERE — defined in main.py)
 # ==========================================
@@ -21,6 +25,9 @@ router = APIRouter(tags=["School Based Assessments"])
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+# Bump when the SBA prompt changes so cached tasks stop matching
+SBA_PROMPT_VERSION = "1"
+
 # Base directory → /backend
 BASE_DIR = Path(__file__).resolve().parent.parent
 SBA_DATA_DIR = BASE_DIR / "sba"
@@ -29,12 +36,16 @@ SBA_DATA_DIR = BASE_DIR / "sba"
 # OPTIONAL SYLLABUS LOADER
 # ==========================================
 
+from services.document_cache import document_cache
+
 try:
-    from services.syllabus_manager import load_syllabus
+    from services.syllabus_manager import load_syllabus_ir
 except ImportError:
-    def load_syllabus(country, grade, subject):
+    def load_syllabus_ir(country, grade, subject):
         return None
 
+from services.prompt_context import ContextBuilder, rank_by_relevance
+
 # ==========================================
 # MODELS
 # ==========================================
@@ -47,6 +58,9 @@ class GenerateSBARequest(BaseModel):
     task_type: str
     max_score: int
     specific_topic: Optional[str] = None
+    regenerate: bool = False  # skip the response cache
+    uid: Optional[str] = None  # queue the Gemini call under the teacher / school
+    schoolId: Optional[str] = None
 
 
 class RubricItem(BaseModel):
@@ -92,8 +106,7 @@ async def get_sba_config(level: str):
         )
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return document_cache.get(file_path)
 
     except json.JSONDecodeError:
         raise HTTPException(
@@ -128,8 +141,7 @@ async def get_subject_syllabus(subject: str):
         }
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return document_cache.get(file_path)
 
     except json.JSONDecodeError:
         raise HTTPException(
@@ -169,26 +181,25 @@ async def get_available_secondary_subjects(grade: str):
                 
             print(f"📄 [SBA Subjects] Checking file: {file.name}...")
             try:
-                with open(file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    
-                    # Ensure data is a dictionary and has the 'grades' key
-                    if isinstance(data, dict) and "grades" in data:
-                        found_in_file = False
-                        for g in data["grades"]:
-                            # Force both to string to prevent 10 != "10" bugs
-                            if str(g.get("grade")) == target_grade_str:
-                                # Found it! Format name: "computer_studies" -> "Computer Studies"
-                                formatted_name = file.stem.replace("-", " ").replace("_", " ").title()
-                                subjects.append(formatted_name)
-                                print(f"   ✅ MATCH FOUND! Added subject: '{formatted_name}'")
-                                found_in_file = True
-                                break # Move to the next file once found
-                                
-                        if not found_in_file:
-                            print(f"   ❌ Grade {target_grade_str} not found in {file.name}")
-                    else:
-                        print(f"   ⚠️ Skipping {file.name}: Invalid format or missing 'grades' array.")
+                data = document_cache.get(file)
+                
+                # Ensure data is a dictionary and has the 'grades' key
+                if isinstance(data, dict) and "grades" in data:
+                    found_in_file = False
+                    for g in data["grades"]:
+                        # Force both to string to prevent 10 != "10" bugs
+                        if str(g.get("grade")) == target_grade_str:
+                            # Found it! Format name: "computer_studies" -> "Computer Studies"
+                            formatted_name = file.stem.replace("-", " ").replace("_", " ").title()
+                            subjects.append(formatted_name)
+                            print(f"   ✅ MATCH FOUND! Added subject: '{formatted_name}'")
+                            found_in_file = True
+                            break # Move to the next file once found
+                            
+                    if not found_in_file:
+                        print(f"   ❌ Grade {target_grade_str} not found in {file.name}")
+                else:
+                    print(f"   ⚠️ Skipping {file.name}: Invalid format or missing 'grades' array.")
                             
             except Exception as e:
                 print(f"   💥 Error reading syllabus file {file.name}: {e}")
@@ -204,20 +215,25 @@ async def get_available_secondary_subjects(grade: str):
 
 @router.post("/generate", response_model=GenerateSBAResponse)
 async def generate_sba_task(request: GenerateSBARequest):
+    set_request_tenant(request.schoolId, request.uid)
     try:
-        syllabus_data = load_syllabus(
+        syllabus = load_syllabus_ir(
             request.country,
             request.grade,
             request.subject
         )
 
-        syllabus_context = (
-            json.dumps(syllabus_data)[:10000]
-            if syllabus_data
-            else "Use ECZ curriculum standards."
-        )
-
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        syllabus_context = "Use ECZ curriculum standards."
+        if syllabus and syllabus.topics:
+            # Topics closest to the task first, packed whole into the SBA token budget
+            context_builder = ContextBuilder("sba")
+            for topic in rank_by_relevance(syllabus.topics, request.specific_topic or request.task_title, lambda t: t.title):
+                context_builder.add(
+                    {"unit": topic.unit, "topic": topic.title, "subtopics": topic.content, "outcomes": topic.outcomes},
+                    {"unit": topic.unit, "topic": topic.title, "subtopics": [sub.title for sub in topic.subtopics]},
+                    {"unit": topic.unit, "topic": topic.title},
+                )
+            syllabus_context = context_builder.build().text
 
         prompt = f"""
 You are an expert Zambian Examinations Council (ECZ) Examiner.
@@ -249,21 +265,30 @@ Respond ONLY with a valid JSON object in this format:
 }}
 """
 
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                response_mime_type="application/json"
+        async def _generate():
+            response = await llm_gateway.generate(
+                prompt,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json"
+                ),
+                label="generate_sba_task"
             )
-        )
 
-        try:
-            parsed = json.loads(response.text)
-            return parsed
-        except Exception:
-            raise HTTPException(
-                status_code=500,
-                detail="Gemini returned invalid JSON."
-            )
+            try:
+                return json.loads(response.text)
+            except Exception:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Gemini returned invalid JSON."
+                )
+
+        return await llm_cache.get_or_generate(
+            "sba_task", SBA_PROMPT_VERSION,
+            {"grade": request.grade, "subject": request.subject, "title": request.task_title,
+             "type": request.task_type, "max_score": request.max_score, "syllabus": syllabus_context},
+            _generate,
+            regenerate=request.regenerate,
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -273,6 +298,16 @@ Respond ONLY with a valid JSON object in this format:
 # 4️⃣ EXTRACT ROSTER FROM PDF (USING GEMINI)
 # ==========================================
 
+def _extract_pdf_text(file_bytes: bytes) -> str:
+    raw_text = ""
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        for page in pdf.pages:
+            extracted = page.extract_text()
+            if extracted:
+                raw_text += extracted + "\n"
+    return raw_text
+
+
 @router.post("/extract-roster")
 async def extract_roster(file: UploadFile = File(...)):
     """
@@ -285,20 +320,14 @@ async def extract_roster(file: UploadFile = File(...)):
     try:
         # 1. Read PDF into memory
         file_bytes = await file.read()
-        raw_text = ""
 
-        # 2. Extract text from PDF pages
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    raw_text += extracted + "\n"
+        # 2. Extract text from PDF pages (pdfplumber is CPU-bound and sync: off the event loop)
+        raw_text = await run_blocking(_extract_pdf_text, file_bytes)
 
         if not raw_text.strip():
             raise HTTPException(status_code=400, detail="Could not extract any text from the PDF. It might be an image-based scanned document.")
 
         # 3. Use Gemini to perfectly parse the names from the messy text
-        model = genai.GenerativeModel("gemini-2.5-flash")
         prompt = f"""
         Extract a list of student names from the following raw PDF text. 
         This text is from a school class roster. 
@@ -310,11 +339,12 @@ async def extract_roster(file: UploadFile = File(...)):
         {raw_text[:15000]} 
         """
 
-        response = model.generate_content(
+        response = await llm_gateway.generate(
             prompt,
             generation_config=genai.GenerationConfig(
                 response_mime_type="application/json"
-            )
+            ),
+            label="extract_roster"
         )
 
         # 4. Parse Gemini's JSON response
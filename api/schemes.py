@@ -10,6 +10,7 @@ from services.llm_teacher_engine_old import generate_scheme_with_ai
 from services.syllabus_manager import load_syllabus
 from services.file_manager import save_generated_scheme
 from services.credit_manager import check_and_deduct_credit
+from services.llm_gateway import set_request_tenant
 
 router = APIRouter()
 
@@ -50,11 +51,12 @@ async def generate_scheme(
     x_user_id: str = Header(None, alias="X-User-ID")
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
+    set_request_tenant(uid=request.uid)
     print(f"📅 GENERATING SCHEME | User: {user_id} | Subject: {request.subject}")
 
     # 1. CREDIT CHECK
     try:
-        check_and_deduct_credit(user_id)
+        await check_and_deduct_credit(user_id)
     except Exception as e:
         print(f"⛔ Credit Check Failed: {e}")
         raise HTTPException(status_code=403, detail=str(e))
@@ -120,7 +122,7 @@ async def generate_scheme(
             structured_rows.append(row)
 
         # 5. SAVE HISTORY
-        save_generated_scheme(
+        await save_generated_scheme(
             uid=user_id,
             subject=request.subject,
             grade=request.grade,
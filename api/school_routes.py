@@ -2,7 +2,6 @@ import traceback
 import re
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Request
-from firebase_admin import firestore
 from pydantic import BaseModel
 from typing import Optional, List, Any, Dict
 from jinja2 import Environment, BaseLoader
@@ -27,7 +26,7 @@ from services.llm_teacher_engine_old import (
 )
 
 # Services: Content & Database
-from services.syllabus_manager import load_syllabus, load_module
+from services.syllabus_manager import load_syllabus_ir, load_module_ir
 from services.file_manager import (
     save_generated_scheme, 
     load_generated_scheme,
@@ -35,9 +34,11 @@ from services.file_manager import (
     save_lesson_plan
 )
 from services.credit_manager import check_and_deduct_credit
+from services.llm_gateway import set_request_tenant
+from services.scheme_cache import scheme_cache, ANY_TEACHER
+from services.firebase_setup import async_db
 
 router = APIRouter()
-db = firestore.client()
 
 # ==========================================
 # 📦 MODELS (Unchanged)
@@ -99,18 +100,26 @@ def get_curriculum_type(grade: str) -> str:
     g = str(grade).strip().lower().replace("grade", "").strip()
     return 'old' if g in ["10", "11", "12", "gce"] else 'new'
 
-def get_best_available_scheme(user_id: str, subject: str, grade: str, term: str):
-    user_scheme = load_generated_scheme(user_id, subject, grade, term)
+async def _query_any_teacher_scheme(subject: str, grade: str, term: str):
+    docs = async_db.collection("generated_schemes")\
+        .where("subject", "==", subject)\
+        .where("grade", "==", grade)\
+        .where("term", "==", term)\
+        .limit(1).stream()
+    async for doc in docs: return doc.to_dict()
+    return None
+
+async def get_best_available_scheme(user_id: str, subject: str, grade: str, term: str) -> List[Dict[str, Any]]:
+    """The teacher's latest scheme rows, else any teacher's for the same subject/grade/term (both cached)."""
+    user_scheme = await load_generated_scheme(user_id, subject, grade, term)
     if user_scheme: return user_scheme
     try:
-        docs = db.collection("generated_schemes")\
-            .where("subject", "==", subject)\
-            .where("grade", "==", grade)\
-            .where("term", "==", term)\
-            .limit(1).stream()
-        for doc in docs: return doc.to_dict()
+        return await scheme_cache.get_or_load(
+            scheme_cache.key(ANY_TEACHER, subject, grade, term),
+            lambda: _query_any_teacher_scheme(subject, grade, term),
+        )
     except: pass
-    return None
+    return []
 
 # ==========================================
 # 🏗️ BACKGROUND TASKS
@@ -158,18 +167,20 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
     req_girls = req_data.get("girls", 0)
 
     print(f"🚀 SCHOOL ROUTE: Processing '{doc_type.upper()}' | Grade: {req_grade} | School: {req_school_id}")
+    # Not req_uid: "default_user" would put every caller without a uid in one lane
+    set_request_tenant(req_school_id, req_data.get("uid"))
 
     # Fetch School Data
     school_name = "School"
     school_data = {}
     if req_school_id:
-        doc = db.collection("schools").document(req_school_id).get()
+        doc = await async_db.collection("schools").document(req_school_id).get()
         if doc.exists:
             school_data = doc.to_dict()
             school_name = school_data.get("schoolName", "School")
     
     try:
-        check_and_deduct_credit(req_uid, cost=1, school_id=req_school_id)
+        await check_and_deduct_credit(req_uid, cost=1, school_id=req_school_id)
     except Exception: pass
 
     # =========================================================
@@ -207,11 +218,11 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
             save_payload = {**content_data, "custom_html": final_html}
             
             if doc_type == "scheme":
-                save_generated_scheme(req_uid, req_subject, req_grade, req_term, school_name, save_payload, req_school_id)
+                await save_generated_scheme(req_uid, req_subject, req_grade, req_term, school_name, save_payload, req_school_id)
             elif doc_type == "weekly":
-                save_weekly_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, save_payload, req_school_id)
+                await save_weekly_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, save_payload, req_school_id)
             else: 
-                save_lesson_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, save_payload, req_school_id)
+                await save_lesson_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, save_payload, req_school_id)
 
             return { "type": "custom_html", "school_name": school_name, "html": final_html }
         except Exception as e:
@@ -228,7 +239,7 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
     try:
         # -------------------- SCHEME --------------------
         if doc_type == "scheme":
-            syllabus_data = load_syllabus("Zambia", req_grade, req_subject) if curr_type == 'new' else []
+            syllabus_data = load_syllabus_ir("Zambia", req_grade, req_subject) if curr_type == 'new' else []
             
             if curr_type == 'new':
                 result_data = await generate_new_scheme(
@@ -243,14 +254,13 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
 
             if isinstance(result_data, dict):
                 if "rows" not in result_data and "weeks" in result_data: result_data["rows"] = result_data["weeks"]
-                save_generated_scheme(req_uid, req_subject, req_grade, req_term, school_name, result_data, req_school_id)
+                await save_generated_scheme(req_uid, req_subject, req_grade, req_term, school_name, result_data, req_school_id)
 
         # -------------------- WEEKLY --------------------
         elif doc_type == "weekly":
             if curr_type == 'new':
-                scheme_context = get_best_available_scheme(req_uid, req_subject, req_grade, req_term)
-                scheme_rows = scheme_context.get("rows") or scheme_context.get("schemeData") or [] if isinstance(scheme_context, dict) else []
-                module_data = load_module("Zambia", req_grade, req_subject)
+                scheme_rows = await get_best_available_scheme(req_uid, req_subject, req_grade, req_term)
+                module_data = load_module_ir("Zambia", req_grade, req_subject)
                 
                 result_data = await generate_new_weekly(
                     school=school_name, subject=req_subject, grade=req_grade,
@@ -265,12 +275,12 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
                 )
             
             if isinstance(result_data, dict):
-                save_weekly_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, result_data, req_school_id)
+                await save_weekly_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, result_data, req_school_id)
 
         # -------------------- LESSON --------------------
         else: 
             if curr_type == 'new':
-                module = load_module("Zambia", req_grade, req_subject)
+                module = load_module_ir("Zambia", req_grade, req_subject)
                 result_data = await generate_new_lesson(
                     grade=req_grade, subject=req_subject, theme=req_topic,
                     subtopic=req_subtopic, objectives=req_objectives, date=req_date or "2026-01-01",
@@ -289,7 +299,7 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
             
             if not isinstance(result_data, dict):
                 raise HTTPException(status_code=422, detail="Unable to generate content. Please check the Topic/Subtopic.")
-            save_lesson_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, result_data, req_school_id)
+            await save_lesson_plan(req_uid, req_subject, req_grade, req_term, req_week, school_name, result_data, req_school_id)
 
         # ✅ FIX: RETURN FLATTENED DATA FOR FRONTEND
         # If the result is a dict, return it directly so frontend sees { "header": ..., "steps": ... }
@@ -307,7 +317,7 @@ async def generate_for_school(request: Any, school_id: Optional[str] = None):
 
 @router.post("/update-settings")
 async def update_school_settings(payload: SchoolSettingsUpdate, background_tasks: BackgroundTasks):
-    db.collection("schools").document(payload.school_id).set({
+    await async_db.collection("schools").document(payload.school_id).set({
         "schoolName": payload.school_name, 
         "branding": payload.branding.dict(), 
         "templates": payload.templates.dict()
@@ -317,5 +327,5 @@ async def update_school_settings(payload: SchoolSettingsUpdate, background_tasks
 
 @router.get("/get-settings/{school_id}")
 async def get_school_settings(school_id: str):
-    doc = db.collection("schools").document(school_id).get()
+    doc = await async_db.collection("schools").document(school_id).get()
     return doc.to_dict() if doc.exists else {}
\ No newline at end of file
@@ -6,6 +6,8 @@ from fastapi import APIRouter, Header, HTTPException, UploadFile, File
 from pydantic import BaseModel
 from typing import Optional
 from firebase_admin import firestore
+from services.blocking_io import run_blocking
+from services.firebase_setup import async_db
 
 # --- 1. CONFIGURATION ---
 # Safely load credentials from environment variables
@@ -17,7 +19,6 @@ cloudinary.config(
 )
 
 router = APIRouter()
-db = firestore.client()
 
 # --- 2. UPLOAD ENDPOINT (With Auto-Resizing) ---
 @router.post("/upload")
@@ -33,7 +34,8 @@ async def upload_to_cloudinary(file: UploadFile = File(...)):
 
         # Upload the file directly from the request stream
         # 'transformation' resizes the image to fit within 400x400px without cropping/cutting parts off
-        result = cloudinary.uploader.upload(
+        result = await run_blocking(
+            cloudinary.uploader.upload,
             file.file, 
             folder="school_assets",
             transformation=[
@@ -77,10 +79,10 @@ async def update_school_settings(
     print(f"⚙️ SAVING | School: {settings.school_id}")
 
     try:
-        school_ref = db.collection("schools").document(settings.school_id)
+        school_ref = async_db.collection("schools").document(settings.school_id)
         
         # Merge=True updates only the fields we send, keeping others safe
-        school_ref.set({
+        await school_ref.set({
             "schoolName": settings.school_name,
             "branding": settings.branding.dict(),
             "customTemplates": settings.templates.dict() if settings.templates else {},
@@ -1,4 +1,5 @@
 import re
+import asyncio
 import traceback
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Header, HTTPException
@@ -21,7 +22,7 @@ from services.llm_teacher_engine_new import (
 )
 
 # Services: Content Loading
-from services.syllabus_manager import load_syllabus, load_module
+from services.syllabus_manager import load_syllabus_ir, load_module_ir
 
 # Services: Database
 from services.file_manager import (
@@ -32,9 +33,11 @@ from services.file_manager import (
     save_record_of_work 
 )
 from services.credit_manager import check_and_deduct_credit
+from services.llm_gateway import set_request_tenant
+from services.sse_stream import sse_response
+from services.locked_templates import get_locked_template, capture_teacher_edit
 
 router = APIRouter()
-db = firestore.client()
 
 # ==========================================
 # 📌 REQUEST MODELS
@@ -46,6 +49,7 @@ class LessonNotesRequest(BaseModel):
     topic: str
     subtopic: str
     schoolId: Optional[str] = None
+    regenerate: bool = False  # skip the response cache
 
 class WeeklyPlanRequest(BaseModel):
     uid: Optional[str] = None
@@ -118,6 +122,7 @@ class ChalkboardDiagramRequest(BaseModel):
     prompt: str 
     lesson_id: Optional[str] = None
     schoolId: Optional[str] = None # Added for school credit support
+    regenerate: bool = False  # skip the response cache
 
 # 🆕 NEW: EVALUATION REQUEST
 class LessonEvaluationRequest(BaseModel):
@@ -156,49 +161,13 @@ def get_week_metadata(start_date_str: str | None, week_index: int):
 def resolve_user_id(x_user_id: str | None, payload_uid: str | None) -> str:
     return x_user_id or payload_uid or "default_user"
 
-def get_best_available_scheme(user_id: str, subject: str, grade: str, term: str):
-    user_scheme = load_generated_scheme(user_id, subject, grade, term)
-    if user_scheme: return user_scheme
-    
-    try:
-        docs = db.collection("generated_schemes")\
-            .where("userId", "==", user_id)\
-            .where("subject", "==", subject)\
-            .where("grade", "==", grade)\
-            .where("term", "==", term)\
-            .order_by("createdAt", direction=firestore.Query.DESCENDING)\
-            .limit(1)\
-            .stream()
-            
-        for doc in docs: 
-            return doc.to_dict()
-    except Exception as e: 
-        print(f"⚠️ Warning: Could not fetch scheme context: {e}")
-    return None
+async def get_best_available_scheme(user_id: str, subject: str, grade: str, term: str) -> List[Dict[str, Any]]:
+    """Rows of the teacher's latest scheme, read through services.scheme_cache ([] if there is none)."""
+    return await load_generated_scheme(user_id, subject, grade, term)
 
-def get_locked_template_context(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
+async def get_locked_template_context(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
     try:
-        flywheel_ref = db.collection("ai_training_flywheel")
-        query = (flywheel_ref
-                 .where("uid", "==", uid)
-                 .where("plan_type", "==", plan_type)
-                 .where("grade", "==", grade)
-                 .where("subject", "==", subject))
-        
-        docs = query.stream()
-        
-        for doc in docs:
-            data = doc.to_dict()
-            human_data = data.get("final_human_data", {})
-            
-            if human_data.get("isLocked") is True:
-                print(f"🔒 FOUND LOCKED TEMPLATE for {uid} -> {plan_type} ({subject})")
-                return {
-                    "customColumns": human_data.get("columns", []),
-                    "templateRows": human_data.get("rows", human_data.get("days", human_data.get("steps", [])))
-                }
-                
-        return None
+        return await get_locked_template(uid, plan_type, grade, subject)
     except Exception as e:
         print(f"⚠️ Error fetching locked template: {e}")
         return None
@@ -208,24 +177,17 @@ def get_locked_template_context(uid: str, plan_type: str, grade: str, subject: s
 # 🚀 ROUTES
 # ==========================================
 
-@router.post("/generate-scheme")
-async def generate_scheme(
-    request: SchemeRequest,
-    x_user_id: str = Header(None, alias="X-User-ID"),
-    x_school_id: str = Header(None, alias="X-School-ID") 
-):
-    user_id = resolve_user_id(x_user_id, request.uid)
-    school_id = x_school_id or getattr(request, "schoolId", None)
-
+async def build_scheme_document(request: SchemeRequest, user_id: str, school_id: Optional[str], events=None) -> Dict[str, Any]:
+    """Credits, generation, validation and persistence for /generate-scheme and its /stream variant."""
     print(f"📅 GENERATING SCHEME | User: {user_id} | School: {school_id} | Subject: {request.subject}")
     
     try:
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
     except Exception as e:
         raise HTTPException(status_code=403, detail=str(e))
 
-    real_syllabus_data = load_syllabus(country="Zambia", grade=request.grade, subject=request.subject)
-    locked_context = get_locked_template_context(user_id, "scheme_of_work", request.grade, request.subject)
+    real_syllabus_data = load_syllabus_ir(country="Zambia", grade=request.grade, subject=request.subject)
+    locked_context = await get_locked_template_context(user_id, "scheme_of_work", request.grade, request.subject)
 
     try:
         ai_result = await generate_scheme_with_ai(
@@ -235,7 +197,8 @@ async def generate_scheme(
             term=request.term,
             num_weeks=request.weeks,
             start_date=request.startDate or "2026-01-13",
-            locked_context=locked_context
+            locked_context=locked_context,
+            events=events
         )
 
         intro_data = ai_result.get("intro_info", {})
@@ -287,7 +250,9 @@ async def generate_scheme(
 
         final_response = SchemeResponse(intro=intro_data, rows=structured_rows)
 
-        save_generated_scheme(
+        if events:
+            events.progress("saving")
+        await save_generated_scheme(
             uid=user_id, 
             subject=request.subject, 
             grade=request.grade,
@@ -308,33 +273,44 @@ async def generate_scheme(
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@router.post("/generate-weekly-plan")
-async def generate_weekly(
-    request: WeeklyPlanRequest,
+@router.post("/generate-scheme")
+async def generate_scheme(
+    request: SchemeRequest,
     x_user_id: str = Header(None, alias="X-User-ID"),
     x_school_id: str = Header(None, alias="X-School-ID") 
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
-    school_id = x_school_id or request.schoolId 
+    school_id = x_school_id or getattr(request, "schoolId", None)
+    set_request_tenant(school_id, request.uid)
+    return await build_scheme_document(request, user_id, school_id)
+
+
+@router.post("/generate-scheme/stream")
+async def generate_scheme_stream(
+    request: SchemeRequest,
+    x_user_id: str = Header(None, alias="X-User-ID"),
+    x_school_id: str = Header(None, alias="X-School-ID") 
+):
+    """SSE variant: progress, each scheme week as it is written, then the validated scheme."""
+    user_id = resolve_user_id(x_user_id, request.uid)
+    school_id = x_school_id or getattr(request, "schoolId", None)
+    set_request_tenant(school_id, request.uid)
+    return sse_response(lambda events: build_scheme_document(request, user_id, school_id, events))
 
+
+async def build_weekly_plan_document(request: WeeklyPlanRequest, user_id: str, school_id: Optional[str], events=None) -> Dict[str, Any]:
+    """Credits, generation and persistence for /generate-weekly-plan and its /stream variant."""
     print(f"📅 WEEKLY PLAN | User: {user_id} | Week {request.weekNumber} | Topic: {request.topic}")
 
-    scheme_context = get_best_available_scheme(user_id, request.subject, request.grade, request.term)
-    
-    scheme_rows = []
-    if scheme_context:
-        if isinstance(scheme_context, list):
-            scheme_rows = scheme_context
-        elif isinstance(scheme_context, dict):
-            scheme_rows = scheme_context.get("schemeData", {}).get("rows", []) or \
-                          scheme_context.get("rows", []) or \
-                          scheme_context.get("weeks", [])
-
-    module_data = load_module(country="Zambia", grade=request.grade, subject=request.subject)
-    locked_context = get_locked_template_context(user_id, "weekly_forecast", request.grade, request.subject)
+    scheme_rows, locked_context = await asyncio.gather(
+        get_best_available_scheme(user_id, request.subject, request.grade, request.term),
+        get_locked_template_context(user_id, "weekly_forecast", request.grade, request.subject),
+    )
+
+    module_data = load_module_ir(country="Zambia", grade=request.grade, subject=request.subject)
 
     try:
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
         
         plan = await generate_weekly_plan_from_scheme(
             school=request.school,
@@ -349,7 +325,8 @@ async def generate_weekly(
             school_logo=request.schoolLogo,
             manual_topic=request.topic, 
             manual_subtopic=request.lessonTitle,
-            locked_context=locked_context 
+            locked_context=locked_context,
+            events=events
         )
 
         if request.topic:
@@ -358,7 +335,9 @@ async def generate_weekly(
         if request.lessonTitle:
             plan["meta"]["sub_topic"] = request.lessonTitle
         
-        save_weekly_plan(
+        if events:
+            events.progress("saving")
+        await save_weekly_plan(
             uid=user_id, 
             subject=request.subject, 
             grade=request.grade, 
@@ -379,26 +358,44 @@ async def generate_weekly(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/generate-lesson-plan")
-async def generate_lesson(
-    request: LessonPlanRequest,
+@router.post("/generate-weekly-plan")
+async def generate_weekly(
+    request: WeeklyPlanRequest,
     x_user_id: str = Header(None, alias="X-User-ID"),
     x_school_id: str = Header(None, alias="X-School-ID") 
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
-    school_id = x_school_id or request.schoolId
+    school_id = x_school_id or request.schoolId 
+    set_request_tenant(school_id, request.uid)
+    return await build_weekly_plan_document(request, user_id, school_id)
+
+
+@router.post("/generate-weekly-plan/stream")
+async def generate_weekly_stream(
+    request: WeeklyPlanRequest,
+    x_user_id: str = Header(None, alias="X-User-ID"),
+    x_school_id: str = Header(None, alias="X-School-ID") 
+):
+    """SSE variant: progress, each day as it is written, then the saved plan."""
+    user_id = resolve_user_id(x_user_id, request.uid)
+    school_id = x_school_id or request.schoolId 
+    set_request_tenant(school_id, request.uid)
+    return sse_response(lambda events: build_weekly_plan_document(request, user_id, school_id, events))
+
 
+async def build_lesson_plan_document(request: LessonPlanRequest, user_id: str, school_id: Optional[str], events=None) -> Dict[str, Any]:
+    """Credits, generation and persistence for /generate-lesson-plan and its /stream variant."""
     mode_label = "REMEDIAL" if request.is_remedial else "STANDARD"
     print(f"📝 LESSON PLAN [{mode_label}] | User: {user_id} | Topic: {request.topic} | Bloom's: {request.bloomsLevel}")
     
-    locked_context = get_locked_template_context(user_id, "lesson_plan", request.grade, request.subject)
+    locked_context = await get_locked_template_context(user_id, "lesson_plan", request.grade, request.subject)
 
     try:
         # Standard AND Remedial lesson plans cost 1 credit
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
         
         attendance = {"boys": request.boys, "girls": request.girls}
-        module_data = load_module(country="Zambia", grade=request.grade, subject=request.subject)
+        module_data = load_module_ir(country="Zambia", grade=request.grade, subject=request.subject)
 
         lesson = await generate_specific_lesson_plan(
             grade=request.grade, subject=request.subject, theme=request.topic,
@@ -410,7 +407,8 @@ async def generate_lesson(
             school_logo=request.schoolLogo,
             locked_context=locked_context,
             is_remedial=request.is_remedial,            
-            teacher_feedback=request.teacher_feedback   
+            teacher_feedback=request.teacher_feedback,
+            events=events
         )
 
         if isinstance(lesson, dict):
@@ -423,7 +421,9 @@ async def generate_lesson(
 
         generated_topic = lesson.get("topic") or request.topic or "General Topic"
         
-        save_lesson_plan(
+        if events:
+            events.progress("saving")
+        await save_lesson_plan(
             uid=user_id, 
             subject=request.subject, 
             grade=request.grade, 
@@ -445,6 +445,31 @@ async def generate_lesson(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/generate-lesson-plan")
+async def generate_lesson(
+    request: LessonPlanRequest,
+    x_user_id: str = Header(None, alias="X-User-ID"),
+    x_school_id: str = Header(None, alias="X-School-ID") 
+):
+    user_id = resolve_user_id(x_user_id, request.uid)
+    school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
+    return await build_lesson_plan_document(request, user_id, school_id)
+
+
+@router.post("/generate-lesson-plan/stream")
+async def generate_lesson_stream(
+    request: LessonPlanRequest,
+    x_user_id: str = Header(None, alias="X-User-ID"),
+    x_school_id: str = Header(None, alias="X-School-ID") 
+):
+    """SSE variant: progress, each lesson step as it is written, then the saved plan."""
+    user_id = resolve_user_id(x_user_id, request.uid)
+    school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
+    return sse_response(lambda events: build_lesson_plan_document(request, user_id, school_id, events))
+
+
 @router.post("/generate-record-of-work")
 async def generate_record_route(
     request: RecordOfWorkRequest,
@@ -453,36 +478,19 @@ async def generate_record_route(
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
 
     print(f"🔔 [API] Generating Record of Work for Week {request.weekNumber}")
     
-    locked_context = get_locked_template_context(user_id, "record_of_work", request.grade, request.subject)
-
     try:
-        scheme_context = get_best_available_scheme(user_id, request.subject, request.grade, request.term)
-        scheme_rows = []
-        
-        if scheme_context:
-            if isinstance(scheme_context, list):
-                scheme_rows = scheme_context
-            elif isinstance(scheme_context, dict):
-                scheme_rows = scheme_context.get("schemeData", {}).get("rows", []) or \
-                              scheme_context.get("rows", []) or \
-                              scheme_context.get("weeks", [])
-
-        filtered_scheme_data = []
+        scheme_rows, locked_context = await asyncio.gather(
+            get_best_available_scheme(user_id, request.subject, request.grade, request.term),
+            get_locked_template_context(user_id, "record_of_work", request.grade, request.subject),
+        )
+
         target_week = request.weekNumber
-        
-        for row in scheme_rows:
-            w_num = row.get("week_number")
-            if not w_num and row.get("week"):
-                 try:
-                     w_num = int(str(row["week"]).lower().replace("week", "").strip().split()[0])
-                 except: pass
-            
-            if w_num == target_week:
-                filtered_scheme_data.append(row)
-                break 
+        # Rows come normalized: week_number is already an int wherever the scheme had one
+        filtered_scheme_data = [row for row in scheme_rows if row.get("week_number") == target_week][:1]
         
         if not filtered_scheme_data:
             filtered_scheme_data = [{
@@ -494,7 +502,7 @@ async def generate_record_route(
                 "resources": ["Chalkboard"]
             }]
 
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
 
         record_data = await generate_record_of_work(
             teacher_name=request.teacherName,
@@ -509,7 +517,7 @@ async def generate_record_route(
             locked_context=locked_context 
         )
 
-        save_record_of_work(
+        await save_record_of_work(
             uid=user_id,
             subject=request.subject,
             grade=request.grade,
@@ -541,17 +549,19 @@ async def generate_notes(
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
     print(f"📝 GENERATING NOTES | Subject: {request.subject} | Topic: {request.topic}")
     
     try:
         # Added a 1-credit deduction here so users can't generate notes endlessly for free
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
 
         notes_data = await generate_lesson_notes(
             grade=request.grade,
             subject=request.subject,
             topic=request.topic,
-            subtopic=request.subtopic
+            subtopic=request.subtopic,
+            regenerate=request.regenerate
         )
         return {
             "status": "success", 
@@ -575,13 +585,14 @@ async def generate_diagram_route(
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
     print(f"🎨 DIAGRAM REQUEST | User: {user_id} | Prompt: {request.prompt}")
     
     try:
         # 💰 Premium feature: Costs 3 credits
-        credit_status = check_and_deduct_credit(user_id, cost=3, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=3, school_id=school_id)
 
-        result = await generate_chalkboard_diagram(request.prompt)
+        result = await generate_chalkboard_diagram(request.prompt, regenerate=request.regenerate)
         
         # Ensure we return the credit status alongside the diagram
         if isinstance(result, dict):
@@ -611,11 +622,12 @@ async def evaluate_lesson_route(
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
     print(f"🧠 EVALUATING LESSON | User: {user_id} | Topic: {request.topic}")
     
     try:
         # 💰 Standard feature: Costs 1 credit
-        credit_status = check_and_deduct_credit(user_id, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(user_id, cost=1, school_id=school_id)
 
         result = await evaluate_lesson_feedback(
             topic=request.topic,
@@ -664,7 +676,7 @@ async def capture_teacher_edits(
             "is_human_verified": True
         }
         
-        db.collection("ai_training_flywheel").add(training_record)
+        await capture_teacher_edit(training_record)
 
         return {"status": "success", "message": "Edits captured for fine-tuning"}
 
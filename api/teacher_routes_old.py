@@ -24,9 +24,11 @@ from services.file_manager import (
     save_resource
 )
 from services.credit_manager import check_and_deduct_credit
+from services.llm_gateway import set_request_tenant
+from services.firebase_setup import async_db
+from services.locked_templates import get_locked_template, capture_teacher_edit
 
 router = APIRouter()
-db = firestore.client()
 
 # ------------------------------------------------------------------
 # Schemas
@@ -104,29 +106,9 @@ def extract_week_number(week_value) -> int:
 def resolve_user_id(x_user_id: Optional[str], payload_uid: Optional[str]) -> str:
     return x_user_id or payload_uid or "default_user"
 
-def get_locked_template_context(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
+async def get_locked_template_context(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
     try:
-        flywheel_ref = db.collection("ai_training_flywheel")
-        query = (flywheel_ref
-                 .where("uid", "==", uid)
-                 .where("plan_type", "==", plan_type)
-                 .where("grade", "==", grade)
-                 .where("subject", "==", subject))
-        
-        docs = query.stream()
-        
-        for doc in docs:
-            data = doc.to_dict()
-            human_data = data.get("final_human_data", {})
-            
-            if human_data.get("isLocked") is True:
-                print(f"🔒 FOUND LOCKED TEMPLATE for {uid} -> {plan_type} ({subject})")
-                return {
-                    "customColumns": human_data.get("columns", []),
-                    "templateRows": human_data.get("rows", human_data.get("days", human_data.get("steps", [])))
-                }
-                
-        return None
+        return await get_locked_template(uid, plan_type, grade, subject)
     except Exception as e:
         print(f"⚠️ Error fetching locked template: {e}")
         return None
@@ -143,20 +125,21 @@ async def generate_scheme(
 ):
     uid = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or getattr(request, "schoolId", None)
+    set_request_tenant(school_id, request.uid)
 
     print(f"📅 Generating Scheme: {request.subject} | Grade {request.grade} | School: {school_id}")
 
     credit_status = {}
 
     # 1️⃣ Check Cache 
-    cached = load_generated_scheme(uid, request.subject, request.grade, request.term)
+    cached = await load_generated_scheme(uid, request.subject, request.grade, request.term)
     if cached:
         print("✅ Using cached scheme (No credit deduction)")
         ai_scheme_list = cached
         
         # We still want to return current credits even if we didn't deduct
         try:
-            user_doc = db.collection("users").document(uid).get()
+            user_doc = await async_db.collection("users").document(uid).get()
             if user_doc.exists:
                 ud = user_doc.to_dict()
                 credit_status["remaining_credits"] = ud.get("credits", 0)
@@ -168,12 +151,12 @@ async def generate_scheme(
     else:
         # 2️⃣ Deduct Credit
         try:
-            credit_status = check_and_deduct_credit(uid, cost=1, school_id=school_id)
+            credit_status = await check_and_deduct_credit(uid, cost=1, school_id=school_id)
         except Exception as e:
             raise HTTPException(status_code=402, detail=str(e)) 
 
         # 3️⃣ Fetch Locked Template context
-        locked_context = get_locked_template_context(uid, "scheme_old_format", request.grade, request.subject)
+        locked_context = await get_locked_template_context(uid, "scheme_old_format", request.grade, request.subject)
         
         # 4️⃣ Generate
         syllabus_data = load_syllabus("Zambia", request.grade, request.subject)
@@ -198,7 +181,7 @@ async def generate_scheme(
             if ai_scheme_list:
                 # Safely extract school name to avoid AttributeError
                 school_name_val = getattr(request, "school", getattr(request, "schoolName", "Unknown School"))
-                save_generated_scheme(
+                await save_generated_scheme(
                     uid=uid,
                     subject=request.subject,
                     grade=request.grade,
@@ -282,6 +265,7 @@ async def generate_weekly_plan(
 ):
     uid = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
 
     clean_topic = request.topic or request.theme
     clean_subtopic = request.lessonTitle 
@@ -302,11 +286,11 @@ async def generate_weekly_plan(
 
     try:
         # 💰 Capture credit status here
-        credit_status = check_and_deduct_credit(uid, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(uid, cost=1, school_id=school_id)
     except Exception as e:
         raise HTTPException(status_code=402, detail=str(e))
 
-    locked_context = get_locked_template_context(uid, "weekly_forecast", request.grade, request.subject)
+    locked_context = await get_locked_template_context(uid, "weekly_forecast", request.grade, request.subject)
 
     try:
         plan_data = await generate_weekly_plan_with_ai(
@@ -333,7 +317,7 @@ async def generate_weekly_plan(
         if clean_subtopic:
             plan_data["meta"]["sub_topic"] = clean_subtopic
 
-        save_weekly_plan(
+        await save_weekly_plan(
             uid=uid,
             subject=request.subject,
             grade=request.grade,
@@ -370,16 +354,17 @@ async def generate_lesson_plan(
 ):
     uid = resolve_user_id(x_user_id, request.uid)
     school_id = x_school_id or request.schoolId
+    set_request_tenant(school_id, request.uid)
 
     print(f"📝 Generating Lesson Plan (Old): {request.subject} | {request.topic} | Bloom's: {request.bloomsLevel}")
 
     try:
         # 💰 Capture credit status here
-        credit_status = check_and_deduct_credit(uid, cost=1, school_id=school_id)
+        credit_status = await check_and_deduct_credit(uid, cost=1, school_id=school_id)
     except Exception as e:
         raise HTTPException(status_code=402, detail=str(e))
 
-    locked_context = get_locked_template_context(uid, "lesson_plan", request.grade, request.subject)
+    locked_context = await get_locked_template_context(uid, "lesson_plan", request.grade, request.subject)
 
     try:
         module_data = load_module(country="Zambia", grade=request.grade, subject=request.subject)
@@ -407,7 +392,7 @@ async def generate_lesson_plan(
              raise HTTPException(status_code=500, detail="AI failed to generate lesson plan")
 
         try:
-            save_lesson_plan(
+            await save_lesson_plan(
                 uid=uid,
                 subject=request.subject,
                 grade=request.grade,
@@ -443,6 +428,7 @@ async def generate_notes(
     x_user_id: str = Header(None, alias="X-User-ID")
 ):
     user_id = resolve_user_id(x_user_id, request.uid)
+    set_request_tenant(uid=request.uid)
     print(f"📝 GENERATING NOTES | Subject: {request.subject} | Topic: {request.topic}")
     
     try:
@@ -486,7 +472,7 @@ async def capture_teacher_edits(
             "is_human_verified": True
         }
         
-        db.collection("ai_training_flywheel").add(training_record)
+        await capture_teacher_edit(training_record)
 
         return {"status": "success", "message": "Edits captured for fine-tuning"}
 
@@ -1,8 +1,8 @@
 import logging
 import os
-import glob
 import sys
 import cloudinary
+from contextlib import asynccontextmanager
 import cloudinary.uploader
 from pathlib import Path
 from fastapi import FastAPI, Request, UploadFile, File, HTTPException, BackgroundTasks
@@ -36,6 +36,18 @@ from api.exams import router as exams_router
 from api.school_routes import router as school_engine_router
 from api.sba import router as sba_router # 👈 ADDED THIS: IMPORT SBA ROUTER
 from services.notification_service import send_whatsapp_invite # 👈 IMPORT SERVICE
+from services.syllabus_manager import get_curriculum_catalog, build_grade_subject_index, lookup_subjects_for_grade
+from services.document_cache import document_cache
+from services.curriculum_bundle import get_bundle
+from services.topic_tree import TOPIC_TREE_WARM, warm_topic_trees
+from services.llm_gateway import llm_gateway, current_tenant, tenant_from_headers
+from services.llm_cache import llm_cache
+from services.blocking_io import run_blocking, blocking_io_stats
+from services.structured_output import structured_output_stats
+from services.file_manager import dual_write_queue
+from services.write_behind import PERSIST_WRITE_BEHIND
+from services.scheme_cache import scheme_cache
+from services.locked_templates import locked_template_stats
 
 # 2. Setup Logging
 logging.basicConfig(
@@ -45,7 +57,18 @@ logging.basicConfig(
 logger = logging.getLogger("uvicorn")
 
 # 3. Initialize App
-app = FastAPI(title="BooxClash Tutor API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup_event()
+    if PERSIST_WRITE_BEHIND:
+        await dual_write_queue.start()
+    else:
+        print("💾 Write-behind off (no PERSIST_SPILL_DIR): saves are committed before responding")
+    yield
+    # Generated documents still queued are written before the worker exits
+    await dual_write_queue.drain()
+
+app = FastAPI(title="BooxClash Tutor API", lifespan=lifespan)
 
 # 4. CORS
 origins = [
@@ -85,6 +108,8 @@ def count_available_resources():
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"🔔 INCOMING REQUEST: {request.method} {request.url}")
+    # Gemini calls made while serving this request are queued under this school/teacher
+    current_tenant.set(tenant_from_headers(request.headers))
     try:
         response = await call_next(request)
         logger.info(f"✅ RESPONSE SENT: {response.status_code}")
@@ -93,44 +118,6 @@ async def log_requests(request: Request, call_next):
         logger.error(f"❌ REQUEST FAILED: {str(e)}")
         raise e
 
-# === 📂 HELPER: SCAN SYLLABUS FOLDERS ===
-def get_subjects_for_grade(grade_input: str):
-    logger.info(f"🔍 [Subject Scanner] Scanning for grade: '{grade_input}'")
-    found_subjects = set()
-    clean_grade = grade_input.lower().replace("grade", "").strip()
-    logger.info(f"   🎯 Parsed clean grade number: '{clean_grade}'")
-
-    base_paths = [
-        os.path.join("syllabi", "new"),
-        os.path.join("syllabi", "old")
-    ]
-
-    for folder in base_paths:
-        if not os.path.exists(folder):
-            folder = os.path.join("..", folder)
-            if not os.path.exists(folder): 
-                logger.warning(f"   ⚠️ Folder not found: {folder}")
-                continue
-            
-        logger.info(f"   📂 Scanning folder: {folder}")
-        files = glob.glob(os.path.join(folder, "*.json"))
-        
-        for file_path in files:
-            filename = os.path.basename(file_path).lower()
-            parts = filename.replace(".json", "").split("_")
-            
-            if clean_grade in parts:
-                clean_parts = [p for p in parts if p not in ["zambia", "syllabus", "new", "old", clean_grade]]
-                subject_name = " ".join(clean_parts).title()
-                
-                if subject_name:
-                    logger.info(f"      ✅ Match found in file '{filename}' -> Subject: '{subject_name}'")
-                    found_subjects.add(subject_name)
-
-    final_list = list(sorted(found_subjects))
-    logger.info(f"🚀 [Subject Scanner] Final Subject List for {grade_input}: {final_list}")
-    return final_list
-
 # === 📝 DATA MODELS ===
 class WelcomeRequest(BaseModel):
     email: str
@@ -141,7 +128,8 @@ class WelcomeRequest(BaseModel):
 async def upload_to_cloudinary(file: UploadFile = File(...)):
     try:
         logger.info(f"Uploading file: {file.filename}...")
-        result = cloudinary.uploader.upload(
+        result = await run_blocking(
+            cloudinary.uploader.upload,
             file.file, 
             folder="booxclash/uploads", 
             resource_type="raw"
@@ -158,7 +146,8 @@ async def upload_to_cloudinary(file: UploadFile = File(...)):
 @app.get("/get-subjects/{grade}")
 async def get_subjects_endpoint(grade: str):
     logger.info(f"⚡ API HIT: /get-subjects/{grade}")
-    subjects = get_subjects_for_grade(grade)
+    # Same index (and GRADE_MAP aliasing) as /api/v1/get-subjects/{grade}
+    _, subjects = lookup_subjects_for_grade(grade)
     
     if not subjects:
         logger.warning(f"⚠️ API RETURN: No syllabus files found for {grade}")
@@ -180,12 +169,20 @@ app.include_router(sba_router, prefix="/api/sba", tags=["School-Based Assessment
 app.include_router(exams_router)
 app.include_router(catchup_router)
 # 7. Startup Event & Health Check
-@app.on_event("startup")
 async def startup_event():
     s_count, m_count = count_available_resources()
+    # Map the build-time curriculum bundle (if present), then index syllabi/ and
+    # modules/ once so generation requests never glob the disk
+    bundle = get_bundle()
+    get_curriculum_catalog()
+    build_grade_subject_index()
+    # Topic trees are otherwise built on the first request for each syllabus
+    topic_trees = warm_topic_trees() if TOPIC_TREE_WARM else "on demand"
     logger.info("🚀 SYSTEM STARTUP COMPLETE")
     logger.info(f"📚 Syllabi Loaded: {s_count}")
     logger.info(f"📦 Modules Loaded: {m_count}")
+    logger.info(f"🌳 Topic Trees Cached: {topic_trees}")
+    logger.info(f"🗜️ Curriculum Bundle: {'mapped' if bundle else 'not found, reading raw JSON'}")
 
 @app.get("/")
 def health_check():
@@ -198,6 +195,15 @@ def health_check():
             "syllabi_files": s_count,
             "module_files": m_count
         },
+        "document_cache": document_cache.stats(),
+        "curriculum_bundle": get_bundle().stats() if get_bundle() else None,
+        "llm_gateway": llm_gateway.stats(),
+        "llm_cache": llm_cache.stats(),
+        "blocking_io": blocking_io_stats(),
+        "structured_output": structured_output_stats(),
+        "write_behind": dual_write_queue.stats(),
+        "scheme_cache": scheme_cache.stats(),
+        "locked_templates": locked_template_stats(),
         "registered_routes": [
             "/api/v1/teacher/new", 
             "/api/school/update-settings", 
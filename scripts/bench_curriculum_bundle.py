@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import subprocess
+import statistics
+import tempfile
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from services.curriculum_bundle import write_bundle
+
+# ==========================================
+# ⏱️ BENCHMARK: COLD START WITH vs WITHOUT THE CURRICULUM BUNDLE
+# ==========================================
+# Every sample is a fresh interpreter (a "cold instance"). We time:
+#   - startup:       catalog scan + grade/subject index (what main.startup_event does)
+#   - first_request: the documents a first lesson-plan + scheme request touch
+#   - all_documents: loading every syllabus and module once (worst-case warm-up)
+#
+#   python scripts/bench_curriculum_bundle.py [runs]
+
+CHILD = r"""
+import json, sys, time, io, contextlib
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from services import syllabus_manager as sm
+    sm.get_curriculum_catalog()
+    sm.build_grade_subject_index()
+t1 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    sm.load_module("Zambia", "Grade 1", "Lunda")
+    sm.load_syllabus("Zambia", "Form 1", "Biology")
+    sm.load_module("Zambia", "Form 1", "English Language")
+t2 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    catalog = sm.get_curriculum_catalog()
+    for entries in catalog._entries.values():
+        for entry in entries:
+            try:
+                sm.document_cache.get(entry.path)
+            except Exception:
+                pass
+t3 = time.perf_counter()
+print(json.dumps({{"startup": t1 - t0, "first_request": t2 - t1, "all_documents": t3 - t2}}))
+"""
+
+
+def run(env_overrides, runs):
+    samples = []
+    env = {**os.environ, **env_overrides}
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD.format(root=project_root)],
+            env=env, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {k: statistics.median(s[k] for s in samples) * 1000 for k in samples[0]}
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle_path = os.path.join(tmp, "curriculum.bundle")
+        info = write_bundle(out_path=bundle_path)
+        print(f"📦 Bundle: {info['documents']} documents, {info['bytes'] / (1024 * 1024):.1f} MB\n")
+
+        raw = run({"CURRICULUM_BUNDLE_DISABLED": "1"}, runs)
+        bundled = run({"CURRICULUM_BUNDLE_PATH": bundle_path, "CURRICULUM_BUNDLE_DISABLED": "0"}, runs)
+
+    print(f"{'median ms (' + str(runs) + ' cold runs)':<32}{'raw JSON':>12}{'bundle':>12}{'speedup':>10}")
+    for key in raw:
+        print(f"{key:<32}{raw[key]:>12.1f}{bundled[key]:>12.1f}{raw[key] / bundled[key]:>9.1f}x")
@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import random
+import statistics
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from fuzz_json_stream import syllabus_titles, scheme_doc, weekly_doc, lesson_doc, exam_doc, decorate
+from services.json_repair import parse_json
+
+# ==========================================
+# ⏱️ BENCHMARK: SHARED JSON REPAIR VS THE OLD EXTRACTORS
+# ==========================================
+# Runs each extractor, followed by json.loads, over a corpus of large model
+# outputs. It reports throughput on clean responses, and on messy ones
+# (chatter, fences, // comments, trailing commas, cut-off tails) the share
+# that still parses. The four old extract_json_string copies are reproduced
+# below, minus their print statements, as the baseline. A cut-off tail is
+# never a success: parse_json raises TruncatedJSONError rather than return
+# a partial document, so the messy column tops out at the uncut share.
+#
+# Recorded raw responses (one per .txt file) can be used with --recorded;
+# otherwise the corpus is synthesized like scripts/fuzz_json_stream.py does,
+# with every document padded out to scheme / exam size.
+#
+#   python scripts/bench_json_repair.py [--recorded DIR] [--responses 200]
+
+
+def legacy_teacher_shared(text):
+    cleaned = text.replace("```json", "").replace("```", "").strip()
+    start = min([i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1], default=-1)
+    if start == -1:
+        return cleaned
+    end = cleaned.rfind("}") if cleaned[start] == "{" else cleaned.rfind("]")
+    return cleaned[start:end + 1] if end != -1 else cleaned
+
+
+def legacy_school_llm(text):
+    cleaned = text.strip().replace("```json", "").replace("```", "").strip()
+    if cleaned.startswith("{") and cleaned.endswith("}"):
+        return cleaned
+    match = re.search(r'\{[\s\S]*\}', cleaned)
+    if not match:
+        raise ValueError("No JSON object found in model output")
+    return match.group(0)
+
+
+def legacy_student(text):
+    clean_text = text.replace("```json", "").replace("```", "").strip()
+    start_idx = clean_text.find("{")
+    end_idx = clean_text.rfind("}")
+    if start_idx != -1 and end_idx != -1:
+        return clean_text[start_idx:end_idx + 1]
+    return clean_text
+
+
+def legacy_old_engine(text):
+    clean_text = text.replace("```json", "").replace("```", "").strip()
+    start_brace = clean_text.find("{")
+    start_bracket = clean_text.find("[")
+    if start_bracket != -1 and (start_brace == -1 or start_bracket < start_brace):
+        end_idx = clean_text.rfind("]")
+        if end_idx != -1:
+            clean_text = clean_text[start_bracket:end_idx + 1]
+    elif start_brace != -1:
+        end_idx = clean_text.rfind("}")
+        if end_idx != -1:
+            clean_text = clean_text[start_brace:end_idx + 1]
+    return re.sub(r'(?<!\\)\n', '\\n', clean_text)
+
+
+PARSERS = [
+    ("teacher_shared (old)", lambda t: json.loads(legacy_teacher_shared(t))),
+    ("school_llm (old)", lambda t: json.loads(legacy_school_llm(t))),
+    ("llm_engine_student (old)", lambda t: json.loads(legacy_student(t))),
+    ("llm_teacher_engine_old (old)", lambda t: json.loads(legacy_old_engine(t))),
+    ("json_repair.parse_json", parse_json),
+]
+
+
+def big(builder, rng, titles):
+    doc = builder(rng, titles)
+    # Pad list sections so each response is the size of a real 13-week scheme / full exam
+    target = doc["scheme_weeks"] if isinstance(doc, dict) and "scheme_weeks" in doc else doc
+    if isinstance(target, list):
+        target.extend(json.loads(json.dumps(target)) * 3)
+    elif isinstance(target, dict):
+        for key in ("days", "steps", "multiple_choice", "short_answer"):
+            if isinstance(target.get(key), list):
+                target[key].extend(json.loads(json.dumps(target[key])) * 4)
+    return doc
+
+
+def corpus(rng, count):
+    titles = syllabus_titles()
+    clean, messy = [], []
+    for i in range(count):
+        doc = big([scheme_doc, weekly_doc, lesson_doc, exam_doc][i % 4], rng, titles)
+        clean.append(f"```json\n{json.dumps(doc, ensure_ascii=False, indent=2)}\n```")
+        text = decorate(doc, rng)
+        if rng.random() < 0.25:
+            text = text[:rng.randint(len(text) // 2, len(text) - 1)]
+        messy.append(text)
+    return clean, messy
+
+
+def throughput(parse, texts, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            try:
+                parse(text)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return sum(len(t) for t in texts) / best / 1e6
+
+
+def success_rate(parse, texts):
+    ok = 0
+    for text in texts:
+        try:
+            ok += parse(text) is not None
+        except Exception:
+            pass
+    return ok / len(texts)
+
+
+def main():
+    rng = random.Random(3)
+    if "--recorded" in sys.argv:
+        folder = sys.argv[sys.argv.index("--recorded") + 1]
+        clean = []
+        for path in sorted(glob.glob(os.path.join(folder, "*.txt"))):
+            with open(path, "r", encoding="utf-8") as f:
+                clean.append(f.read())
+        messy = clean
+    else:
+        count = int(sys.argv[sys.argv.index("--responses") + 1]) if "--responses" in sys.argv else 200
+        clean, messy = corpus(rng, count)
+
+    sizes = [len(t) for t in clean]
+    print(f"Corpus: {len(clean)} responses, median {statistics.median(sizes) / 1024:.0f} KB, "
+          f"largest {max(sizes) / 1024:.0f} KB\n")
+    print(f"{'extractor + json.loads':<30} {'fenced clean MB/s':>18} {'messy MB/s':>11} {'messy parsed':>13}")
+    for name, parse in PARSERS:
+        print(f"{name:<30} {throughput(parse, clean):>18.1f} {throughput(parse, messy):>11.1f} "
+              f"{success_rate(parse, messy):>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
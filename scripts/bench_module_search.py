@@ -0,0 +1,172 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import statistics
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from fuzzywuzzy import fuzz
+
+from services import module_search
+from services.curriculum_ir import build_module_ir
+from services.module_search import ModuleSearchIndex, normalize_title, MATCH_THRESHOLD
+
+# ==========================================
+# ⏱️ BENCHMARK: INDEXED MODULE SEARCH vs LINEAR FUZZY SCAN
+# ==========================================
+# For every file in modules/ we query with real subtopic titles, topic titles,
+# typo'd titles, dotted IDs and junk, and check that the index returns exactly
+# the same subtopic and score as the old linear scan before timing both.
+# The reference scan always scores with fuzzywuzzy.fuzz.ratio as installed
+# in production (difflib, no python-Levenshtein). "indel differs" counts the
+# queries where scoring with rapidfuzz's indel ratio directly would have
+# changed the answer; the index only uses it as an upper bound, so
+# "mismatches" must be 0 with or without rapidfuzz. --pure forces the
+# pure-python pruned path.
+#
+#   python scripts/bench_module_search.py [queries_per_module] [--pure]
+
+
+def indel_ratio(a, b):
+    return int(round(module_search.rapid_fuzz.ratio(a, b)))
+
+
+def linear_search(module, query, reference_ratio=fuzz.ratio):
+    """The pre-index algorithm from find_structured_module_content, verbatim."""
+    import re
+    match = re.search(r"\b(\d+(\.\d+)+)\b", str(query))
+    q_id = match.group(1) if match else None
+    q_norm = normalize_title(query)
+    parent_ids = []
+    if q_id and "." in q_id:
+        parts = q_id.split(".")
+        parent_ids = [".".join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+
+    best_match, best_score = None, 0.0
+    for topic in module.topics:
+        for sub in topic.subtopics:
+            id_match = bool(q_id) and (q_id == sub.id or sub.id in parent_ids)
+            sub_norm = normalize_title(sub.title)
+            text_score = reference_ratio(q_norm, sub_norm) / 100.0 if q_norm and sub_norm else 0.0
+            score = 1.0 if id_match else text_score
+            if score > best_score:
+                best_score, best_match = score, (topic, sub)
+
+    if not best_match or best_score < MATCH_THRESHOLD:
+        return None
+    return best_match[0], best_match[1], best_score
+
+
+def typo(text, rng):
+    chars = list(text)
+    for _ in range(max(1, len(chars) // 8)):
+        if not chars:
+            break
+        i = rng.randrange(len(chars))
+        op = rng.choice("dsi")
+        if op == "d":
+            del chars[i]
+        elif op == "s":
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        else:
+            chars.insert(i, rng.choice("abcdefghijklmnopqrstuvwxyz"))
+    return "".join(chars)
+
+
+def build_queries(module, rng, limit):
+    queries = []
+    for topic in module.topics:
+        queries.append(topic.title)
+        for sub in topic.subtopics:
+            queries += [sub.title, typo(sub.title, rng), f"{sub.id} {sub.title}", sub.title.upper()]
+    queries += ["", "General revision", "9.9.9 Something else entirely", "Introduction"]
+    rng.shuffle(queries)
+    return queries[:limit]
+
+
+def time_per_query(fn, module, queries, rounds=3):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for q in queries:
+            fn(module, q)
+        samples.append((time.perf_counter() - start) / len(queries))
+    return min(samples)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    limit = int(args[0]) if args else 200
+    if "--pure" in sys.argv:
+        module_search.rapid_fuzz = module_search.rapid_process = None
+    print(f"Backend: {'rapidfuzz' if module_search.rapid_process else 'pure python (pruned fuzzywuzzy)'}")
+    rng = random.Random(42)
+
+    rows = []
+    mismatches = indel_differs = 0
+    for path in sorted(glob.glob(os.path.join(project_root, "modules", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            module = build_module_ir(json.load(f), os.path.basename(path))
+        size = sum(len(t.subtopics) for t in module.topics)
+        if not size:
+            continue
+
+        queries = build_queries(module, rng, limit)
+
+        build_start = time.perf_counter()
+        index = ModuleSearchIndex(module)
+        build_time = time.perf_counter() - build_start
+
+        for q in queries:
+            expected = linear_search(module, q)
+            got = index.search(q)
+            same = (expected is None and got is None) or (
+                expected is not None and got is not None
+                and expected[1] is got[1] and expected[2] == got[2]
+            )
+            if not same:
+                mismatches += 1
+                print(f"❌ MISMATCH {module.source}: {q!r}")
+            if module_search.rapid_fuzz is not None:
+                indel = linear_search(module, q, indel_ratio)
+                indel_differs += (indel is None) != (expected is None) or (
+                    indel is not None and (indel[1] is not expected[1] or indel[2] != expected[2])
+                )
+
+        linear = time_per_query(linear_search, module, queries)
+        indexed = time_per_query(lambda _m, q: index.search(q), module, queries)
+        # Lesson generators fall back from the subtopic to the theme
+        pairs = list(zip(queries[::2], queries[1::2]))
+        paired = min(
+            timed(lambda: [index.search_first(pair) for pair in pairs]) / max(len(pairs), 1)
+            for _ in range(3)
+        )
+        rows.append((size, module.source, linear, indexed, build_time, paired))
+
+    rows.sort(reverse=True)
+    print(f"\n{'subtopics':>9}  {'linear µs':>10}  {'index µs':>9}  {'speedup':>7}  {'2-query µs':>10}  {'build ms':>8}  module")
+    for size, name, linear, indexed, build_time, paired in rows[:10]:
+        print(f"{size:>9}  {linear * 1e6:>10.1f}  {indexed * 1e6:>9.1f}  {linear / indexed:>6.1f}x  {paired * 1e6:>10.1f}  {build_time * 1e3:>8.2f}  {name}")
+
+    print(f"\nModules: {len(rows)} | mismatches vs fuzzywuzzy: {mismatches}"
+          + (f" | indel differs: {indel_differs}" if module_search.rapid_fuzz is not None else ""))
+    print(f"Median per query: linear {statistics.median(r[2] for r in rows) * 1e6:.1f} µs, "
+          f"index {statistics.median(r[3] for r in rows) * 1e6:.1f} µs")
+    print(f"Largest module ({rows[0][1]}): linear {rows[0][2] * 1e3:.3f} ms, index {rows[0][3] * 1e3:.3f} ms")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "stub-key")
+
+from services.llm_gateway import llm_gateway
+from services.new import teacher_schemes
+
+# ==========================================
+# ⏱️ BENCHMARK: CHUNKED VS SINGLE-CALL SCHEME GENERATION
+# ==========================================
+# Gemini is replaced by a stub whose latency grows with the number of weeks
+# asked for (output tokens dominate generation time). The same 13-week
+# scheme is generated in one call and in chunks. Then one chunk is made to
+# return broken JSON once, to show that only that chunk is retried and the
+# stitched scheme is still complete and in week order. Each chunked week
+# must also carry the syllabus reference of a topic its own chunk was
+# prompted with, and every topic of the term must be referenced.
+#
+#   python scripts/bench_scheme_chunking.py [--seconds-per-week 0.15]
+
+SECONDS_PER_WEEK = float(sys.argv[sys.argv.index("--seconds-per-week") + 1]) if "--seconds-per-week" in sys.argv else 0.15
+NUM_WEEKS = 13
+
+SYLLABUS = {
+    "topics": [
+        {"unit": f"{n}.1", "topic_title": title, "page": 10 + n, "content": [f"{title} basics"], "outcomes": [f"Describe {title.lower()}"]}
+        for n, title in enumerate(["Sets", "Fractions", "Decimals", "Ratio", "Angles", "Area", "Volume", "Algebra", "Graphs"], start=1)
+    ]
+}
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    def __init__(self):
+        self.calls = []
+        self.prompts = {}  # first week -> prompt of that chunk
+        self.break_next = set()  # first week numbers whose next response is truncated
+
+    async def generate_content_async(self, prompt, **kwargs):
+        match = re.search(r"Create ONLY weeks (\d+) to (\d+)", prompt)
+        first, last = (int(match.group(1)), int(match.group(2))) if match else (1, NUM_WEEKS)
+        self.calls.append((first, last))
+        self.prompts[first] = prompt
+        await asyncio.sleep(SECONDS_PER_WEEK * (last - first + 1))
+
+        weeks = [{"week_number": n - first + 1, "topic": f"Stub week {n}", "content": [f"Point {n}"]} for n in range(first, last + 1)]
+        text = json.dumps({"intro_info": {"philosophy": "Stub"}, "scheme_weeks": weeks})
+        if first in self.break_next:
+            self.break_next.discard(first)
+            text = text[:len(text) // 2]  # truncated mid-response
+        return StubResponse(text)
+
+
+async def timed(stub, chunk_weeks):
+    teacher_schemes.SCHEME_CHUNK_WEEKS = chunk_weeks
+    stub.calls.clear()
+    start = time.perf_counter()
+    result = await teacher_schemes.generate_scheme_with_ai(SYLLABUS, "Mathematics", "5", "Term 1", NUM_WEEKS)
+    return time.perf_counter() - start, result
+
+
+def check_weeks(result):
+    numbers = [w["week_number"] for w in result["weeks"]]
+    return numbers == list(range(1, NUM_WEEKS + 1))
+
+
+def check_references(stub, result, chunk_weeks):
+    """Every week's syllabus reference is one its chunk was prompted with, and no topic is left out."""
+    ranges = teacher_schemes.split_week_ranges(NUM_WEEKS, chunk_weeks)
+    # Only the SYLLABUS DATA block; the format example below it cites a page too
+    prompted_pages = {first: re.findall(r"Pg (\d+)", prompt.split("INSTRUCTIONS:")[0]) for first, prompt in stub.prompts.items()}
+    pages = []
+    for week in result["weeks"]:
+        first = next(a for a, b in ranges if a <= week["week_number"] <= b)
+        ref = week["references"][0]
+        pages.append(ref)
+        if ref.split(" Pg ")[-1] not in prompted_pages[first]:
+            return False
+    prompted = {p for found in prompted_pages.values() for p in found}
+    return pages == sorted(pages) and {p.split(" Pg ")[-1] for p in pages} == prompted
+
+
+async def main():
+    stub = StubModel()
+    llm_gateway.model = lambda name=None: stub
+    failures = 0
+
+    single_s, single = await timed(stub, 0)
+    print(f"Single call          : {single_s:5.2f}s  calls={len(stub.calls)}  weeks={len(single['weeks'])}")
+    failures += not check_weeks(single)
+
+    for chunk_weeks in (6, 4, 3):
+        chunked_s, chunked = await timed(stub, chunk_weeks)
+        ok = check_weeks(chunked)
+        refs_ok = check_references(stub, chunked, chunk_weeks)
+        failures += (not ok) + (not refs_ok)
+        print(f"Chunks of {chunk_weeks} weeks   : {chunked_s:5.2f}s  calls={len(stub.calls)}  "
+              f"speedup x{single_s / chunked_s:.1f}  {'OK' if ok else 'WEEKS OUT OF ORDER'}  "
+              f"references {'OK' if refs_ok else 'FROM ANOTHER CHUNK'}")
+
+    # One chunk returns broken JSON once: only that chunk is generated again
+    teacher_schemes.SCHEME_CHUNK_WEEKS = 4
+    ranges = teacher_schemes.split_week_ranges(NUM_WEEKS, 4)
+    stub.break_next = {ranges[1][0]}
+    retry_s, retried = await timed(stub, 4)
+    repeated = [r for r in set(stub.calls) if stub.calls.count(r) > 1]
+    ok = check_weeks(retried) and repeated == [ranges[1]] and len(stub.calls) == len(ranges) + 1
+    failures += not ok
+    print(f"One truncated chunk  : {retry_s:5.2f}s  calls={len(stub.calls)}  retried={repeated}  {'OK' if ok else 'FAILED'}")
+
+    dates = [(w["week_number"], w["date_start"]) for w in retried["weeks"]]
+    ok = all(dates[i][1] < dates[i + 1][1] for i in range(len(dates) - 1))
+    failures += not ok
+    print(f"Week dates ascending : {'OK' if ok else 'FAILED'}")
+
+    print(f"\nFailures: {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,28 @@
+import os
+import sys
+import time
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from services.curriculum_bundle import BUNDLE_PATH, write_bundle
+
+# ==========================================
+# 📦 BUILD STEP: COMPILE syllabi/ modules/ sba/ INTO ONE BUNDLE
+# ==========================================
+# Run during the image build (see cloudbuild.yaml), after the curriculum files
+# are in place:  python scripts/build_curriculum_bundle.py [output_path]
+
+if __name__ == "__main__":
+    out_path = sys.argv[1] if len(sys.argv) > 1 else str(BUNDLE_PATH)
+
+    started = time.perf_counter()
+    result = write_bundle(out_path=out_path)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ Bundle written: {out_path}")
+    print(f"   ↳ Documents: {result['documents']} | Size: {result['bytes'] / (1024 * 1024):.1f} MB | {elapsed:.2f}s")
+    if result["skipped"]:
+        print(f"   ⚠️ Skipped (invalid JSON, served raw at runtime): {', '.join(result['skipped'])}")
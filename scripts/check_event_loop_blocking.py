@@ -0,0 +1,207 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+# Run from anywhere: add the project root so we can import 'services' / 'api'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "stub-key")
+
+# ==========================================
+# 🧪 REGRESSION CHECK: NOTHING BLOCKS THE EVENT LOOP
+# ==========================================
+# Every slow dependency of the routes below is replaced by a stub that
+# sleeps STUB_SECONDS. Sync stubs call time.sleep, async stubs call
+# asyncio.sleep. A probe task ticks on the loop and records the longest
+# stall while each route runs. If a route calls a sync API directly, the
+# stall equals the stub delay and the check fails. If the call goes
+# through run_blocking or an async client, the loop keeps ticking.
+#
+#   python scripts/check_event_loop_blocking.py
+
+STUB_SECONDS = 0.3
+MAX_STALL_MS = 100
+TICK_SECONDS = 0.005
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Both Gemini surfaces: the sync one must never be used from a route."""
+
+    def __init__(self, text):
+        self._text = text
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(STUB_SECONDS)
+        return StubResponse(self._text)
+
+    async def generate_content_async(self, *args, **kwargs):
+        await asyncio.sleep(STUB_SECONDS)
+        return StubResponse(self._text)
+
+
+def stub_llm(text):
+    from services.llm_gateway import llm_gateway
+    llm_gateway.model = lambda name=None: StubModel(text)
+
+
+def slow(result=None):
+    def call(*args, **kwargs):
+        time.sleep(STUB_SECONDS)
+        return result() if callable(result) else result
+    return call
+
+
+async def max_stall_ms(coro) -> float:
+    stall = 0.0
+    done = False
+
+    async def probe():
+        nonlocal stall
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(TICK_SECONDS)
+            now = time.perf_counter()
+            stall = max(stall, now - last - TICK_SECONDS)
+            last = now
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    try:
+        await coro
+    finally:
+        done = True
+        await probe_task
+    return stall * 1000
+
+
+# ==========================================
+# SCENARIOS
+# ==========================================
+
+async def sba_generate(sba):
+    stub_llm('{"title": "T", "teacher_instructions": "", "learner_instructions": "", "maxScore": 10, "rubric": []}')
+    await sba.generate_sba_task(sba.GenerateSBARequest(
+        grade="Grade 10", subject="Biology", task_title="Stub task", task_type="Project", max_score=10,
+        regenerate=True,
+    ))
+
+
+async def sba_extract_roster(sba):
+    from fastapi import UploadFile
+    stub_llm('["Mary Phiri", "John Banda"]')
+
+    class StubPdf:
+        pages = [SimpleNamespace(extract_text=slow("Mary Phiri\nJohn Banda"))]
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    sba.pdfplumber = SimpleNamespace(open=lambda *a, **k: StubPdf())
+    await sba.extract_roster(UploadFile(file=io.BytesIO(b"%PDF-1.4 stub"), filename="roster.pdf"))
+
+
+async def school_template_conversion(school_llm):
+    stub_llm("<html></html>")
+
+    def fake_download(url, filename):
+        time.sleep(STUB_SECONDS)
+        with open(filename, "wb") as f:
+            f.write(b"%PDF-1.4 stub")
+
+    school_llm.urllib.request.urlretrieve = fake_download
+    school_llm.genai.upload_file = slow(SimpleNamespace(name="files/stub"))
+    await school_llm.convert_pdf_to_template("https://example.com/template.pdf", "lesson_plan")
+
+
+async def template_architect_html(architect):
+    from PIL import Image
+    stub_llm("<html></html>")
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+    architect.requests = SimpleNamespace(get=slow(SimpleNamespace(content=buffer.getvalue())))
+    await architect.generate_html_template_from_pdf("https://example.com/form.png", "lesson_plan")
+
+
+async def fast_image(image_service):
+    image = SimpleNamespace(image=SimpleNamespace(image_bytes=b"\x89PNG stub"))
+    result = SimpleNamespace(generated_images=[image])
+
+    async def async_generate(**kwargs):
+        await asyncio.sleep(STUB_SECONDS)
+        return result
+
+    image_service.client = SimpleNamespace(
+        models=SimpleNamespace(generate_images=slow(result)),
+        aio=SimpleNamespace(models=SimpleNamespace(generate_images=async_generate)),
+    )
+    await image_service.generate_fast_image("a leaf")
+
+
+async def admin_email(admin):
+    stub_llm("Subject: Hello")
+    await admin.generate_email_content("Mrs Banda", "Top up your credits")
+
+
+async def cloudinary_upload(main):
+    from fastapi import UploadFile
+    main.cloudinary.uploader.upload = slow({"secure_url": "https://example.com/f"})
+    await main.upload_to_cloudinary(UploadFile(file=io.BytesIO(b"data"), filename="f.pdf"))
+
+
+# (label, module the code lives in, scenario)
+SCENARIOS = [
+    ("POST /api/sba/generate", "api.sba", sba_generate),
+    ("POST /api/sba/extract-roster", "api.sba", sba_extract_roster),
+    ("school_llm.convert_pdf_to_template", "services.school_llm", school_template_conversion),
+    ("template_architect.generate_html_template_from_pdf", "services.template_architect", template_architect_html),
+    ("image_service.generate_fast_image", "services.image_service", fast_image),
+    ("admin campaign email (generate_email_content)", "api.admin_routes", admin_email),
+    ("POST /api/upload", "main", cloudinary_upload),
+]
+
+
+def warm_up():
+    """What the startup event does before the first request is served."""
+    from services.syllabus_manager import get_curriculum_catalog, build_grade_subject_index
+    from services.topic_tree import warm_topic_trees
+    get_curriculum_catalog()
+    build_grade_subject_index()
+    warm_topic_trees()
+
+
+async def main():
+    warm_up()
+    failures = 0
+    print(f"{'route':<55} {'max stall':>10}  result")
+    for name, module_name, scenario in SCENARIOS:
+        # Imports happen at startup in production, so keep them out of the measurement
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            # e.g. Firebase credentials missing when importing a router
+            print(f"{name:<55} {'-':>10}  SKIP ({e.__class__.__name__}: {str(e)[:60]})")
+            continue
+        stall = await max_stall_ms(scenario(module))
+        ok = stall <= MAX_STALL_MS
+        failures += not ok
+        print(f"{name:<55} {stall:>8.1f}ms  {'OK' if ok else 'BLOCKS THE LOOP'}")
+
+    print(f"\nThreshold {MAX_STALL_MS} ms, stub latency {STUB_SECONDS * 1000:.0f} ms | failures: {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
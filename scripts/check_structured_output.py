@@ -0,0 +1,91 @@
+import os
+import sys
+import random
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "stub-key")
+
+from fuzz_json_stream import syllabus_titles, scheme_doc, weekly_doc, lesson_doc, exam_doc, decorate
+from services.llm_schemas import SchemeOfWork, WeeklyPlan, LessonPlan, ExamPaper
+from services.structured_output import parse_structured, gemini_schema, StructuredOutputError, _legacy_parse_failed
+
+# ==========================================
+# 🧪 PARSE-FAILURE RATE: OLD PATH VS STRUCTURED OUTPUT
+# ==========================================
+# Replays messy model output (chatter, fences, // comments, trailing commas,
+# and a share of responses cut off mid-stream) through the old
+# json.loads(extract_json_string()) path and through parse_structured().
+# Every response the old path rejected was a full regeneration for the user.
+# The ones parse_structured recovers locally are retries avoided.
+#
+# A response cut off inside its JSON must still be rejected (and re-asked),
+# never returned as a partial document: every accepted response has to
+# equal what the complete response parses to. "partial accepted" must be 0.
+#
+#   python scripts/check_structured_output.py [--responses 400] [--truncated 0.2]
+
+RESPONSES = int(sys.argv[sys.argv.index("--responses") + 1]) if "--responses" in sys.argv else 400
+TRUNCATED = float(sys.argv[sys.argv.index("--truncated") + 1]) if "--truncated" in sys.argv else 0.2
+
+KINDS = [
+    ("scheme", scheme_doc, SchemeOfWork, "scheme_weeks"),
+    ("weekly", weekly_doc, WeeklyPlan, None),
+    ("lesson", lesson_doc, LessonPlan, None),
+    ("exam", exam_doc, ExamPaper, None),
+]
+
+
+def main():
+    rng = random.Random(11)
+    titles = syllabus_titles()
+    rows = {name: {"responses": 0, "legacy_failures": 0, "failures": 0, "partial": 0} for name, *_ in KINDS}
+
+    for name, _, model, _ in KINDS:
+        gemini_schema(model)  # must convert without errors
+
+    for i in range(RESPONSES):
+        name, build, model, wrap_list = KINDS[i % len(KINDS)]
+        text = decorate(build(rng, titles), rng)
+        complete, _ = parse_structured(text, model, wrap_list=wrap_list)
+        if rng.random() < TRUNCATED:
+            text = text[:rng.randint(len(text) // 3, len(text) - 1)]
+
+        row = rows[name]
+        row["responses"] += 1
+        row["legacy_failures"] += _legacy_parse_failed(text)
+        try:
+            data, _ = parse_structured(text, model, wrap_list=wrap_list)
+            row["partial"] += data != complete
+        except StructuredOutputError:
+            row["failures"] += 1
+
+    for text, model in (
+        ('{"exam_title": "Grade 5 Science Test", "multiple_choice": [{"question": "What is', ExamPaper),
+        ("Sure! here: {}", LessonPlan),
+        ('{"exam_title": "Grade 5 Science Test", "multiple_choice": [{}]}', ExamPaper),
+    ):
+        try:
+            parse_structured(text, model)
+            rows["exam" if model is ExamPaper else "lesson"]["partial"] += 1
+            print(f"❌ accepted: {text!r}")
+        except StructuredOutputError:
+            pass
+
+    print(f"{'document':<10} {'responses':>9} {'old path fails':>15} {'structured fails':>17} {'partial accepted':>17}")
+    total = {"responses": 0, "legacy_failures": 0, "failures": 0, "partial": 0}
+    for name, row in rows.items():
+        for key in total:
+            total[key] += row[key]
+        print(f"{name:<10} {row['responses']:>9} {row['legacy_failures'] / row['responses']:>14.1%} "
+              f"{row['failures'] / row['responses']:>16.1%} {row['partial']:>17}")
+    saved = total["legacy_failures"] - total["failures"]
+    print(f"\n{saved} of {total['responses']} responses no longer need a regeneration "
+          f"({total['legacy_failures']} failed the old path, {total['failures']} still fail and are re-asked)")
+    sys.exit(1 if total["partial"] else 0)
+
+
+if __name__ == "__main__":
+    main()
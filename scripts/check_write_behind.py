@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+from datetime import datetime
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from services import write_behind
+from services.write_behind import WriteBehindQueue, QueueFull
+
+# ==========================================
+# 🧪 CHECK: WRITE-BEHIND PERSISTENCE QUEUE
+# ==========================================
+# The queue is driven with an in-memory commit function that takes
+# COMMIT_SECONDS per batch (a Firestore round trip from Cloud Run) and can
+# be told to fail. Scenarios:
+#
+#   latency    what a handler waits for: awaiting the commit vs enqueueing
+#   batching   REQUESTS concurrent saves -> how many commits
+#   outage     Firestore down for more failed commits than PERSIST_MAX_ATTEMPTS:
+#              nothing dead-lettered, nothing lost, nothing doubled
+#   poison     one payload always rejected: the rest still land, it is dead-lettered
+#   crash      worker killed with writes queued: once its journal goes stale
+#              another worker replays them
+#   drain      shutdown flushes what is queued
+#   handoff    shutdown while Firestore is down: the journal is left for
+#              another worker, which adopts it on its next heartbeat
+#   full       during an outage enqueue is refused at PERSIST_MAX_PENDING
+#   encode     a value the journal can't encode is refused at enqueue
+#   loop       journal writes on a slow volume (SLOW_IO_SECONDS per write,
+#              as on NFS) don't stall the event loop
+#
+#   python scripts/check_write_behind.py
+
+COMMIT_SECONDS = 0.15
+REQUESTS = 100
+SLOW_IO_SECONDS = 0.05
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.commits = 0
+        self.fail_next = 0
+        self.reject = set()
+
+    async def commit(self, items):
+        await asyncio.sleep(COMMIT_SECONDS)
+        self.commits += 1
+        if self.fail_next:
+            self.fail_next -= 1
+            raise ConnectionError("503 Service Unavailable")
+        if any(item["doc_id"] in self.reject for item in items):
+            raise ValueError("invalid nested entity")
+        for item in items:
+            self.docs[item["doc_id"]] = item["data"]
+
+
+def payload(i):
+    return {"doc_id": f"doc-{i}", "data": {"week": i, "createdAt": datetime.now()}}
+
+
+async def wait_empty(queue, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while queue.stats()["queue_depth"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+
+
+async def main():
+    spill = tempfile.mkdtemp(prefix="write_behind_check_")
+    write_behind.PERSIST_MAX_BACKOFF = 0.2
+    write_behind.PERSIST_MAX_ATTEMPTS = 4
+    write_behind.PERSIST_HEARTBEAT_SECONDS = 0.2
+    failures = 0
+
+    def check(name, ok, detail):
+        nonlocal failures
+        failures += not ok
+        print(f"{name:<10} {'OK  ' if ok else 'FAIL'} {detail}")
+
+    try:
+        # latency + batching
+        store = FakeFirestore()
+        started = time.perf_counter()
+        await store.commit([payload(-1)])
+        inline_ms = (time.perf_counter() - started) * 1000
+
+        queue = WriteBehindQueue("check", store.commit, spill_dir=spill)
+        await queue.start()
+        started = time.perf_counter()
+        for i in range(REQUESTS):
+            await queue.enqueue(payload(i))
+        enqueue_ms = (time.perf_counter() - started) * 1000 / REQUESTS
+        await wait_empty(queue)
+        check("latency", enqueue_ms < 5, f"handler waits {inline_ms:.0f} ms inline vs {enqueue_ms:.3f} ms enqueued")
+        check("batching", len(store.docs) == REQUESTS + 1,
+              f"{REQUESTS} saves in {store.commits - 1} commits, flush p95 {queue.stats()['flush_ms_p95']} ms")
+
+        # outage
+        outage = store.fail_next = 3 * write_behind.PERSIST_MAX_ATTEMPTS
+        for i in range(200, 210):
+            await queue.enqueue(payload(i))
+        await wait_empty(queue, timeout=30.0)
+        got = sum(f"doc-{i}" in store.docs for i in range(200, 210))
+        dead = queue.stats()["dead_lettered"]
+        check("outage", got == 10 and dead == 0,
+              f"{got}/10 landed after {outage} failed commits, "
+              f"{dead} dead-lettered ({queue.stats()['retries']} retries)")
+
+        # poison
+        store.reject = {"doc-301"}
+        for i in range(300, 305):
+            await queue.enqueue(payload(i))
+        await wait_empty(queue)
+        got = sum(f"doc-{i}" in store.docs for i in range(300, 305))
+        dead = queue.stats()["dead_lettered"]
+        check("poison", got == 4 and dead == 1, f"{got}/4 good writes landed, {dead} dead-lettered")
+        await queue.drain()
+
+        # crash: stop the worker without draining, as a SIGKILL would
+        store = FakeFirestore()
+        crashed = WriteBehindQueue("check", store.commit, spill_dir=spill)
+        await crashed.start()
+        crashed._worker.cancel()
+        crashed._heartbeat.cancel()
+        for i in range(400, 420):
+            await crashed.enqueue(payload(i))
+        crashed._journal.close()
+        crashed._journal, crashed._worker = None, None
+        # The instance has been gone for longer than PERSIST_ORPHAN_SECONDS
+        os.utime(crashed._journal_path, (0, 0))
+
+        restarted = WriteBehindQueue("check", store.commit, spill_dir=spill)
+        await restarted.start()
+        await wait_empty(restarted)
+        ok = all(isinstance(store.docs.get(f"doc-{i}", {}).get("createdAt"), datetime) for i in range(400, 420))
+        check("crash", ok and restarted.stats()["replayed"] == 20,
+              f"{restarted.stats()['replayed']} writes replayed from the spill file")
+
+        # drain
+        for i in range(500, 530):
+            await restarted.enqueue(payload(i))
+        await restarted.drain()
+        got = sum(f"doc-{i}" in store.docs for i in range(500, 530))
+        check("drain", got == 30, f"{got}/30 queued writes flushed on shutdown")
+
+        # handoff
+        store = FakeFirestore()
+        store.fail_next = 10 ** 6
+        leaving = WriteBehindQueue("check", store.commit, spill_dir=spill)
+        await leaving.start()
+        for i in range(600, 610):
+            await leaving.enqueue(payload(i))
+        await leaving.drain(timeout=0.5)
+        store.fail_next = 0
+        staying = WriteBehindQueue("check", store.commit, spill_dir=spill)
+        await staying.start()
+        await wait_empty(staying)
+        got = sum(f"doc-{i}" in store.docs for i in range(600, 610))
+        check("handoff", got == 10, f"{got}/10 writes left at shutdown landed through another worker")
+
+        # full
+        write_behind.PERSIST_MAX_PENDING = 20
+        store.fail_next = 10 ** 6
+        refused = 0
+        for i in range(700, 730):
+            try:
+                await staying.enqueue(payload(i))
+            except QueueFull:
+                refused += 1
+        check("full", refused == 10 and staying.stats()["queue_depth"] == 20,
+              f"{refused}/30 refused during an outage, {staying.stats()['queue_depth']} queued")
+        store.fail_next = 0
+        await wait_empty(staying)
+        write_behind.PERSIST_MAX_PENDING = 1000
+
+        # encode
+        try:
+            await staying.enqueue({"doc_id": "doc-800", "data": {"createdAt": object()}})
+            rejected = False
+        except TypeError:
+            rejected = True
+        check("encode", rejected and staying.stats()["queue_depth"] == 0, "a sentinel value is refused at enqueue")
+        await staying.drain()
+
+        # loop
+        store = FakeFirestore()
+        slow = WriteBehindQueue("slow", store.commit, spill_dir=spill)
+        write_fn = slow._write
+        slow._write = lambda line: (time.sleep(SLOW_IO_SECONDS), write_fn(line))[1]
+        await slow.start()
+        gaps = []
+
+        async def ticker():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        await asyncio.gather(*(slow.enqueue(payload(i)) for i in range(900, 920)))
+        await wait_empty(slow)
+        tick.cancel()
+        worst = max(gaps) * 1000
+        check("loop", worst < SLOW_IO_SECONDS * 1000,
+              f"worst loop stall {worst:.1f} ms with {SLOW_IO_SECONDS * 1000:.0f} ms journal writes")
+        await slow.drain()
+    finally:
+        shutil.rmtree(spill, ignore_errors=True)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
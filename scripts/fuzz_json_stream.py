@@ -0,0 +1,249 @@
+import os
+import sys
+import glob
+import json
+import time
+import random
+import statistics
+
+# Run from anywhere: add the project root so we can import 'services'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+
+from services.json_stream import IncrementalJSONParser, loads_tolerant, parse_path, ANY_ELEMENT
+from services.new.teacher_shared import extract_json_string
+
+# ==========================================
+# 🧪 FUZZ + BENCHMARK: INCREMENTAL JSON PARSER
+# ==========================================
+# Every response is fed to the parser under many random chunkings (from one
+# character at a time up to Gemini-sized chunks). The elements it streams
+# for each path must equal, in order, what a full parse of the finished
+# response contains. Every truncated prefix must stream a prefix of that
+# list and never a wrong element.
+#
+# By default the corpus is synthesized in the shapes our prompts ask for
+# (scheme weeks, weekly days, lesson steps, exam question arrays). The
+# topic text comes from the real syllabi. Responses get the decoration
+# Gemini adds on a bad day: chatter, ```json fences, // comments copied
+# from the template lock, and trailing commas.
+#
+# Recorded raw responses (one per .txt file) can be replayed with --recorded.
+#
+#   python scripts/fuzz_json_stream.py [--rounds 50] [--recorded DIR]
+
+PATHS = [
+    "scheme_weeks", "$", "days", "steps",
+    "multiple_choice", "true_false", "matching", "short_answer",
+    "computational", "essay", "case_study", "case_study[].questions",
+]
+
+CHATTER = ["", "Sure! Here is the plan you asked for:\n", "Okay.\n\n", "Here you go 👇\n"]
+TAILS = ["", "\n", "\nLet me know if you need changes.", "\n\nHope this helps!"]
+TRICKY = ['Use "quotes" here', "Braces { } and [ ] in text", "Path C:\\\\notes\\\\", "Ratio 1/2 // not a comment",
+          "Unicode: Bemba – Nyanja ✓", "Comma, then ] bracket", "Line\nbreak"]
+
+
+def syllabus_titles():
+    titles = []
+    for path in sorted(glob.glob(os.path.join(project_root, "syllabi", "*.json")))[:40]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        topics = data.get("topics", []) if isinstance(data, dict) else data
+        for topic in topics if isinstance(topics, list) else []:
+            if isinstance(topic, dict):
+                title = topic.get("topic_title") or topic.get("title")
+                if title:
+                    titles.append(str(title))
+    return titles or ["Sets", "Fractions", "Plants", "Weather"]
+
+
+def text_item(rng, titles):
+    return rng.choice(titles) if rng.random() < 0.8 else rng.choice(TRICKY)
+
+
+def scheme_doc(rng, titles):
+    weeks = [{
+        "week_number": n,
+        "topic": f"Unit {n}.1: {text_item(rng, titles)}",
+        "content": [text_item(rng, titles) for _ in range(rng.randint(1, 4))],
+        "methods": ["Demonstration", "Inquiry"],
+        "references": [f"Pupil's Book Pg {rng.randint(1, 200)}"],
+        "isSpecialRow": n == 13,
+    } for n in range(1, 14)]
+    if rng.random() < 0.15:
+        return weeks  # model answered with the bare array
+    return {"intro_info": {"aim": text_item(rng, titles)}, "scheme_weeks": weeks}
+
+
+def weekly_doc(rng, titles):
+    return {
+        "meta": {"week_number": rng.randint(1, 13), "main_topic": text_item(rng, titles)},
+        "days": [{"day": d, "topic": text_item(rng, titles), "subtopic": text_item(rng, titles),
+                  "resources": ["Textbook"], "reference": "Module Pg 4"}
+                 for d in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"][:rng.randint(1, 5)]],
+    }
+
+
+def lesson_doc(rng, titles):
+    return {
+        "teacherName": "Mrs Banda", "topic": text_item(rng, titles),
+        "enrolment": {"boys": 20, "girls": 22, "total": 42},
+        "steps": [{"stage": stage, "time": f"{rng.randint(5, 30)} min", "teacherActivity": text_item(rng, titles),
+                   "learnerActivity": text_item(rng, titles)} for stage in ["INTRODUCTION", "DEVELOPMENT", "CONCLUSION"]],
+        "homework_content": text_item(rng, titles),
+    }
+
+
+def exam_doc(rng, titles):
+    def q():
+        return {"question": text_item(rng, titles), "answer": text_item(rng, titles),
+                "needs_image": rng.random() < 0.2, "image_prompt": ""}
+    return {
+        "exam_title": "Grade 7 Science Test",
+        "multiple_choice": [{**q(), "options": ["A. 1", "B. 2", "C. 3", "D. 4"]} for _ in range(rng.randint(0, 10))],
+        "true_false": [q() for _ in range(rng.randint(0, 5))],
+        "matching": [{"instruction": "Match", "pairs": [{"stem": f"T{i}", "match": f"D{i}"} for i in range(5)]}],
+        "short_answer": [q() for _ in range(rng.randint(0, 5))],
+        "computational": [{"question": "Calculate 2+2", "solution_steps": "1. add\n2. done", "final_answer": 4}],
+        "essay": [{**q(), "points_allocated": 5}],
+        "case_study": [{"scenario": text_item(rng, titles), "questions": [q() for _ in range(rng.randint(1, 3))]}
+                       for _ in range(rng.randint(0, 2))],
+    }
+
+
+def decorate(doc, rng):
+    """Serializes like Gemini does on a messy day."""
+    text = json.dumps(doc, ensure_ascii=rng.random() < 0.3, indent=rng.choice([None, 2, 4]))
+    if rng.random() < 0.3:
+        # Trailing comma before the first closing brace that ends a line
+        text = text.replace("\n  }", ",\n  }", 1)
+    if rng.random() < 0.3 and "\n" in text:
+        lines = text.split("\n")
+        at = rng.randrange(1, len(lines))
+        lines.insert(at, "    // 🚨 CRITICAL LOCK: YOU MUST USE THESE EXACT KEYS")
+        text = "\n".join(lines)
+    if rng.random() < 0.6:
+        text = f"```json\n{text}\n```"
+    return rng.choice(CHATTER) + text + rng.choice(TAILS)
+
+
+def expected_elements(text):
+    doc = loads_tolerant(extract_json_string(text))
+    out = {}
+    for path in PATHS:
+        items = []
+        resolve(doc, parse_path(path), items)
+        out[path] = items
+    return out
+
+
+def resolve(node, steps, items):
+    if not steps:
+        if isinstance(node, list):
+            items.extend(node)
+        return
+    head, rest = steps[0], steps[1:]
+    if head == ANY_ELEMENT:
+        for child in node if isinstance(node, list) else []:
+            resolve(child, rest, items)
+    elif isinstance(node, dict) and head in node:
+        resolve(node[head], rest, items)
+
+
+def random_chunks(text, rng):
+    mode = rng.random()
+    if mode < 0.1:
+        return list(text)
+    upper = 8 if mode < 0.5 else 200
+    chunks, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, upper)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+
+def stream(chunks):
+    parser = IncrementalJSONParser(PATHS)
+    got = {path: [] for path in PATHS}
+    for chunk in chunks:
+        for element in parser.feed(chunk):
+            assert element.index == len(got[element.path])
+            got[element.path].append(element.value)
+    return parser, got
+
+
+def fuzz(corpus, rounds, rng):
+    failures = 0
+    for name, text in corpus:
+        expected = expected_elements(text)
+        for _ in range(rounds):
+            parser, got = stream(random_chunks(text, rng))
+            if got != expected or not parser.finished:
+                failures += 1
+                print(f"❌ {name}: streamed elements differ from the full parse")
+                break
+        # Truncated responses: only ever a correct prefix
+        for cut in sorted(rng.sample(range(1, len(text)), min(20, len(text) - 1))):
+            _, got = stream(random_chunks(text[:cut], rng))
+            for path, items in got.items():
+                if items != expected[path][:len(items)]:
+                    failures += 1
+                    print(f"❌ {name}: truncated at {cut} streamed a wrong element for {path}")
+    return failures
+
+
+def bench(corpus, rng):
+    stream_rates, full_rates, first_at = [], [], []
+    for _, text in corpus:
+        chunks = random_chunks(text, rng)
+        start = time.perf_counter()
+        parser = IncrementalJSONParser(PATHS)
+        seen = 0
+        first = None
+        for chunk in chunks:
+            seen += len(chunk)
+            if parser.feed(chunk) and first is None:
+                first = seen
+        stream_rates.append(len(text) / (time.perf_counter() - start))
+        start = time.perf_counter()
+        loads_tolerant(extract_json_string(text))
+        full_rates.append(len(text) / (time.perf_counter() - start))
+        if first is not None:
+            first_at.append(first / len(text))
+    print(f"Incremental parse: {statistics.median(stream_rates) / 1e6:.2f} MB/s median "
+          f"(full json.loads at the end: {statistics.median(full_rates) / 1e6:.2f} MB/s)")
+    if first_at:
+        print(f"First element available after {statistics.median(first_at) * 100:.0f}% of the response (median)")
+
+
+def main():
+    rounds = int(sys.argv[sys.argv.index("--rounds") + 1]) if "--rounds" in sys.argv else 50
+    rng = random.Random(7)
+    titles = syllabus_titles()
+
+    corpus = []
+    if "--recorded" in sys.argv:
+        folder = sys.argv[sys.argv.index("--recorded") + 1]
+        for path in sorted(glob.glob(os.path.join(folder, "*.txt"))):
+            with open(path, "r", encoding="utf-8") as f:
+                corpus.append((os.path.basename(path), f.read()))
+    else:
+        for i in range(60):
+            builder = [scheme_doc, weekly_doc, lesson_doc, exam_doc][i % 4]
+            corpus.append((f"{builder.__name__}#{i}", decorate(builder(rng, titles), rng)))
+
+    print(f"Corpus: {len(corpus)} responses, {sum(len(t) for _, t in corpus) / 1024:.0f} KB, {rounds} chunkings each")
+    failures = fuzz(corpus, rounds, rng)
+    bench(corpus, rng)
+    print(f"\nFailures: {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import asyncio
+import statistics
+from datetime import datetime
+
+# Run from anywhere: add the project root so we can import 'services' / 'api'
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "stub-key")
+
+# ==========================================
+# 🔥 LOAD TEST: SYNC vs ASYNC FIRESTORE PER WORKER
+# ==========================================
+# Replays the Firestore traffic of one /generate-weekly-plan request
+# (latest scheme lookup, locked template lookup, credit check + deduction,
+# save) CONCURRENCY times at once on a single event loop, i.e. one uvicorn
+# worker. It runs twice:
+#
+#   sync   the old data path: firestore.client() called straight from the
+#          coroutine, so every round trip stalls every other request
+#   async  the awaited data layer (services.file_manager,
+#          services.credit_manager, api.teacher_routes_new helpers)
+#
+# Needs the Firestore emulator (no credentials, nothing touches production):
+#
+#   gcloud emulators firestore start --host-port=localhost:8080
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/load_test_firestore.py
+#
+# The emulator answers in a few ms, far faster than Firestore from Cloud Run
+# (50-200 ms), so the measured gap is a lower bound.
+
+CONCURRENCY = int(os.getenv("LOAD_TEST_CONCURRENCY", "50"))
+ROUNDS = int(os.getenv("LOAD_TEST_ROUNDS", "3"))
+
+SUBJECT, GRADE, TERM = "Mathematics", "Grade 5", "Term 1"
+SEED_CREDITS = 1_000_000
+
+
+def teacher_uid(i: int) -> str:
+    return f"load-test-teacher-{i % 10}"
+
+
+# ==========================================
+# SEED
+# ==========================================
+
+def seed(db):
+    from google.cloud.firestore import SERVER_TIMESTAMP
+    for i in range(10):
+        uid = teacher_uid(i)
+        db.collection("users").document(uid).set({"credits": SEED_CREDITS, "expires_at": None})
+        db.collection("generated_schemes").add({
+            "userId": uid, "subject": SUBJECT, "grade": GRADE, "term": TERM,
+            "schemeData": [{"week_number": w, "topic": f"Topic {w}"} for w in range(1, 14)],
+            "createdAt": datetime.now(),
+        })
+        for n in range(5):
+            db.collection("ai_training_flywheel").add({
+                "uid": uid, "plan_type": "weekly_forecast", "grade": GRADE, "subject": SUBJECT,
+                "final_human_data": {"isLocked": n == 4, "columns": [], "days": []},
+                "captured_at": SERVER_TIMESTAMP,
+            })
+
+
+# ==========================================
+# ONE REQUEST, BOTH WAYS
+# ==========================================
+
+async def sync_request(db, i: int):
+    """The pre-migration handler body: blocking calls inside a coroutine."""
+    from google.cloud.firestore import Increment, Query
+    uid = teacher_uid(i)
+    scheme = None
+    for doc in (db.collection("generated_schemes")
+                .where("userId", "==", uid).where("subject", "==", SUBJECT)
+                .where("grade", "==", GRADE).where("term", "==", TERM)
+                .order_by("createdAt", direction=Query.DESCENDING).limit(1).stream()):
+        scheme = doc.to_dict().get("schemeData", [])
+    for doc in (db.collection("ai_training_flywheel")
+                .where("uid", "==", uid).where("plan_type", "==", "weekly_forecast")
+                .where("grade", "==", GRADE).where("subject", "==", SUBJECT).stream()):
+        if doc.to_dict().get("final_human_data", {}).get("isLocked"):
+            break
+    user_ref = db.collection("users").document(uid)
+    user_ref.get()
+    user_ref.update({"credits": Increment(-1)})
+    db.collection("generated_weekly_plans").document().set({
+        "userId": uid, "subject": SUBJECT, "grade": GRADE, "term": TERM, "weekNumber": i % 13 + 1,
+        "planData": {"days": scheme or []}, "createdAt": datetime.now(),
+    })
+
+
+async def async_request(i: int):
+    from api.teacher_routes_new import get_best_available_scheme, get_locked_template_context
+    from services.credit_manager import check_and_deduct_credit
+    from services.file_manager import save_weekly_plan
+    uid = teacher_uid(i)
+    scheme, _ = await asyncio.gather(
+        get_best_available_scheme(uid, SUBJECT, GRADE, TERM),
+        get_locked_template_context(uid, "weekly_forecast", GRADE, SUBJECT),
+    )
+    await check_and_deduct_credit(uid, cost=1)
+    await save_weekly_plan(uid, SUBJECT, GRADE, TERM, i % 13 + 1, "Load Test School", {"days": scheme or []})
+
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+
+async def run_round(make_request) -> dict:
+    latencies = []
+
+    async def timed(i):
+        started = time.perf_counter()
+        await make_request(i)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": CONCURRENCY / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def measure(label: str, make_request):
+    await make_request(0)  # warm up connections / channels
+    rounds = [await run_round(make_request) for _ in range(ROUNDS)]
+    best = max(rounds, key=lambda r: r["rps"])
+    print(f"{label:<8} {best['rps']:>10.1f} {best['p50']:>10.1f} {best['p95']:>10.1f}")
+    return best
+
+
+async def main():
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("❌ FIRESTORE_EMULATOR_HOST is not set. Start the emulator first, e.g.\n"
+              "   gcloud emulators firestore start --host-port=localhost:8080\n"
+              "   FIRESTORE_EMULATOR_HOST=localhost:8080 python scripts/load_test_firestore.py")
+        sys.exit(2)
+
+    from services.firebase_setup import db
+    seed(db)
+
+    print(f"{CONCURRENCY} concurrent requests on one event loop, best of {ROUNDS} rounds\n")
+    print(f"{'path':<8} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    before = await measure("sync", lambda i: sync_request(db, i))
+    after = await measure("async", async_request)
+    print(f"\nThroughput per worker: {after['rps'] / before['rps']:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
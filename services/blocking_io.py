@@ -0,0 +1,55 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Sync-only libraries (pdfplumber, Pillow, cloudinary, genai.upload_file,
+# urllib downloads) run on this pool instead of the event loop. It is kept
+# separate from Starlette's default threadpool so a burst of PDF uploads
+# can't starve sync routes, and bounded so it can't starve the CPU.
+BLOCKING_IO_MAX_WORKERS = int(os.getenv("BLOCKING_IO_MAX_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_MAX_WORKERS, thread_name_prefix="blocking-io")
+
+_stats = {"calls": 0, "in_flight": 0, "failures": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    await run_blocking(pdfplumber_extract, data) — runs a sync call on the
+    bounded pool. Context variables (e.g. the LLM tenant) carry over.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    _stats["calls"] += 1
+    _stats["in_flight"] += 1
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_executor, call)
+    except Exception:
+        _stats["failures"] += 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _stats["in_flight"] -= 1
+        _stats["total_seconds"] += elapsed
+        _stats["max_seconds"] = max(_stats["max_seconds"], elapsed)
+
+
+def blocking_io_stats() -> Dict[str, Any]:
+    calls = _stats["calls"]
+    return {
+        "workers": BLOCKING_IO_MAX_WORKERS,
+        "calls": calls,
+        "in_flight": _stats["in_flight"],
+        "failures": _stats["failures"],
+        "avg_ms": round(1000 * _stats["total_seconds"] / calls, 1) if calls else 0.0,
+        "max_ms": round(1000 * _stats["max_seconds"], 1),
+    }
@@ -2,7 +2,13 @@ import json
 from typing import List, Dict, Any, Optional
 
 # IMPORTANT: Adjust these imports based on where your helper functions live in your backend
-from .new.teacher_shared import get_model, extract_json_string 
+from services.json_repair import parse_json
+from services.llm_gateway import llm_gateway
+from services.llm_cache import llm_cache
+
+# Bump when the prompt text below changes so cached plans stop matching
+CATCHUP_PROMPT_VERSION = "1"
+
 # =====================================================
 # CATCH-UP (TaRL) LESSON PLAN GENERATOR
 # =====================================================
@@ -21,7 +27,8 @@ async def generate_catchup_lesson_plan(
     teacher_name: str = "Class Teacher", 
     school_name: str = "Primary School",
     school_logo: Optional[str] = None,
-    locked_context: Optional[Dict[str, Any]] = None
+    locked_context: Optional[Dict[str, Any]] = None,
+    regenerate: bool = False
 ) -> Dict[str, Any]:
     
     final_logo = school_logo
@@ -56,7 +63,6 @@ async def generate_catchup_lesson_plan(
       ]
         """
 
-    model = get_model()
     
     prompt = f"""
     Act as an expert Zambian Remedial Teacher trained in the Teaching at the Right Level (TaRL) methodology. 
@@ -97,19 +103,35 @@ async def generate_catchup_lesson_plan(
     }}
     """
     
-    try:
+    async def _generate() -> Dict[str, Any]:
         # Call the Gemini model asynchronously 
-        response = await model.generate_content_async(
+        response = await llm_gateway.generate(
             prompt, 
-            generation_config={"response_mime_type": "application/json"}
+            generation_config={"response_mime_type": "application/json"},
+            label="generate_catchup_lesson_plan"
         )
         
         # Parse the JSON string into a Python Dictionary
-        data = json.loads(extract_json_string(response.text))
+        return parse_json(response.text)
+
+    try:
+        # The teaching content depends only on the activity; the header fields
+        # (teacher, school, time, enrolment) are overwritten below on every call
+        data = await llm_cache.get_or_generate(
+            "catchup_plan", CATCHUP_PROMPT_VERSION,
+            {"grade": grade, "subject": subject, "level": catchup_level, "activity": activity_name,
+             "objectives": objectives, "steps": catchup_steps, "materials": materials_str,
+             "columns": steps_format},
+            _generate,
+            regenerate=regenerate,
+        )
         
         # 🛡️ Force Fallbacks in case the AI hallucinates
+        data["teacherName"] = teacher_name
         data["logo_url"] = final_logo
         data["schoolName"] = school_name
+        data["time"] = f"{time_start} - {time_end}"
+        data["enrolment"] = {"boys": boys, "girls": girls, "total": total}
         data["topic"] = f"Catch-Up {subject}: {catchup_level}"
         data["subtopic"] = activity_name
         
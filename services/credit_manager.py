@@ -1,8 +1,8 @@
 from datetime import datetime, timezone, timedelta
 from google.cloud.firestore import Increment
-from services.firebase_setup import db 
+from services.firebase_setup import async_db
 
-def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
+async def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
     """
     Checks credits and deducts 'cost' credits atomically.
     Also checks for subscription expiration.
@@ -23,8 +23,8 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
     # 🏫 PATH A: SCHOOL CREDIT DEDUCTION
     # =========================================================
     if school_id:
-        school_ref = db.collection("schools").document(school_id)
-        doc = school_ref.get()
+        school_ref = async_db.collection("schools").document(school_id)
+        doc = await school_ref.get()
 
         if not doc.exists:
             print(f"❌ School ID {school_id} not found.")
@@ -43,7 +43,7 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
             raise Exception(f"School credits exhausted (Available: {current_credits}). Please contact Admin.")
 
         # Deduct from School
-        school_ref.update({ "credits": Increment(-cost) })
+        await school_ref.update({ "credits": Increment(-cost) })
         print(f"💰 SCHOOL Credit deducted. Remaining: {current_credits - cost}")
         
         return {
@@ -55,8 +55,8 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
     # =========================================================
     # 👤 PATH B: INDIVIDUAL USER DEDUCTION
     # =========================================================
-    user_ref = db.collection("users").document(uid)
-    doc = user_ref.get()
+    user_ref = async_db.collection("users").document(uid)
+    doc = await user_ref.get()
 
     # 🆕 FIRST-TIME USER (Initialize & Deduct)
     if not doc.exists:
@@ -70,7 +70,7 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
         # Give free credits a 14-day expiry to create urgency
         trial_expires_at = now + timedelta(days=14) 
         
-        user_ref.set({
+        await user_ref.set({
             "credits": initial_credits - cost, 
             "is_approved": False,
             "joined_at": now,
@@ -101,7 +101,7 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
 
         # Give them 3 credits, valid for 14 days
         reset_expires_at = now + timedelta(days=14)
-        user_ref.update({
+        await user_ref.update({
             "credits": 3 - cost,
             "expires_at": reset_expires_at
         })
@@ -120,7 +120,7 @@ def check_and_deduct_credit(uid: str, cost: int = 1, school_id: str = None):
         )
 
     # 💰 ATOMIC CREDIT DEDUCTION
-    user_ref.update({ "credits": Increment(-cost) })
+    await user_ref.update({ "credits": Increment(-cost) })
     print(f"💰 Credit deducted for {uid}. Remaining: {current_credits - cost}")
     
     # Return success and expiration date to send to the frontend
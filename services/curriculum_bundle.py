@@ -0,0 +1,237 @@
+import os
+import mmap
+import pickle
+import zlib
+import struct
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# The bundle is compiled at build time by scripts/build_curriculum_bundle.py from
+# syllabi/, modules/ and sba/. It holds every document pre-parsed (pickle) plus
+# the folder listing used by the CurriculumCatalog, so a fresh Cloud Run
+# instance never has to json.load hundreds of files on its first requests.
+#
+# Layout:  MAGIC | version (uint16) | index length (uint64) | pickled index | document blobs
+# The index maps a root-relative path -> (offset, length, file size, CRC32 of contents).
+# Entries are checked against file contents, not mtimes: `docker build` copies
+# the files into the image after the bundle is built, so their mtimes (and the
+# folders') need not match what the build step saw. Folder listings are
+# checked against the folder's current *.json names.
+# The file is only ever produced by our own build step; never load a bundle from
+# an untrusted source (pickle).
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BUNDLE_PATH = Path(os.getenv("CURRICULUM_BUNDLE_PATH", str(BASE_DIR / "curriculum.bundle")))
+BUNDLE_FOLDERS = ["syllabi", "modules", "sba"]
+
+MAGIC = b"BXCURR"
+BUNDLE_VERSION = 2
+HEADER = struct.Struct(">HQ")
+
+
+def _content_hash(raw: bytes) -> int:
+    # Detects edits made after the build, not tampering; CRC32 runs at memory speed
+    return zlib.crc32(raw)
+
+
+def _relative_key(path: Path, base_dir: Path) -> Optional[str]:
+    try:
+        return Path(path).resolve().relative_to(base_dir).as_posix()
+    except ValueError:
+        return None
+
+
+def _folder_listing(base_dir: Path) -> Dict[str, Any]:
+    """Every JSON file under the bundled folders, grouped by containing folder."""
+    listing = {}
+    for folder_name in BUNDLE_FOLDERS:
+        root = base_dir / folder_name
+        if not root.is_dir():
+            continue
+        for folder in [root] + sorted(p for p in root.iterdir() if p.is_dir()):
+            rel = folder.relative_to(base_dir).as_posix()
+            listing[rel] = {"files": sorted(p.name for p in folder.glob("*.json"))}
+    return listing
+
+
+# ==========================================
+# 🏗️ BUILD
+# ==========================================
+
+def write_bundle(base_dir: Path = BASE_DIR, out_path: Path = BUNDLE_PATH) -> Dict[str, Any]:
+    """
+    Parses every curriculum JSON file once and writes the bundle.
+    Files that fail to parse are skipped (the app falls back to reading them raw).
+    """
+    import json
+
+    base_dir = Path(base_dir).resolve()
+    listing = _folder_listing(base_dir)
+
+    blobs: List[bytes] = []
+    documents: Dict[str, tuple] = {}
+    skipped: List[str] = []
+    offset = 0
+
+    for rel_folder, info in listing.items():
+        for name in info["files"]:
+            file_path = base_dir / rel_folder / name
+            try:
+                raw = file_path.read_bytes()
+                data = json.loads(raw.decode("utf-8"))
+            except Exception as e:
+                print(f"⚠️ [Bundle] Skipping {rel_folder}/{name}: {e}")
+                skipped.append(f"{rel_folder}/{name}")
+                continue
+
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+            documents[f"{rel_folder}/{name}"] = (offset, len(blob), len(raw), _content_hash(raw))
+            blobs.append(blob)
+            offset += len(blob)
+
+    index = {
+        "version": BUNDLE_VERSION,
+        "built_at": datetime.now().isoformat(),
+        "listing": listing,
+        "documents": documents,
+    }
+    index_blob = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+
+    tmp_path = Path(str(out_path) + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(BUNDLE_VERSION, len(index_blob)))
+        f.write(index_blob)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, out_path)
+
+    return {"documents": len(documents), "skipped": skipped, "bytes": Path(out_path).stat().st_size}
+
+
+# ==========================================
+# 📦 RUNTIME READER
+# ==========================================
+
+class CurriculumBundle:
+    """Memory-mapped reader; documents are unpickled lazily, one at a time."""
+
+    def __init__(self, path: Path, base_dir: Path = BASE_DIR):
+        self.path = Path(path)
+        self.base_dir = Path(base_dir).resolve()
+
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path.name} is not a curriculum bundle")
+
+        version, index_len = HEADER.unpack_from(self._mm, len(MAGIC))
+        if version != BUNDLE_VERSION:
+            self.close()
+            raise ValueError(f"bundle version {version} != expected {BUNDLE_VERSION}")
+
+        index_start = len(MAGIC) + HEADER.size
+        index = pickle.loads(self._mm[index_start:index_start + index_len])
+        self._blob_start = index_start + index_len
+        self._documents: Dict[str, tuple] = index["documents"]
+        self._listing: Dict[str, Any] = index["listing"]
+        self.built_at = index.get("built_at")
+
+        self.hits = 0
+        self.stale = 0
+        self._stale_logged = False
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def _reject(self, rel: str, reason: str):
+        self.stale += 1
+        if not self._stale_logged:
+            self._stale_logged = True
+            print(f"⚠️ Curriculum bundle is stale ({rel}: {reason}); affected files are read as raw JSON")
+
+    def folder_files(self, folder: Path) -> Optional[List[str]]:
+        """
+        Pre-computed listing of a folder's JSON files, or None when the folder
+        has changed since the bundle was built (new/removed files).
+        """
+        rel = _relative_key(folder, self.base_dir)
+        info = self._listing.get(rel) if rel else None
+        if not info:
+            return None
+        try:
+            names = sorted(n for n in os.listdir(folder) if n.endswith(".json") and not n.startswith("."))
+        except OSError:
+            return None
+        if names != info["files"]:
+            self._reject(rel, "files added or removed")
+            return None
+        return info["files"]
+
+    def load(self, path: Path) -> Optional[Any]:
+        """
+        The pre-parsed document for `path`, or None if it isn't bundled or the
+        file on disk no longer matches what was compiled.
+        """
+        rel = _relative_key(path, self.base_dir)
+        entry = self._documents.get(rel) if rel else None
+        if entry is None:
+            return None
+
+        offset, length, size, digest = entry
+        if Path(path).stat().st_size != size:
+            self._reject(rel, "size changed")
+            return None
+        # Reading and hashing the file costs a fraction of parsing it
+        with open(path, "rb") as f:
+            if _content_hash(f.read()) != digest:
+                self._reject(rel, "contents changed")
+                return None
+
+        start = self._blob_start + offset
+        self.hits += 1
+        return pickle.loads(self._mm[start:start + length])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path.name,
+            "built_at": self.built_at,
+            "documents": len(self._documents),
+            "hits": self.hits,
+            "stale": self.stale,
+        }
+
+
+# ==========================================
+# 🔗 SHARED INSTANCE
+# ==========================================
+_bundle: Optional[CurriculumBundle] = None
+_bundle_loaded = False
+_bundle_lock = threading.Lock()
+
+
+def get_bundle() -> Optional[CurriculumBundle]:
+    """The mapped bundle, or None when it is missing/invalid (callers read raw JSON)."""
+    global _bundle, _bundle_loaded
+    if not _bundle_loaded:
+        with _bundle_lock:
+            if not _bundle_loaded:
+                if os.getenv("CURRICULUM_BUNDLE_DISABLED") != "1" and BUNDLE_PATH.exists():
+                    try:
+                        _bundle = CurriculumBundle(BUNDLE_PATH)
+                        print(f"📦 Curriculum bundle mapped: {BUNDLE_PATH.name} (built {_bundle.built_at})")
+                    except Exception as e:
+                        print(f"⚠️ Curriculum bundle unusable, falling back to raw JSON: {e}")
+                        _bundle = None
+                _bundle_loaded = True
+    return _bundle
@@ -0,0 +1,288 @@
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, NamedTuple, Tuple
+
+from services.curriculum_bundle import get_bundle
+
+# ==========================================
+# 1. CANONICAL FILENAME KEYS
+# ==========================================
+
+# Spelled-out grade numbers used by some syllabus files (e.g. "..._grade_five.json")
+WORD_NUMBERS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+    "seven": "7", "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12",
+}
+
+# "..._grade_form_1", "..._form_1", "..._form1", "..._grade_10", "..._grade_five", "..._grade_reception"
+LEVEL_PATTERN = re.compile(r"(?:^|_)(?:grade_)?(form|grade)_?([a-z0-9-]+)$")
+
+# "..._term_2", "..._term3", "..._t3" (only ever found in module filenames)
+TERM_PATTERN = re.compile(r"_(?:term_?|t)(\d)(?=_|$)")
+
+# Duplicate uploads such as "zambia_expressive_arts_grade_5 (2).json"
+COPY_MARKER_PATTERN = re.compile(r"\s*\(\d+\)$")
+
+
+class CatalogKey(NamedTuple):
+    country: str
+    curriculum: str   # "new" / "old" sub-folder, or "" for flat folders (modules/)
+    level: str        # "grade" or "form"
+    number: str       # "1", "10", "preschool", "reception"...
+    subject: str      # underscore form, e.g. "english_language"
+    kind: str         # "syllabus" or "module"
+
+
+class CatalogEntry(NamedTuple):
+    path: Path
+    filename: str     # lower-cased file name, used for legacy substring rules
+    key: Optional[CatalogKey]
+    term: Optional[str]
+    is_copy: bool
+
+
+def parse_curriculum_filename(filename: str, curriculum: str, kind: str) -> Tuple[Optional[CatalogKey], Optional[str], bool]:
+    """
+    Parses e.g. 'zambia_biology_grade_form_1.json' into
+    CatalogKey('zambia', 'new', 'form', '1', 'biology', 'syllabus').
+    Returns (None, term, is_copy) when the name does not follow the convention.
+    """
+    stem = filename.lower()
+    if stem.endswith(".json"):
+        stem = stem[:-5]
+
+    is_copy = bool(COPY_MARKER_PATTERN.search(stem))
+    stem = COPY_MARKER_PATTERN.sub("", stem)
+
+    if kind == "module":
+        stem = re.sub(r"_?module$", "", stem)
+
+    term = None
+    term_match = TERM_PATTERN.search(stem)
+    if term_match:
+        term = term_match.group(1)
+        stem = stem[:term_match.start()] + stem[term_match.end():]
+
+    level_match = LEVEL_PATTERN.search(stem)
+    if not level_match:
+        return None, term, is_copy
+
+    level, number = level_match.groups()
+    number = WORD_NUMBERS.get(number, number)
+    rest = stem[:level_match.start()].strip("_")
+
+    country = ""
+    if "_" in rest:
+        head, tail = rest.split("_", 1)
+        if head == "zambia":
+            country, rest = head, tail
+
+    if not rest:
+        return None, term, is_copy
+
+    return CatalogKey(country, curriculum, level, number, rest, kind), term, is_copy
+
+
+# ==========================================
+# 2. THE CATALOG
+# ==========================================
+
+# Lookup keys come from request bodies, so the memo stops growing here
+MAX_LOOKUP_ENTRIES = 512
+
+class CurriculumCatalog:
+    """
+    In-memory index of every syllabus and module file, built once at startup.
+
+    Replaces the per-request directory glob + substring scan in
+    syllabus_manager.find_file. Exact canonical keys resolve from a dict;
+    anything else falls back to the legacy filename rules over the
+    pre-scanned names, and the answer is memoized per query.
+    """
+
+    def __init__(self, syllabi_root: Path, modules_root: Path):
+        self.syllabi_root = syllabi_root
+        self.modules_root = modules_root
+
+        # (kind, curriculum) -> entries, closest (shortest) names first
+        self._entries: Dict[Tuple[str, str], List[CatalogEntry]] = {}
+        # CatalogKey -> best entry for that key
+        self._by_key: Dict[CatalogKey, CatalogEntry] = {}
+        # Memoized answers for raw (kind, curriculum, country, grade, subject) queries (bounded)
+        self._lookups: Dict[Tuple[str, str, str, str, str], Optional[Path]] = {}
+        # (curriculum, level, number) -> sorted display subject names from syllabus files
+        self._subjects: Dict[Tuple[str, str, str], List[str]] = {}
+
+        self._scan("syllabus", syllabi_root, ["new", "old"])
+        self._scan("module", modules_root, [])
+        self._build_subject_index()
+
+    # ---------- build ----------
+
+    def _scan(self, kind: str, root: Path, sub_folders: List[str]):
+        if not root.exists():
+            return
+
+        folders = [(name, root / name) for name in sub_folders if (root / name).is_dir()]
+        folders.append(("", root))
+
+        for curriculum, folder in folders:
+            entries = []
+            for file_path in self._list_folder(folder):
+                filename = file_path.name.lower()
+                # Module lookups have always required 'module' in the filename
+                if kind == "module" and "module" not in filename:
+                    continue
+
+                key, term, is_copy = parse_curriculum_filename(filename, curriculum, kind)
+                entry = CatalogEntry(file_path, filename, key, term, is_copy)
+                entries.append(entry)
+
+                if key is None:
+                    continue
+                current = self._by_key.get(key)
+                # Prefer the base (term-less) file and originals over "(2)" copies
+                if current is None or (entry.term or "", entry.is_copy) < (current.term or "", current.is_copy):
+                    self._by_key[key] = entry
+
+            # Closest (shortest) names first so ambiguous legacy matches resolve deterministically
+            entries.sort(key=lambda e: (e.is_copy, len(e.filename), e.filename))
+            self._entries[(kind, curriculum)] = entries
+
+    def _list_folder(self, folder: Path) -> List[Path]:
+        # The build-time bundle carries the folder listing; glob only when it is missing or stale
+        bundle = get_bundle()
+        names = bundle.folder_files(folder) if bundle is not None else None
+        if names is None:
+            return sorted(folder.glob("*.json"))
+        return [folder / name for name in names]
+
+    def _build_subject_index(self):
+        found: Dict[Tuple[str, str, str], set] = {}
+        for (kind, _), entries in self._entries.items():
+            if kind != "syllabus":
+                continue
+            for entry in entries:
+                if entry.key is None:
+                    continue
+                subject_name = entry.key.subject.replace("_", " ").title()
+                # Edge Case: Fix "Ict" to "ICT"
+                if subject_name.lower() == "ict": subject_name = "ICT"
+                found.setdefault((entry.key.curriculum, entry.key.level, entry.key.number), set()).add(subject_name)
+
+        self._subjects = {grade_key: sorted(names) for grade_key, names in found.items()}
+
+    def grade_levels(self) -> List[Tuple[str, str, str]]:
+        """Every (curriculum, level, number) that has at least one syllabus."""
+        return list(self._subjects.keys())
+
+    def subjects_for(self, curriculum: str, level: str, number: str) -> List[str]:
+        return self._subjects.get((curriculum, level, WORD_NUMBERS.get(number, number)), [])
+
+    def syllabus_entries(self) -> List[CatalogEntry]:
+        """Every scanned syllabus file, across the new/old/root folders."""
+        return [entry for (kind, _), entries in self._entries.items() if kind == "syllabus" for entry in entries]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "syllabi": sum(len(v) for (k, _), v in self._entries.items() if k == "syllabus"),
+            "modules": sum(len(v) for (k, _), v in self._entries.items() if k == "module"),
+            "keys": len(self._by_key),
+        }
+
+    # ---------- lookup ----------
+
+    def find(self, kind: str, curriculum: str, country: str, grade: str, subject: str) -> Optional[Path]:
+        query = (kind, curriculum, country.lower().strip(), str(grade), subject.lower().strip())
+        if query in self._lookups:
+            return self._lookups[query]
+
+        result = self._resolve(kind, curriculum, query[2], query[3], query[4])
+        if len(self._lookups) < MAX_LOOKUP_ENTRIES:
+            self._lookups[query] = result
+            # Logged once per memoized query, never per request
+            if result:
+                print(f"✅ Found {'module' if kind == 'module' else 'Syllabus'} File: {result.name}")
+        return result
+
+    def _resolve(self, kind: str, curriculum: str, country: str, grade: str, subject: str) -> Optional[Path]:
+        # Modules are a flat folder; syllabi fall back to the root when the sub-folder is missing
+        folder = curriculum if (kind, curriculum) in self._entries else ""
+        if kind == "module":
+            folder = ""
+
+        search_subject = subject.replace(" ", "_")
+        raw_input = grade.lower().replace(" ", "")
+        raw_num = raw_input.replace("grade", "").replace("form", "")
+
+        # STRICT TAG GENERATION (same rules as the original find_file)
+        if "form" in raw_input:
+            levels = ["form"]
+            possible_grade_tags = [f"form{raw_num}", f"form_{raw_num}"]
+        elif "grade" in raw_input:
+            levels = ["grade"]
+            possible_grade_tags = [f"grade{raw_num}", f"grade_{raw_num}"]
+        else:
+            levels = ["grade", "form"]
+            possible_grade_tags = [f"grade{raw_num}", f"grade_{raw_num}", f"form{raw_num}"]
+
+        grade_only = "grade" in raw_input and "form" not in raw_input
+
+        def legacy_match(entry: CatalogEntry) -> bool:
+            filename = entry.filename
+            if search_subject not in filename:
+                return False
+            if not any(tag in filename for tag in possible_grade_tags):
+                return False
+            # Anti-collision check: If looking for "Grade 1", ensure we didn't hit "Grade Form 1"
+            if grade_only and "form" in filename:
+                return False
+            return True
+
+        # 1. O(1) canonical key hit
+        number = WORD_NUMBERS.get(raw_num, raw_num)
+        for key_country in dict.fromkeys([country, "zambia", ""]):
+            for level in levels:
+                entry = self._by_key.get(CatalogKey(key_country, folder, level, number, search_subject, kind))
+                if entry and legacy_match(entry):
+                    return entry.path
+
+        # 2. Legacy substring rules over the pre-scanned names (no filesystem access)
+        for entry in self._entries.get((kind, folder), []):
+            if legacy_match(entry):
+                return entry.path
+
+        return None
+
+    def find_syllabus_file(self, curriculum: str, country: str, grade: str, subject: str) -> Optional[Path]:
+        return self.find("syllabus", curriculum, country, grade, subject)
+
+    def find_module_file(self, country: str, grade: str, subject: str) -> Optional[Path]:
+        return self.find("module", "", country, grade, subject)
+
+
+# ==========================================
+# 3. SHARED INSTANCE
+# ==========================================
+_catalog: Optional[CurriculumCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(syllabi_root: Path, modules_root: Path) -> CurriculumCatalog:
+    """Returns the process-wide catalog, scanning the tree on first use."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = CurriculumCatalog(syllabi_root, modules_root)
+                stats = _catalog.stats()
+                print(f"📚 Curriculum catalog built: {stats['syllabi']} syllabi, {stats['modules']} modules, {stats['keys']} keys")
+    return _catalog
+
+
+def reset_catalog():
+    """Drops the shared catalog so the next lookup rescans (e.g. after ingesting new files)."""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
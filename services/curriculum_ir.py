@@ -0,0 +1,258 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# ==========================================
+# 1. CANONICAL CURRICULUM IR
+# ==========================================
+# Syllabus and module JSON files were authored by different people and use a
+# zoo of key names for the same thing ("topic_title" / "title" / "theme",
+# "page" / "page_number" / "syllabus_page", ...). Every file is converted
+# once, at load time, into the typed tree below so request handlers read
+# attributes instead of probing dicts. The documents are cached and shared
+# between requests: treat them as read-only.
+
+# Probe orders, first non-empty value wins (merged from the old per-request lookups)
+TOPIC_TITLE_KEYS = ("topic_title", "title", "theme", "unit_title", "name", "topic", "unit", "section", "main_topic", "subtopic_title")
+TOPIC_LIST_KEYS = ("topics", "content", "units")
+SUBTOPIC_LIST_KEYS = ("subtopics", "content", "specific_outcomes", "outcomes", "objectives", "children", "lessons")
+SUBTOPIC_TEXT_KEYS = ("content", "topic", "title", "subtopic", "outcome", "subtopic_title", "description")
+UNIT_KEYS = ("unit", "unit_number", "number")
+PAGE_KEYS = ("syllabus_page", "page_number", "page")
+OUTCOME_KEYS = ("learning_outcomes", "specific_outcomes")
+REFERENCE_KEYS = ("references", "refs", "textbook_refs")
+
+
+def _first(item: Dict[str, Any], keys: Tuple[str, ...], default: Any = None) -> Any:
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return default
+
+
+@dataclass(slots=True)
+class InstructionalBlock:
+    activity_id: Any
+    page: Any
+    hook: Any
+    teacher_steps: Any
+    learner_tasks: Any
+    examples: Any
+    short_notes: Any
+
+    def as_context(self) -> Dict[str, Any]:
+        """The block as it is shown to the LLM (key order matters for prompt stability)."""
+        return {
+            "activity_id": self.activity_id,
+            "page": self.page,
+            "hook": self.hook,
+            "teacher_steps": self.teacher_steps,
+            "learner_tasks": self.learner_tasks,
+            "examples": self.examples,
+            "short_notes": self.short_notes,
+        }
+
+
+@dataclass(slots=True)
+class Subtopic:
+    id: str
+    title: str
+    page: Any = None
+    outcomes: Any = None
+    blocks: Tuple[InstructionalBlock, ...] = ()
+    # Serialized blocks for LLM prompts, filled on first use (see context_text)
+    context_json: Optional[str] = field(default=None, repr=False, compare=False)
+
+    def context_text(self) -> str:
+        """
+        The subtopic's instructional blocks as compact JSON, serialized once
+        per module version. Compact separators keep the prompt tokens down.
+        """
+        if self.context_json is None:
+            self.context_json = json.dumps(
+                [block.as_context() for block in self.blocks],
+                ensure_ascii=False, separators=(",", ":"),
+            )
+        return self.context_json
+
+
+@dataclass(slots=True)
+class Topic:
+    id: str
+    title: str
+    unit: Any = ""
+    page: Any = None
+    subtopics: Tuple[Subtopic, ...] = ()
+    # Syllabus only: the subtopic list as authored (strings or dicts), sent verbatim to the scheme prompt
+    content: Any = ()
+    outcomes: Any = ""
+    references: Tuple[str, ...] = ()
+
+
+@dataclass(slots=True)
+class CurriculumDocument:
+    kind: str                  # "syllabus" or "module"
+    topics: Tuple[Topic, ...]
+    intro: Dict[str, Any] = field(default_factory=dict)
+    source: str = ""           # file name, for logging
+    # Module only: subtopic search index, built on first search (services.module_search)
+    search_index: Any = field(default=None, repr=False, compare=False)
+    # Views derived from this version of the file (e.g. pre-serialized topic trees)
+    derived: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
+
+
+# ==========================================
+# 2. BUILDERS (RAW JSON -> IR)
+# ==========================================
+
+def item_text(item: Any) -> str:
+    """Display text of an authored content / outcome entry: the string itself, or a dict's title/text field."""
+    if isinstance(item, dict):
+        return str(_first(item, SUBTOPIC_TEXT_KEYS, ""))
+    return "" if item is None else str(item)
+
+
+def _topic_items(data: Any) -> List[Any]:
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if not any(key in data for key in TOPIC_LIST_KEYS):
+            # A single topic saved as the whole file
+            return [data]
+        items = _first(data, TOPIC_LIST_KEYS)
+        return items if isinstance(items, list) else []
+    return []
+
+
+def _syllabus_subtopic(sub: Any) -> Optional[Subtopic]:
+    if isinstance(sub, str):
+        return Subtopic(id="", title=sub) if sub else None
+    if isinstance(sub, dict):
+        text = _first(sub, SUBTOPIC_TEXT_KEYS)
+        if not text:
+            return None
+        return Subtopic(
+            id=str(sub.get("subtopic_unit") or sub.get("unit") or sub.get("outcome_unit") or ""),
+            title=str(text),
+            page=sub.get("page_number") or sub.get("page"),
+            outcomes=sub.get("specific_outcomes"),
+        )
+    return None
+
+
+def build_syllabus_ir(data: Any, source: str = "") -> CurriculumDocument:
+    intro = {}
+    if isinstance(data, dict):
+        intro = {
+            "philosophy": data.get("philosophy", ""),
+            "competence_learning": data.get("competence_learning", ""),
+            "goals": data.get("goals", []),
+        }
+
+    topics = []
+    for item in _topic_items(data):
+        if isinstance(item, str):
+            # Bare topic names (a few old files are just a list of strings)
+            topics.append(Topic(id="", title=item))
+            continue
+        if not isinstance(item, dict):
+            continue
+
+        title = _first(item, TOPIC_TITLE_KEYS, "")
+        raw_subtopics = _first(item, SUBTOPIC_LIST_KEYS, [])
+
+        subtopics = []
+        if isinstance(raw_subtopics, list):
+            for sub in raw_subtopics:
+                parsed = _syllabus_subtopic(sub)
+                if parsed is not None:
+                    subtopics.append(parsed)
+
+        refs = _first(item, REFERENCE_KEYS)
+        if isinstance(refs, str):
+            refs = (refs,)
+
+        topics.append(Topic(
+            id=str(item.get("topic_id") or ""),
+            title=title.strip() if isinstance(title, str) else "",
+            unit=_first(item, UNIT_KEYS, ""),
+            page=_first(item, PAGE_KEYS),
+            subtopics=tuple(subtopics),
+            content=item.get("subtopics") or item.get("content") or [],
+            outcomes=_first(item, OUTCOME_KEYS, ""),
+            references=tuple(refs) if isinstance(refs, list) else (refs or ()),
+        ))
+
+    return CurriculumDocument(kind="syllabus", topics=tuple(topics), intro=intro, source=source)
+
+
+def _module_block(block: Dict[str, Any]) -> InstructionalBlock:
+    return InstructionalBlock(
+        activity_id=block.get("activity_number") or block.get("block_id"),
+        page=block.get("page") or block.get("page_number"),
+        hook=block.get("hook"),
+        teacher_steps=block.get("teacher_steps", []),
+        learner_tasks=block.get("learner_tasks", []),
+        examples=block.get("examples", []),
+        short_notes=block.get("short_notes", ""),
+    )
+
+
+def build_module_ir(data: Any, source: str = "") -> CurriculumDocument:
+    topics = []
+    raw_topics = data.get("topics", []) if isinstance(data, dict) else []
+
+    for topic in raw_topics or []:
+        if not isinstance(topic, dict):
+            continue
+
+        subtopics = []
+        for sub in topic.get("sub_topics", []) or []:
+            if not isinstance(sub, dict):
+                continue
+            subtopics.append(Subtopic(
+                id=str(sub.get("subtopic_id", "")),
+                # Most module files use "title"; a few use "subtopic_title"
+                title=sub.get("subtopic_title") or sub.get("title") or "",
+                page=sub.get("page") or sub.get("page_number"),
+                outcomes=sub.get("learning_outcomes") or sub.get("competences"),
+                blocks=tuple(
+                    _module_block(block)
+                    for block in sub.get("instructional_blocks", []) or []
+                    if isinstance(block, dict)
+                ),
+            ))
+
+        topics.append(Topic(
+            id=str(topic.get("topic_id") or ""),
+            title=topic.get("topic_title", ""),
+            page=topic.get("page_number"),
+            subtopics=tuple(subtopics),
+        ))
+
+    return CurriculumDocument(kind="module", topics=tuple(topics), source=source)
+
+
+def ensure_module_ir(module: Any) -> Optional[CurriculumDocument]:
+    """Accepts a cached IR document or a raw module dict (older call sites)."""
+    if module is None or isinstance(module, CurriculumDocument):
+        return module
+    if isinstance(module, dict) and "topics" in module:
+        return build_module_ir(module)
+    return None
+
+
+# ==========================================
+# 3. CACHED LOADERS
+# ==========================================
+
+def load_syllabus_ir_file(path: Path) -> CurriculumDocument:
+    from services.document_cache import document_cache, _load_json
+    return document_cache.get(path, loader=lambda p: build_syllabus_ir(_load_json(p), p.name), variant="syllabus_ir")
+
+
+def load_module_ir_file(path: Path) -> CurriculumDocument:
+    from services.document_cache import document_cache, _load_json
+    return document_cache.get(path, loader=lambda p: build_module_ir(_load_json(p), p.name), variant="module_ir")
@@ -0,0 +1,176 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.curriculum_bundle import get_bundle
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+# Total budget for parsed syllabus/module documents held in memory
+DOCUMENT_CACHE_MAX_MB = float(os.getenv("DOCUMENT_CACHE_MAX_MB", "128"))
+
+# Parsed JSON (dicts, lists, str objects) costs several times its size on disk
+PARSED_SIZE_FACTOR = 6
+
+
+def _load_json(path: Path) -> Any:
+    # Pre-parsed copy from the build-time bundle when it is present and current
+    bundle = get_bundle()
+    if bundle is not None:
+        data = bundle.load(path)
+        if data is not None:
+            return data
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ==========================================
+# 🗃️ SIZE-AWARE LRU OF PARSED DOCUMENTS
+# ==========================================
+
+class _Load:
+    """One parse in progress; threads missing on the same document wait on `done`."""
+    __slots__ = ("generation", "done", "value", "error")
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class DocumentCache:
+    """
+    LRU cache of parsed curriculum documents keyed by resolved path.
+
+    - Entries are invalidated when the file's mtime or size changes.
+    - Capacity is an approximate memory budget, not an entry count.
+    - Cached values are shared between requests: treat them as read-only.
+    - Parsing runs outside the lock, so a cold parse never blocks hits on
+      other documents; concurrent misses for one document wait for one parse.
+    """
+
+    def __init__(self, max_bytes: int, size_factor: int = PARSED_SIZE_FACTOR):
+        self.max_bytes = max_bytes
+        self.size_factor = size_factor
+        self.current_bytes = 0
+
+        # path -> (mtime_ns, file_size, approx_bytes, value)
+        self._entries: "OrderedDict[str, Tuple[int, int, int, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # key -> parse in progress; bumped by invalidate() so a parse that started before it isn't stored
+        self._loading: Dict[str, "_Load"] = {}
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: Path, loader: Callable[[Path], Any] = _load_json, variant: str = "") -> Any:
+        """
+        Returns the parsed document for `path`, parsing it at most once per
+        file version. Loader errors propagate and nothing is cached.
+
+        `variant` caches a different representation of the same file (e.g. the
+        curriculum IR) next to the raw JSON; it is invalidated with the file.
+        """
+        resolved = Path(path).resolve()
+        key = f"{resolved}#{variant}" if variant else str(resolved)
+        stat = resolved.stat()
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                mtime_ns, file_size, approx_bytes, value = cached
+                if mtime_ns == stat.st_mtime_ns and file_size == stat.st_size:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                # File changed on disk since we parsed it
+                self._drop(key)
+                self.invalidations += 1
+
+            load = self._loading.get(key)
+            if load is None:
+                load = self._loading[key] = _Load(self._generation)
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            load.done.wait()
+            if load.error is not None:
+                raise load.error
+            return load.value
+
+        try:
+            load.value = loader(resolved)
+        except BaseException as e:
+            load.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+                approx_bytes = stat.st_size * self.size_factor
+                if load.error is None and load.generation == self._generation and approx_bytes <= self.max_bytes:
+                    self._drop(key)
+                    self._entries[key] = (stat.st_mtime_ns, stat.st_size, approx_bytes, load.value)
+                    self.current_bytes += approx_bytes
+                    self._evict()
+            load.done.set()
+        return load.value
+
+    def invalidate(self, path: Optional[Path] = None):
+        """Drops one document, or everything when no path is given."""
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._entries.clear()
+                self.current_bytes = 0
+                return
+            key = str(Path(path).resolve())
+            for cached_key in [k for k in self._entries if k == key or k.startswith(key + "#")]:
+                self._drop(cached_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "approx_mb": round(self.current_bytes / (1024 * 1024), 2),
+                "max_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    # ---------- internals (call with lock held) ----------
+
+    def _drop(self, key: str):
+        cached = self._entries.pop(key, None)
+        if cached is not None:
+            self.current_bytes -= cached[2]
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, (_, _, approx_bytes, _) = self._entries.popitem(last=False)
+            self.current_bytes -= approx_bytes
+            self.evictions += 1
+
+
+# Shared by load_syllabus / load_module (and anything else reading curriculum JSON)
+document_cache = DocumentCache(max_bytes=int(DOCUMENT_CACHE_MAX_MB * 1024 * 1024))
@@ -1,34 +1,86 @@
-from services.firebase_setup import db
+import os
+from services.firebase_setup import async_db
+from services.write_behind import WriteBehindQueue, QueueFull, PERSIST_WRITE_BEHIND
+from services.scheme_cache import scheme_cache, ANY_TEACHER
 from google.cloud.firestore import Query
 from datetime import datetime
-from typing import Union, List, Dict, Any
+from typing import Union, List, Dict, Any, Optional
+
+# What the school sub-collection gets on a dual save:
+#   "full"     a complete copy of the document (default, what school dashboards read today)
+#   "summary"  the metadata only, plus a pointer to the root document
+SCHOOL_COPY_MODE = os.getenv("SCHOOL_COPY_MODE", "full").lower()
+
+# The generated content itself; everything else on a payload is small metadata
+HEAVY_FIELDS = ("schemeData", "introInfo", "planData", "lessonData", "recordData", "examData", "data")
 
 # ==============================================================================
 # 🛠️ HELPER: DUAL SAVE (Root + School Collection)
 # ==============================================================================
-def save_to_firestore_dual(collection_name: str, data: dict, school_id: str = None):
+def school_copy_of(collection_name: str, doc_id: str, data: dict, mode: str = SCHOOL_COPY_MODE) -> dict:
+    """The document stored under schools/{id}/{collection_name}/{doc_id}."""
+    if mode != "summary":
+        return data
+    summary = {key: value for key, value in data.items() if key not in HEAVY_FIELDS}
+    summary.update({"isSummary": True, "rootCollection": collection_name, "rootDocId": doc_id})
+    return summary
+
+def stage_dual_write(batch, collection_name: str, doc_id: str, data: dict, school_id: str = None, school_copy: Optional[str] = None):
+    """Adds the root document and, with a school_id, the school's copy to `batch`."""
+    # 1. Root Collection (e.g., 'generated_weekly_plans')
+    batch.set(async_db.collection(collection_name).document(doc_id), data)
+
+    # 2. If School ID exists, the school's copy goes in the same batch
+    if school_id:
+        # Structure: schools/{school_id}/{collection_name}/{doc_id}
+        school_doc_ref = async_db.collection("schools").document(school_id)\
+                           .collection(collection_name).document(doc_id)
+        batch.set(school_doc_ref, school_copy_of(collection_name, doc_id, data, school_copy or SCHOOL_COPY_MODE))
+
+async def commit_dual_writes(items: List[Dict[str, Any]]):
+    """Write-behind flush: every queued save in one WriteBatch (IDs were fixed at enqueue, so retries overwrite)."""
+    batch = async_db.batch()
+    for item in items:
+        stage_dual_write(batch, item["collection"], item["doc_id"], item["data"], item.get("school_id"), item.get("school_copy"))
+    await batch.commit()
+
+dual_write_queue = WriteBehindQueue("firestore_dual_writes", commit_dual_writes)
+
+async def save_to_firestore_dual(collection_name: str, data: dict, school_id: str = None, school_copy: Optional[str] = None):
     """
     Saves data to the root collection AND the school's sub-collection if school_id is present.
+    Both writes go in one WriteBatch: a single round trip, and neither lands without the other.
+    `school_copy` overrides SCHOOL_COPY_MODE for this save.
+
+    While the write-behind queue runs (see main.py lifespan) the save is only
+    journaled and queued here; the batch is committed in the background.
     """
     try:
-        # 1. Create a Reference in the Root Collection (e.g., 'generated_weekly_plans')
-        doc_ref = db.collection(collection_name).document()
+        # Assigned locally, no round trip
+        doc_id = async_db.collection(collection_name).document().id
         
         # Add schoolId to the data payload if it exists
         if school_id:
             data["schoolId"] = school_id
 
-        # Save to Root
-        doc_ref.set(data)
-        print(f"💾 Saved to Root: {collection_name}/{doc_ref.id}")
-
-        # 2. If School ID exists, Save a Copy to School's Sub-Collection
+        if PERSIST_WRITE_BEHIND and dual_write_queue.running:
+            try:
+                await dual_write_queue.enqueue({
+                    "collection": collection_name, "doc_id": doc_id, "data": data,
+                    "school_id": school_id, "school_copy": school_copy,
+                })
+                print(f"📝 Queued for Firestore: {collection_name}/{doc_id}")
+                return True
+            except (QueueFull, TypeError) as e:
+                # Backlog full (Firestore outage) or a value only Firestore can encode: save it now
+                print(f"⚠️ Not queued ({e}), saving synchronously: {collection_name}/{doc_id}")
+
+        batch = async_db.batch()
+        stage_dual_write(batch, collection_name, doc_id, data, school_id, school_copy)
+        await batch.commit()
+        print(f"💾 Saved to Root: {collection_name}/{doc_id}")
         if school_id:
-            # Structure: schools/{school_id}/{collection_name}/{doc_id}
-            school_doc_ref = db.collection("schools").document(school_id)\
-                               .collection(collection_name).document(doc_ref.id)
-            school_doc_ref.set(data)
-            print(f"🏫 Saved to School: schools/{school_id}/{collection_name}/{doc_ref.id}")
+            print(f"🏫 Saved to School: schools/{school_id}/{collection_name}/{doc_id}")
 
         return True
     except Exception as e:
@@ -38,7 +90,7 @@ def save_to_firestore_dual(collection_name: str, data: dict, school_id: str = No
 # ==========================================
 # 1. SCHEMES OF WORK
 # ==========================================
-def save_generated_scheme(uid: str, subject: str, grade: str, term: str, school_name: str, data: Union[List, Dict], school_id: str = None):
+async def save_generated_scheme(uid: str, subject: str, grade: str, term: str, school_name: str, data: Union[List, Dict], school_id: str = None):
     """
     Saves scheme to 'generated_schemes' AND 'schools/{id}/generated_schemes'.
     """
@@ -75,21 +127,34 @@ def save_generated_scheme(uid: str, subject: str, grade: str, term: str, school_
         "source": "backend_auto_save"
     }
 
-    return save_to_firestore_dual("generated_schemes", payload, school_id)
-
-def load_generated_scheme(uid: str, subject: str, grade: str, term: str):
+    saved = await save_to_firestore_dual("generated_schemes", payload, school_id)
+    if saved:
+        # Weekly plans and records generated next read these rows without a round trip
+        # (and before a write-behind flush has landed)
+        scheme_cache.put(scheme_cache.key(uid, subject, grade, term), final_scheme_list)
+        scheme_cache.invalidate(scheme_cache.key(ANY_TEACHER, subject, grade, term))
+    return saved
+
+async def _query_latest_scheme(uid: str, subject: str, grade: str, term: str):
+    docs = (async_db.collection("generated_schemes")
+            .where("userId", "==", uid)
+            .where("subject", "==", subject)
+            .where("grade", "==", grade)
+            .where("term", "==", term)
+            .order_by("createdAt", direction=Query.DESCENDING)
+            .limit(1).stream())
+
+    async for doc in docs:
+        return doc.to_dict().get("schemeData", [])
+    return []
+
+async def load_generated_scheme(uid: str, subject: str, grade: str, term: str) -> List[Dict[str, Any]]:
+    """Rows of the teacher's latest scheme (see services.scheme_cache for the row shape), [] if none."""
     try:
-        docs = (db.collection("generated_schemes")
-                .where("userId", "==", uid)
-                .where("subject", "==", subject)
-                .where("grade", "==", grade)
-                .where("term", "==", term)
-                .order_by("createdAt", direction=Query.DESCENDING)
-                .limit(1).stream())
-        
-        for doc in docs:
-            return doc.to_dict().get("schemeData", [])
-        return []
+        return await scheme_cache.get_or_load(
+            scheme_cache.key(uid, subject, grade, term),
+            lambda: _query_latest_scheme(uid, subject, grade, term),
+        )
     except Exception as e:
         print(f"❌ Read Error: {e}")
         return []
@@ -97,7 +162,7 @@ def load_generated_scheme(uid: str, subject: str, grade: str, term: str):
 # ==========================================
 # 2. WEEKLY PLANS
 # ==========================================
-def save_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int, school_name: str, data: dict, school_id: str = None):
+async def save_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int, school_name: str, data: dict, school_id: str = None):
     """
     Saves plan to 'generated_weekly_plans' AND 'schools/{id}/generated_weekly_plans'.
     """
@@ -119,11 +184,11 @@ def save_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int, s
         "source": "backend_auto_save"
     }
     
-    return save_to_firestore_dual("generated_weekly_plans", payload, school_id)
+    return await save_to_firestore_dual("generated_weekly_plans", payload, school_id)
 
-def load_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int):
+async def load_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int):
     try:
-        docs = (db.collection("generated_weekly_plans")
+        docs = (async_db.collection("generated_weekly_plans")
                 .where("userId", "==", uid)
                 .where("subject", "==", subject)
                 .where("grade", "==", grade)
@@ -132,7 +197,7 @@ def load_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int):
                 .order_by("createdAt", direction=Query.DESCENDING)
                 .limit(1).stream())
 
-        for doc in docs:
+        async for doc in docs:
             return doc.to_dict().get("planData", {})
         return None
     except Exception:
@@ -141,7 +206,7 @@ def load_weekly_plan(uid: str, subject: str, grade: str, term: str, week: int):
 # ==========================================
 # 3. LESSON PLANS
 # ==========================================
-def save_lesson_plan(
+async def save_lesson_plan(
     uid: str, subject: str, grade: str, school_name: str, data: dict, 
     term: str = "Term 1", week: int = 1, topic: str = "General Lesson",
     school_id: str = None
@@ -172,11 +237,11 @@ def save_lesson_plan(
         "source": "backend_auto_save"
     }
 
-    return save_to_firestore_dual("generated_lesson_plans", payload, school_id)
+    return await save_to_firestore_dual("generated_lesson_plans", payload, school_id)
 
-def load_lesson_plan(uid: str, subject: str, grade: str, term: str, week: int, subtopic: str = None):
+async def load_lesson_plan(uid: str, subject: str, grade: str, term: str, week: int, subtopic: str = None):
     try:
-        query_ref = (db.collection("generated_lesson_plans")
+        query_ref = (async_db.collection("generated_lesson_plans")
                      .where("userId", "==", uid)
                      .where("subject", "==", subject)
                      .where("grade", "==", grade)
@@ -188,7 +253,7 @@ def load_lesson_plan(uid: str, subject: str, grade: str, term: str, week: int, s
 
         docs = query_ref.order_by("createdAt", direction=Query.DESCENDING).limit(1).stream()
 
-        for doc in docs:
+        async for doc in docs:
             return doc.to_dict().get("lessonData", {})
         return None
     except Exception:
@@ -197,7 +262,7 @@ def load_lesson_plan(uid: str, subject: str, grade: str, term: str, week: int, s
 # ==========================================
 # 4. RECORDS OF WORK (NEW)
 # ==========================================
-def save_record_of_work(
+async def save_record_of_work(
     uid: str, subject: str, grade: str, term: str, week: int, 
     school_name: str, topic: str, data: dict, school_id: str = None
 ):
@@ -223,12 +288,12 @@ def save_record_of_work(
         "source": "backend_auto_save"
     }
     
-    return save_to_firestore_dual("generated_records_of_work", payload, school_id)
+    return await save_to_firestore_dual("generated_records_of_work", payload, school_id)
 
 # ==========================================
 # 5. RESOURCES (WORKSHEETS & NOTES)
 # ==========================================
-def save_resource(uid: str, resource_type: str, data: dict, meta: dict, school_id: str = None):
+async def save_resource(uid: str, resource_type: str, data: dict, meta: dict, school_id: str = None):
     """
     Saves worksheets/notes to root AND 'schools/{id}/generated_resources'.
     """
@@ -247,13 +312,13 @@ def save_resource(uid: str, resource_type: str, data: dict, meta: dict, school_i
         "source": "backend_auto_save"
     }
 
-    return save_to_firestore_dual(col_name, payload, school_id)
+    return await save_to_firestore_dual(col_name, payload, school_id)
 
 
     # ==========================================
 # 6. EXAMS & ASSESSMENTS
 # ==========================================
-def save_generated_exam(
+async def save_generated_exam(
     uid: str, subject: str, grade: str, term: str, 
     school_name: str, exam_data: dict, school_id: str = None
 ):
@@ -276,13 +341,13 @@ def save_generated_exam(
         "source": "backend_auto_save"
     }
     
-    return save_to_firestore_dual("generated_exams", payload, school_id)
+    return await save_to_firestore_dual("generated_exams", payload, school_id)
 
 
 # ==========================================
 # 7. CATCH-UP (TaRL) PLANS
 # ==========================================
-def save_catchup_plan(uid: str, school_id: str, plan_data: dict, meta: dict):
+async def save_catchup_plan(uid: str, school_id: str, plan_data: dict, meta: dict):
     """
     Saves the generated Catch-Up lesson plan to Firestore.
     """
@@ -302,4 +367,4 @@ def save_catchup_plan(uid: str, school_id: str, plan_data: dict, meta: dict):
     }
 
     # Saving it under "generated_catchup" (or change to your preferred collection name)
-    return save_to_firestore_dual("generated_catchup", payload, school_id)
\ No newline at end of file
+    return await save_to_firestore_dual("generated_catchup", payload, school_id)
\ No newline at end of file
@@ -1,14 +1,28 @@
 import os
 import json
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
+from google.auth.credentials import AnonymousCredentials
+
+
+class _EmulatorCredential(credentials.Base):
+    """The Firestore emulator accepts any caller, so no service account is needed."""
+
+    def get_credential(self):
+        return AnonymousCredentials()
+
 
 if not firebase_admin._apps:
     firebase_json = os.getenv("FIREBASE_SERVICE_ACCOUNT")
+    options = None
 
     if firebase_json:
         # Production / Render
         cred = credentials.Certificate(json.loads(firebase_json))
+    elif os.getenv("FIRESTORE_EMULATOR_HOST"):
+        # Local Firestore emulator (e.g. scripts/load_test_firestore.py)
+        cred = _EmulatorCredential()
+        options = {"projectId": os.getenv("GOOGLE_CLOUD_PROJECT", "demo-booxclash")}
     else:
         # Local development ONLY
         if not os.path.exists("serviceAccountKey.json"):
@@ -18,6 +32,10 @@ if not firebase_admin._apps:
             )
         cred = credentials.Certificate("serviceAccountKey.json")
 
-    firebase_admin.initialize_app(cred)
+    firebase_admin.initialize_app(cred, options)
 
 db = firestore.client()
+
+# Async client (google.cloud.firestore.AsyncClient) for everything awaited from
+# request handlers: a round trip suspends the request instead of the worker
+async_db = firestore_async.client()
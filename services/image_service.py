@@ -1,4 +1,4 @@
-import google.generativeai as genai
+from google import genai
 from google.genai import types
 from core.config import settings
 import base64
@@ -9,7 +9,8 @@ async def generate_fast_image(prompt: str) -> str:
     print(f"🎨 Painting: {prompt}")
     try:
         # CORRECT METHOD: Use the Image Generation model, not the text model
-        response = client.models.generate_images(
+        # (client.aio: the async surface, so the event loop keeps serving while Imagen paints)
+        response = await client.aio.models.generate_images(
             model='imagen-3.0-generate-001',
             prompt=prompt,
             config=types.GenerateImagesConfig(
@@ -0,0 +1,191 @@
+import re
+import json
+from typing import Any, List, Tuple
+
+# ==========================================
+# 🧽 JSON EXTRACTION & REPAIR FOR MODEL OUTPUT
+# ==========================================
+# One pass over the response, jumping between interesting characters with
+# a compiled regex instead of walking it char by char:
+#
+#   - chatter and ```json fences before the first { or [ are skipped
+#   - the outermost value ends at its matching bracket (string-aware), so
+#     chatter after it, or a second JSON blob, is ignored
+#   - // comments echoed from our prompt templates are dropped
+#   - trailing commas before } or ] are dropped
+#   - raw newlines / tabs inside strings are escaped
+#   - a truncated tail is cut back to the last complete value, and every
+#     open object / array is closed
+#
+# A value closed that way is missing content, so parse_json raises
+# TruncatedJSONError for it unless the caller opts in with allow_truncated.
+#
+# Nothing here logs the payload; callers log sizes at most.
+
+_OUTSIDE = re.compile(r'["{}\[\],:/]')
+_INSIDE = re.compile(r'["\\\x00-\x1f]')
+_STRING = re.compile(r'"(?:[^"\\\x00-\x1f]|\\.)*"', re.S)
+_SKIPPABLE = re.compile(r'(?:\s+|//[^\n]*)*')
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class TruncatedJSONError(ValueError):
+    """The model output was cut off before its outermost JSON value closed."""
+
+
+def _value_start(text: str) -> int:
+    brace, bracket = text.find("{"), text.find("[")
+    if brace == -1 or bracket == -1:
+        return max(brace, bracket)
+    return min(brace, bracket)
+
+
+def repair_json(text: str) -> Tuple[str, bool]:
+    """
+    (repaired JSON text, truncated?) for the outermost JSON value in `text`.
+    `truncated` means the value never closed and its tail was cut back and
+    closed here, so the result is missing content. Raises ValueError.
+    """
+    start = _value_start(text or "")
+    if start == -1:
+        raise ValueError("no JSON value in model output")
+
+    out: List[str] = []
+    flushed = 0                      # characters already moved to `out`
+    seg = start                      # start of the text not yet flushed
+    closers: List[str] = []
+    after_colon = False
+    safe_pos, safe_closers = 0, ""   # last cut point that leaves valid JSON
+    n = len(text)
+    i = start
+
+    def flush(end: int):
+        nonlocal flushed
+        out.append(text[seg:end])
+        flushed += end - seg
+
+    while True:
+        m = _OUTSIDE.search(text, i)
+        if m is None:
+            break
+        i = m.start()
+        ch = text[i]
+
+        if ch == '"':
+            whole = _STRING.match(text, i)
+            if whole is not None:
+                j, closed = whole.end(), True
+            else:
+                j, closed = i + 1, False
+            while not closed:
+                s = _INSIDE.search(text, j)
+                if s is None:
+                    break
+                k = s.start()
+                c = text[k]
+                if c == '"':
+                    j, closed = k + 1, True
+                    break
+                if c == "\\":
+                    j = k + 2
+                    continue
+                flush(k)
+                out.append(_CONTROL_ESCAPES.get(c, "\\u%04x" % ord(c)))
+                flushed += len(out[-1])
+                seg = j = k + 1
+            if not closed:
+                break  # truncated inside a string
+            is_value = after_colon or (closers and closers[-1] == "]")
+            after_colon = False
+            i = j
+            if is_value:
+                safe_pos, safe_closers = flushed + (i - seg), "".join(reversed(closers))
+            continue
+
+        after_colon = ch == ":"
+        if ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            i += 1
+            safe_pos, safe_closers = flushed + (i - seg), "".join(reversed(closers))
+        elif ch in "}]":
+            if closers:
+                closers.pop()
+            i += 1
+            if not closers:
+                flush(i)
+                return "".join(out), False
+            safe_pos, safe_closers = flushed + (i - seg), "".join(reversed(closers))
+        elif ch == ",":
+            k = _SKIPPABLE.match(text, i + 1).end()
+            if k < n and text[k] in "}]":
+                flush(i)
+                seg = i + 1  # trailing comma
+            else:
+                safe_pos, safe_closers = flushed + (i - seg), "".join(reversed(closers))
+            i += 1
+        elif ch == "/":
+            if text.startswith("//", i):
+                flush(i)
+                newline = text.find("\n", i)
+                i = seg = n if newline == -1 else newline
+            else:
+                i += 1
+        else:  # ":"
+            i += 1
+
+    # Truncated: keep everything up to the last complete value, then close
+    flush(n)
+    body = "".join(out)[:safe_pos].rstrip()
+    if body.endswith(","):
+        body = body[:-1]
+    return body + safe_closers, True
+
+
+def repair_json_text(text: str) -> str:
+    """The outermost JSON value in `text`, cleaned up so json.loads accepts it. Raises ValueError."""
+    return repair_json(text)[0]
+
+
+def parse_json(text: str, *, allow_truncated: bool = False) -> Any:
+    """
+    json.loads for model output. The common cases stay at C speed: the bare
+    response, then the span between the first opener and the last matching
+    closer (i.e. minus fences and chatter). The repair pass runs only when
+    both fail. A response that was cut off raises TruncatedJSONError (a
+    ValueError) instead of coming back as a partial document, unless
+    `allow_truncated` is set.
+    """
+    try:
+        return json.loads(text)
+    except (ValueError, TypeError):
+        pass
+    start = _value_start(text or "")
+    if start != -1:
+        end = text.rfind("}" if text[start] == "{" else "]")
+        if end > start:
+            try:
+                return json.loads(text[start:end + 1])
+            except ValueError:
+                pass
+    repaired, truncated = repair_json(text)
+    if truncated and not allow_truncated:
+        raise TruncatedJSONError("model output was cut off before the JSON value closed")
+    return json.loads(repaired)
+
+
+def loads_tolerant(raw: str) -> Any:
+    """json.loads for a fragment that should be complete (e.g. one streamed element)."""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        if _value_start(raw) == -1:
+            raise
+    return json.loads(repair_json_text(raw))
+
+
+def extract_json_string(text: str) -> str:
+    """Drop-in for the old per-module helpers: the repaired JSON text, or the input if there is none."""
+    try:
+        return repair_json_text(text)
+    except ValueError:
+        return (text or "").strip()
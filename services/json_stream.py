@@ -0,0 +1,214 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from services.json_repair import loads_tolerant
+
+# ==========================================
+# 🌊 INCREMENTAL JSON PARSER FOR STREAMED LLM OUTPUT
+# ==========================================
+# Fed Gemini's output chunk by chunk, yields every element of the requested
+# array paths as soon as that element closes, long before the whole document
+# is valid JSON. Paths are dotted keys from the root, with "[]" for "each
+# element of this array":
+#
+#   "scheme_weeks"              {"scheme_weeks": [ <yielded>, ... ]}
+#   "days"                      weekly plan days
+#   "steps"                     lesson plan steps
+#   "case_study[].questions"    questions inside every case study
+#   "$"                         elements of a root-level array
+#
+# Tolerated on the way: leading chatter and ```json fences (everything
+# before the first { or [ is skipped, everything after the root closes is
+# ignored), // comments echoed from our prompt templates, and trailing
+# commas inside an element.
+
+ANY_ELEMENT = "[]"
+ROOT = "$"
+
+
+class StreamedElement(NamedTuple):
+    path: str
+    index: int
+    value: Any
+
+
+def parse_path(path: str) -> Tuple[str, ...]:
+    """ "case_study[].questions" -> ("case_study", "[]", "questions"); "$" -> () """
+    steps: List[str] = []
+    for part in path.split("."):
+        if not part or part == ROOT:
+            continue
+        while part.endswith(ANY_ELEMENT) and part != ANY_ELEMENT:
+            part = part[:-len(ANY_ELEMENT)]
+            steps.append(part)
+            part = ANY_ELEMENT
+        steps.append(part)
+    return tuple(steps)
+
+
+class _Frame:
+    __slots__ = ("is_object", "path", "key", "expect_key", "target")
+
+    def __init__(self, is_object: bool, path: Tuple[str, ...], target: Optional[str]):
+        self.is_object = is_object
+        self.path = path
+        self.key: Optional[str] = None
+        self.expect_key = is_object
+        # Name of the requested path when this frame is one of the target arrays
+        self.target = target
+
+
+class IncrementalJSONParser:
+    """
+    One instance per response. feed() returns the elements completed by that
+    chunk; `finished` turns True once the root value has closed.
+    """
+
+    def __init__(self, paths: Iterable[str]):
+        self.targets: Dict[Tuple[str, ...], str] = {parse_path(p): p for p in paths}
+        self.counts: Dict[str, int] = {name: 0 for name in self.targets.values()}
+        self.errors = 0
+        self.finished = False
+
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._in_comment = False
+        # (target name, start offset, stack depth) of each element being captured;
+        # nested when a target array sits inside another target's element
+        self._captures: List[Tuple[str, int, int]] = []
+
+    def feed(self, chunk: str) -> List[StreamedElement]:
+        if self.finished or not chunk:
+            return []
+        self._text += chunk
+        found: List[StreamedElement] = []
+        text = self._text
+        n = len(text)
+        i = self._pos
+
+        while i < n:
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_closed(text, i, found)
+                i += 1
+                continue
+
+            if self._in_comment:
+                if ch == "\n":
+                    self._in_comment = False
+                i += 1
+                continue
+
+            if ch == "/" and self._stack:
+                if i + 1 >= n:
+                    break  # can't tell "//" from a stray "/" yet
+                if text[i + 1] == "/":
+                    self._in_comment = True
+                    i += 2
+                    continue
+
+            if not self._stack:
+                # Leading chatter / code fence: wait for the root value
+                if ch in "{[":
+                    self._push(ch == "{", ())
+                i += 1
+                continue
+
+            if ch.isspace():
+                i += 1
+                continue
+
+            top = self._stack[-1]
+            if ch in ",}]":
+                self._close_scalar(text, i, found)
+                if ch == ",":
+                    if top.is_object:
+                        top.expect_key = True
+                else:
+                    self._stack.pop()
+                    if not self._stack:
+                        self.finished = True
+                        self._pos = i + 1
+                        return found
+                    self._value_closed(text, i + 1, found)
+                i += 1
+                continue
+
+            if ch == ":":
+                i += 1
+                continue
+
+            starts_value = not (top.is_object and top.expect_key)
+            if starts_value:
+                self._maybe_capture(top, i)
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._push(ch == "{", self._child_path(top))
+            # Anything else is part of a number / true / false / null
+            i += 1
+
+        self._pos = i
+        return found
+
+    # ------------------------------------------
+    # state transitions
+    # ------------------------------------------
+
+    def _child_path(self, parent: _Frame) -> Tuple[str, ...]:
+        return parent.path + ((parent.key or "",) if parent.is_object else (ANY_ELEMENT,))
+
+    def _push(self, is_object: bool, path: Tuple[str, ...]):
+        self._stack.append(_Frame(is_object, path, None if is_object else self.targets.get(path)))
+
+    def _maybe_capture(self, parent: _Frame, start: int):
+        depth = len(self._stack)
+        if parent.target is not None and not (self._captures and self._captures[-1][2] == depth):
+            self._captures.append((parent.target, start, depth))
+
+    def _string_closed(self, text: str, end: int, found: List[StreamedElement]):
+        top = self._stack[-1] if self._stack else None
+        if top is not None and top.is_object and top.expect_key:
+            top.key = text[self._string_start + 1:end]
+            top.expect_key = False
+            return
+        self._value_closed(text, end + 1, found)
+
+    def _value_closed(self, text: str, end: int, found: List[StreamedElement]):
+        if self._captures and self._captures[-1][2] == len(self._stack):
+            name, start, _ = self._captures.pop()
+            self._emit(name, text[start:end], found)
+
+    def _close_scalar(self, text: str, end: int, found: List[StreamedElement]):
+        # A capture still open at this depth when , } ] arrives is a bare scalar
+        if self._captures and self._captures[-1][2] == len(self._stack):
+            name, start, _ = self._captures.pop()
+            self._emit(name, text[start:end].strip(), found)
+
+    def _emit(self, name: str, raw: str, found: List[StreamedElement]):
+        try:
+            value = loads_tolerant(raw)
+        except ValueError:
+            self.errors += 1
+            return
+        found.append(StreamedElement(name, self.counts[name], value))
+        self.counts[name] += 1
+
+
+def iter_elements(chunks: Iterable[str], paths: Iterable[str]):
+    """Convenience generator over an already-chunked response."""
+    parser = IncrementalJSONParser(paths)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
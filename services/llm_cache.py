@@ -0,0 +1,456 @@
+import os
+import copy
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Repeatable generations (lesson notes, chalkboard diagrams, catch-up plans,
+# SBA tasks) are a function of their curriculum inputs and the prompt
+# template, so identical requests from different teachers can share one
+# answer. Backends are tried fastest first; a hit in a slower tier is
+# copied into the faster ones.
+#
+#   LLM_CACHE_BACKENDS=memory                 (default, per instance)
+#   LLM_CACHE_BACKENDS=memory,disk            (per host, LLM_CACHE_DISK_MB on LLM_CACHE_DIR)
+#   LLM_CACHE_BACKENDS=memory,firestore       (shared across instances)
+#   LLM_CACHE_BACKENDS=                       (disabled)
+#
+# Only use "disk" where LLM_CACHE_DIR is a real disk. On Cloud Run the
+# filesystem, /tmp included, is held in the container's memory, so it only
+# adds a second copy of what the memory tier already holds.
+
+LLM_CACHE_BACKENDS = os.getenv("LLM_CACHE_BACKENDS", "memory")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_MB = float(os.getenv("LLM_CACHE_MEMORY_MB", "64"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "booxclash_llm_cache"))
+LLM_CACHE_DISK_MB = float(os.getenv("LLM_CACHE_DISK_MB", "256"))
+LLM_CACHE_COLLECTION = os.getenv("LLM_CACHE_COLLECTION", "llm_response_cache")
+
+# Firestore documents are capped at 1 MiB
+FIRESTORE_MAX_VALUE_BYTES = 900_000
+
+
+def _normalize(value: Any) -> Any:
+    """Case and whitespace differences in teacher input should not split the cache."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_cache_key(kind: str, prompt_version: str, inputs: Dict[str, Any], *, exact: bool = False) -> str:
+    """
+    Content address of a generation: sha256 over the normalized inputs and the
+    prompt template version. Pass curriculum context text itself as an input so
+    a module or syllabus edit produces a new key. exact=True hashes the inputs
+    as given, for whole prompts where case carries meaning (names).
+    """
+    material = json.dumps(
+        {"kind": kind, "version": prompt_version, "inputs": inputs if exact else _normalize(inputs)},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return f"{kind}:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+
+# ==========================================
+# 🗄️ BACKENDS
+# ==========================================
+# Values are stored as JSON text, so every hit hands the caller a fresh copy
+# it can personalise (school name, logo...) without touching the cache.
+
+class MemoryBackend:
+    """Per-process LRU with an approximate byte budget (diagrams are large)."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, text: str, expires_at: float):
+        size = len(text)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[1])
+            self._entries[key] = (expires_at, text)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def delete(self, key: str):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old[1])
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class DiskBackend:
+    """
+    One JSON file per key under LLM_CACHE_DIR; survives restarts on the same
+    host. Files are LRU-evicted to keep the directory under `max_bytes`
+    (expired entries age out with them). The LRU order starts from the file
+    mtimes an earlier process left.
+    """
+
+    name = "disk"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # path -> size on disk, least recently used first
+        self._files: "OrderedDict[Path, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        existing = []
+        for path in self.directory.glob("*/*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            existing.append((stat.st_mtime, path, stat.st_size))
+        with self._lock:
+            for _, path, size in sorted(existing):
+                self._files[path] = size
+                self.current_bytes += size
+            self._evict()
+
+    def _path(self, key: str) -> Path:
+        kind, _, digest = key.partition(":")
+        return self.directory / kind / digest[:2] / f"{digest}.json"
+
+    def _forget(self, path: Path):
+        size = self._files.pop(path, None)
+        if size is not None:
+            self.current_bytes -= size
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._files:
+            path, size = self._files.popitem(last=False)
+            self.current_bytes -= size
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            entry = record["expires_at"], record["value"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._forget(path)
+            return None
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+        return entry
+
+    def set(self, key: str, text: str, expires_at: float):
+        payload = json.dumps({"expires_at": expires_at, "value": text}, ensure_ascii=False).encode("utf-8")
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        with self._lock:
+            self._forget(path)
+            self._files[path] = len(payload)
+            self.current_bytes += len(payload)
+            self._evict()
+
+    def delete(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            self._forget(path)
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+    def size(self) -> int:
+        return len(self._files)
+
+
+class FirestoreBackend:
+    """Shared across instances: one document per key in LLM_CACHE_COLLECTION."""
+
+    name = "firestore"
+
+    def __init__(self, collection: str):
+        from services.firebase_setup import db
+        self.collection = db.collection(collection)
+
+    def get(self, key: str) -> Optional[Tuple[float, str]]:
+        snapshot = self.collection.document(key.replace(":", "_")).get()
+        if not snapshot.exists:
+            return None
+        record = snapshot.to_dict() or {}
+        if "value" not in record:
+            return None
+        return record.get("expires_at", 0), record["value"]
+
+    def set(self, key: str, text: str, expires_at: float):
+        if len(text.encode("utf-8")) > FIRESTORE_MAX_VALUE_BYTES:
+            return
+        self.collection.document(key.replace(":", "_")).set({
+            "kind": key.partition(":")[0],
+            "value": text,
+            "expires_at": expires_at,
+        })
+
+    def delete(self, key: str):
+        self.collection.document(key.replace(":", "_")).delete()
+
+
+def _build_backends(spec: str) -> List[Any]:
+    backends = []
+    for name in [part.strip().lower() for part in spec.split(",") if part.strip()]:
+        try:
+            if name == "memory":
+                backends.append(MemoryBackend(int(LLM_CACHE_MEMORY_MB * 1024 * 1024)))
+            elif name == "disk":
+                backends.append(DiskBackend(LLM_CACHE_DIR, int(LLM_CACHE_DISK_MB * 1024 * 1024)))
+            elif name == "firestore":
+                backends.append(FirestoreBackend(LLM_CACHE_COLLECTION))
+            else:
+                print(f"⚠️ [LLM Cache] Unknown backend '{name}', skipping")
+        except Exception as e:
+            print(f"⚠️ [LLM Cache] Backend '{name}' unavailable: {e}")
+    return backends
+
+
+# ==========================================
+# ⚡ THE CACHE
+# ==========================================
+
+class LLMResponseCache:
+    """Content-addressed cache of parsed generation results, in front of llm_gateway."""
+
+    def __init__(self, backends: List[Any], ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.backends = backends
+        self.ttl_seconds = ttl_seconds
+        # kind -> {"hits", "misses", "bypassed", "stored", "coalesced"}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.backend_hits: Dict[str, int] = {b.name: 0 for b in backends}
+        self.errors = 0
+        self.saved_seconds = 0.0
+        # kind -> average seconds a miss took to generate
+        self._generate_seconds: Dict[str, Tuple[float, int]] = {}
+        # key -> the one generation currently running for it
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backends)
+
+    def _count(self, kind: str, field: str):
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "bypassed": 0, "stored": 0, "coalesced": 0})
+        counters[field] += 1
+
+    async def _call(self, backend, method: str, *args):
+        # Memory is a dict lookup; disk and Firestore go to a worker thread
+        if backend.name == "memory":
+            return getattr(backend, method)(*args)
+        return await asyncio.to_thread(getattr(backend, method), *args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        for tier, backend in enumerate(self.backends):
+            try:
+                entry = await self._call(backend, "get", key)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ [LLM Cache] {backend.name} read failed: {e}")
+                continue
+            if entry is None:
+                continue
+            expires_at, text = entry
+            if expires_at <= now:
+                try:
+                    await self._call(backend, "delete", key)
+                except Exception:
+                    pass
+                continue
+
+            self.backend_hits[backend.name] += 1
+            # Promote into the faster tiers
+            for faster in self.backends[:tier]:
+                try:
+                    await self._call(faster, "set", key, text, expires_at)
+                except Exception:
+                    self.errors += 1
+            return json.loads(text)
+        return None
+
+    async def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        expires_at = time.time() + (ttl_seconds or self.ttl_seconds)
+        for backend in self.backends:
+            try:
+                await self._call(backend, "set", key, text, expires_at)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ [LLM Cache] {backend.name} write failed: {e}")
+
+    async def get_or_generate(
+        self,
+        kind: str,
+        prompt_version: str,
+        inputs: Dict[str, Any],
+        generate: Callable[[], Awaitable[Any]],
+        *,
+        regenerate: bool = False,
+        cacheable: Callable[[Any], bool] = lambda value: True,
+        ttl_seconds: Optional[int] = None,
+    ) -> Any:
+        """
+        Cached result for these inputs, else `await generate()` and store it.
+        regenerate=True skips the lookup (the teacher asked for a fresh take)
+        and runs its own generation rather than joining one in flight, but
+        still stores the new answer. Exceptions from `generate` propagate
+        and nothing is cached; `cacheable` can also reject soft failures.
+        Concurrent misses for the same key share one generation (see _single_flight).
+        """
+        key = make_cache_key(kind, prompt_version, inputs)
+        if regenerate:
+            self._count(kind, "bypassed")
+            return await self._run_flight(kind, key, generate, True, cacheable, ttl_seconds)
+
+        if not self.enabled:
+            return await self._single_flight(key, kind, generate)
+
+        started = time.perf_counter()
+        value = await self.get(key)
+        if value is not None:
+            self._count(kind, "hits")
+            avg, _ = self._generate_seconds.get(kind, (0.0, 0))
+            self.saved_seconds += avg
+            print(f"⚡ [LLM Cache] HIT {kind} in {(time.perf_counter() - started) * 1000:.1f} ms")
+            return value
+        self._count(kind, "misses")
+
+        return await self._single_flight(key, kind, generate, store=True, cacheable=cacheable, ttl_seconds=ttl_seconds)
+
+    async def coalesce(self, kind: str, inputs: Dict[str, Any], generate: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Single-flight without caching, for generations that are only worth
+        sharing while identical requests overlap (e.g. a workshop's weekly plans).
+        Inputs must match exactly: a prompt naming another school is another request.
+        """
+        return await self._single_flight(make_cache_key(kind, "", inputs, exact=True), kind, generate)
+
+    # ==========================================
+    # 🛫 SINGLE-FLIGHT
+    # ==========================================
+    # Identical requests arriving while a generation is running await that
+    # generation instead of starting their own Gemini call. Each waiter gets
+    # its own deep copy of the result (callers personalise it), and waiters
+    # are shielded: a teacher closing the tab cancels only their own wait,
+    # never the shared call. Credits are charged by the routes before they
+    # get here, so every requester still pays for their own document.
+
+    async def _single_flight(
+        self,
+        key: str,
+        kind: str,
+        generate: Callable[[], Awaitable[Any]],
+        *,
+        store: bool = False,
+        cacheable: Callable[[Any], bool] = lambda value: True,
+        ttl_seconds: Optional[int] = None,
+    ) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_flight(kind, key, generate, store, cacheable, ttl_seconds))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_flight(key, done))
+        else:
+            self.coalesced += 1
+            self._count(kind, "coalesced")
+            print(f"🛫 [LLM Cache] Joined in-flight {kind} generation")
+
+        value = await asyncio.shield(task)
+        return copy.deepcopy(value)
+
+    async def _run_flight(self, kind, key, generate, store, cacheable, ttl_seconds) -> Any:
+        started = time.perf_counter()
+        value = await generate()
+        elapsed = time.perf_counter() - started
+        avg, n = self._generate_seconds.get(kind, (0.0, 0))
+        self._generate_seconds[kind] = ((avg * n + elapsed) / (n + 1), n + 1)
+
+        if store and self.enabled and value is not None and cacheable(value):
+            await self.set(key, value, ttl_seconds)
+            self._count(kind, "stored")
+        return value
+
+    def _finish_flight(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every waiter may have been cancelled; retrieve the error so it isn't reported as unhandled
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ [LLM Cache] In-flight generation failed: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(c["hits"] for c in self._counters.values())
+        lookups = hits + sum(c["misses"] for c in self._counters.values())
+        memory = next((b for b in self.backends if b.name == "memory"), None)
+        disk = next((b for b in self.backends if b.name == "disk"), None)
+        return {
+            "backends": [b.name for b in self.backends],
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "by_kind": {
+                kind: {**counters, "hit_rate": round(counters["hits"] / (counters["hits"] + counters["misses"]), 3)
+                       if counters["hits"] + counters["misses"] else 0.0}
+                for kind, counters in self._counters.items()
+            },
+            "backend_hits": dict(self.backend_hits),
+            "in_flight": len(self._inflight),
+            "coalesced": self.coalesced,
+            "memory_entries": memory.size() if memory else 0,
+            "memory_mb": round(memory.current_bytes / (1024 * 1024), 2) if memory else 0.0,
+            "disk_entries": disk.size() if disk else 0,
+            "disk_mb": round(disk.current_bytes / (1024 * 1024), 2) if disk else 0.0,
+            "estimated_seconds_saved": round(self.saved_seconds, 1),
+            "errors": self.errors,
+        }
+
+
+llm_cache = LLMResponseCache(_build_backends(LLM_CACHE_BACKENDS))
@@ -7,34 +7,20 @@ import re
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 import google.generativeai as genai
+from services.llm_gateway import llm_gateway
+from services.json_repair import parse_json
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 def get_model():
-    return genai.GenerativeModel("gemini-2.5-flash")
-
-# =====================================================
-# 🛠️ HELPER: ROBUST JSON EXTRACTION
-# =====================================================
-def extract_json_string(text: str) -> str:
-    """Finds the JSON object within a string."""
-    try:
-        clean_text = text.replace("```json", "").replace("```", "").strip()
-        start_idx = clean_text.find("{")
-        end_idx = clean_text.rfind("}")
-        if start_idx != -1 and end_idx != -1:
-            return clean_text[start_idx : end_idx + 1]
-        return clean_text
-    except Exception:
-        return text
+    return llm_gateway.model("gemini-2.5-flash")
 
 # =====================================================
 # STUDENT TOOLS
 # =====================================================
 
 async def generate_quiz_json(topic: str, grade: str) -> Dict[str, Any]:
-    model = get_model()
     prompt = f"""
     Create a 5-question multiple-choice quiz for "{topic}" (Grade {grade}).
     OUTPUT JSON ONLY:
@@ -45,15 +31,13 @@ async def generate_quiz_json(topic: str, grade: str) -> Dict[str, Any]:
     }}
     """
     try:
-        response = await model.generate_content_async(prompt)
-        text = extract_json_string(response.text)
-        return json.loads(text)
+        response = await llm_gateway.generate(prompt, label="generate_quiz_json")
+        return parse_json(response.text)
     except Exception as e:
         print(f"❌ Quiz Generation Failed: {e}")
         return {"questions": []}
 
 async def analyze_quiz_remediation(topic: str, mistakes: List[dict], grade: str) -> str:
-    model = get_model()
     mistake_summary = "\n".join([f"- Q: {m['question']} | Answered: {m['selected']}" for m in mistakes])
     prompt = f"""
     A Grade {grade} learner made these mistakes on {topic}:
@@ -61,22 +45,20 @@ async def analyze_quiz_remediation(topic: str, mistakes: List[dict], grade: str)
     Provide a short, encouraging remediation (max 3 sentences).
     """
     try:
-        response = await model.generate_content_async(prompt)
+        response = await llm_gateway.generate(prompt, label="analyze_quiz_remediation")
         return response.text
     except Exception:
         return "Good effort! Review the topic and try again."
 
 async def generate_builder_json(goal: str, grade: str) -> Dict[str, Any]:
-    model = get_model()
     prompt = f"""
     Create a simple logic-builder simulation. Goal: {goal}, Grade: {grade}
     OUTPUT JSON ONLY:
     {{ "goal_description": "...", "available_blocks": [{{ "id": "b1", "label": "...", "type": "trigger" }}], "solution_logic": ["b1"] }}
     """
     try:
-        response = await model.generate_content_async(prompt)
-        text = extract_json_string(response.text)
-        return json.loads(text)
+        response = await llm_gateway.generate(prompt, label="generate_builder_json")
+        return parse_json(response.text)
     except Exception:
         return {}
 
@@ -141,10 +123,9 @@ async def generate_realistic_image(query: str) -> str:
     return f"https://image.pollinations.ai/prompt/{safe_query}?width=800&height=600&model=flux&nologo=true"
 
 async def optimize_search_term(user_query: str, subject: str) -> str:
-    model = get_model()
     prompt = f"Context: {subject}. User asked: '{user_query}'. Return ONE specific, searchable noun phrase for a diagram (e.g., 'DNA Double Helix', 'Human Heart')."
     try:
-        response = await model.generate_content_async(prompt)
+        response = await llm_gateway.generate(prompt, label="optimize_search_term")
         return response.text.strip()
     except:
         return user_query
\ No newline at end of file
@@ -1,5 +1,5 @@
-import json
-from .new.teacher_shared import get_model, extract_json_string
+from services.llm_schemas import ExamPaper
+from services.structured_output import generate_structured
 
 async def generate_localized_exam(grade: str, subject: str, topics: list, blueprint: dict) -> dict:
     """
@@ -63,24 +63,12 @@ OUTPUT JSON FORMAT:
 }}
 """
 
-    response_text = ""
     try:
-        model = get_model()
-        
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        response_text = response.text
-        json_str = extract_json_string(response_text)
-        exam_json = json.loads(json_str)
+        exam_json = await generate_structured(prompt, ExamPaper, label="generate_localized_exam")
         
         print(f"✅ [Exam Generator] Successfully generated: {exam_json.get('exam_title')}")
         return exam_json
         
     except Exception as e:
         print(f"❌ [Exam Generator] LLM Generation Error: {e}")
-        if response_text:
-            print(f"❌ RAW AI RESPONSE: {response_text[:500]}...") 
         return {"error": "Failed to generate test."}
\ No newline at end of file
@@ -0,0 +1,311 @@
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+load_dotenv()
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+LLM_DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gemini-2.5-flash")
+
+# Gemini calls in flight across the whole instance, and per tenant (school, else user)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONCURRENCY_PER_TENANT = int(os.getenv("LLM_MAX_CONCURRENCY_PER_TENANT", "4"))
+# Calls nobody could be identified for are unrelated users, not one tenant: only the global cap applies by default
+LLM_MAX_CONCURRENCY_ANONYMOUS = int(os.getenv("LLM_MAX_CONCURRENCY_ANONYMOUS", str(LLM_MAX_CONCURRENCY)))
+
+# Per-attempt timeout and retry policy (429 / 5xx / timeouts)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20.0"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+ANONYMOUS_TENANT = "anonymous"
+
+# Set per request (see main.py middleware, then set_request_tenant in routes
+# that identify the caller in the body) so deep generator code doesn't need a
+# tenant argument
+current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("llm_tenant", default=ANONYMOUS_TENANT)
+
+
+def tenant_from_headers(headers) -> str:
+    """School first (a school's bulk jobs share one lane), then the individual teacher."""
+    return headers.get("x-school-id") or headers.get("x-user-id") or ANONYMOUS_TENANT
+
+
+def set_request_tenant(school_id: Optional[str] = None, uid: Optional[str] = None):
+    """
+    Queues the rest of this request's Gemini calls under the school or
+    teacher the route resolved from its body. Same order as the headers:
+    a school always wins, a uid only replaces an unidentified caller.
+    """
+    if school_id:
+        current_tenant.set(str(school_id))
+    elif uid and current_tenant.get() == ANONYMOUS_TENANT:
+        current_tenant.set(str(uid))
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    # google.api_core exceptions carry the HTTP status as .code
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    text = str(error)
+    return any(marker in text for marker in ("429", "503", "500 ", "Resource has been exhausted", "overloaded"))
+
+
+# ==========================================
+# ⚖️ FAIR SCHEDULER
+# ==========================================
+
+class FairScheduler:
+    """
+    Hands out global slots round-robin across tenants.
+
+    A school generating a whole term queues behind its own per-tenant cap,
+    while a single teacher's request only waits for the next free slot,
+    not for the school's backlog.
+    """
+
+    def __init__(self, max_total: int, max_per_tenant: int, max_anonymous: Optional[int] = None):
+        self.max_total = max_total
+        self.max_per_tenant = max_per_tenant
+        self.max_anonymous = max_total if max_anonymous is None else max_anonymous
+        self.active = 0
+        self._active_by_tenant: Dict[str, int] = {}
+        # tenant -> waiters; dict order is the round-robin order
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def waiting(self) -> int:
+        return sum(len(q) for q in self._waiting.values())
+
+    def _has_room(self, tenant: str) -> bool:
+        limit = self.max_anonymous if tenant == ANONYMOUS_TENANT else self.max_per_tenant
+        return self.active < self.max_total and self._active_by_tenant.get(tenant, 0) < limit
+
+    def _grant(self, tenant: str):
+        self.active += 1
+        self._active_by_tenant[tenant] = self._active_by_tenant.get(tenant, 0) + 1
+
+    async def acquire(self, tenant: str):
+        if not self._waiting and self._has_room(tenant):
+            self._grant(tenant)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(tenant, deque()).append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled: hand it back
+                self.release(tenant)
+            else:
+                queue = self._waiting.get(tenant)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        del self._waiting[tenant]
+            raise
+
+    def release(self, tenant: str):
+        self.active -= 1
+        remaining = self._active_by_tenant.get(tenant, 1) - 1
+        if remaining:
+            self._active_by_tenant[tenant] = remaining
+        else:
+            self._active_by_tenant.pop(tenant, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.active < self.max_total and self._waiting:
+            granted = False
+            for tenant in list(self._waiting):
+                if not self._has_room(tenant):
+                    continue
+                queue = self._waiting[tenant]
+                while queue and queue[0].done():
+                    queue.popleft()  # cancelled waiters
+                if queue:
+                    self._grant(tenant)
+                    queue.popleft().set_result(None)
+                    granted = True
+                if queue:
+                    # Served: go to the back of the round-robin order
+                    self._waiting.move_to_end(tenant)
+                else:
+                    del self._waiting[tenant]
+                if granted:
+                    break
+            if not granted:
+                return
+
+
+# ==========================================
+# 🚪 THE GATEWAY
+# ==========================================
+
+class LLMGateway:
+    """Every Gemini call in the backend goes through here."""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_per_tenant: int = LLM_MAX_CONCURRENCY_PER_TENANT,
+        max_anonymous: int = LLM_MAX_CONCURRENCY_ANONYMOUS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+    ):
+        self.scheduler = FairScheduler(max_concurrency, max_per_tenant, max_anonymous)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._models: Dict[str, Any] = {}
+
+        self.calls = 0
+        self.streams = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.total_queue_seconds = 0.0
+
+    def model(self, name: Optional[str] = None):
+        """Shared GenerativeModel instance per model name."""
+        name = name or LLM_DEFAULT_MODEL
+        model = self._models.get(name)
+        if model is None:
+            model = genai.GenerativeModel(name)
+            self._models[name] = model
+        return model
+
+    async def generate(
+        self,
+        contents: Any,
+        *,
+        model: Optional[str] = None,
+        generation_config: Optional[Any] = None,
+        tenant: Optional[str] = None,
+        timeout: Optional[float] = None,
+        label: str = "llm",
+        **kwargs,
+    ):
+        """
+        generate_content_async with fair queuing, a per-attempt timeout and
+        exponential backoff with full jitter on 429 / 5xx / timeouts.
+        Non-retryable errors (bad request, safety blocks...) raise immediately.
+        """
+        tenant = tenant or current_tenant.get()
+        timeout = timeout or self.timeout
+        gemini = self.model(model)
+        self.calls += 1
+
+        for attempt in range(1, self.max_attempts + 1):
+            queued_at = time.perf_counter()
+            await self.scheduler.acquire(tenant)
+            self.total_queue_seconds += time.perf_counter() - queued_at
+            try:
+                return await asyncio.wait_for(
+                    gemini.generate_content_async(contents, generation_config=generation_config, **kwargs),
+                    timeout,
+                )
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if attempt == self.max_attempts or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+                print(f"🔁 [LLM:{label}] attempt {attempt} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                self.retries += 1
+            finally:
+                self.scheduler.release(tenant)
+
+            await asyncio.sleep(delay)
+
+    async def stream(
+        self,
+        contents: Any,
+        *,
+        model: Optional[str] = None,
+        generation_config: Optional[Any] = None,
+        tenant: Optional[str] = None,
+        timeout: Optional[float] = None,
+        label: str = "llm",
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Streaming generate_content_async: yields text chunks as Gemini emits them.
+        Same queueing and slot accounting as generate(); the timeout applies to
+        each chunk. Only failures before the first chunk are retried, since the
+        caller has already consumed anything yielded.
+        """
+        tenant = tenant or current_tenant.get()
+        timeout = timeout or self.timeout
+        gemini = self.model(model)
+        self.calls += 1
+        self.streams += 1
+
+        for attempt in range(1, self.max_attempts + 1):
+            queued_at = time.perf_counter()
+            await self.scheduler.acquire(tenant)
+            self.total_queue_seconds += time.perf_counter() - queued_at
+            started = False
+            try:
+                response = await asyncio.wait_for(
+                    gemini.generate_content_async(contents, generation_config=generation_config, stream=True, **kwargs),
+                    timeout,
+                )
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        return
+                    text = getattr(chunk, "text", "") or ""
+                    if text:
+                        started = True
+                        yield text
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if started or attempt == self.max_attempts or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+                print(f"🔁 [LLM:{label}] stream attempt {attempt} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                self.retries += 1
+            finally:
+                self.scheduler.release(tenant)
+
+            await asyncio.sleep(delay)
+
+    async def generate_text(self, contents: Any, **kwargs) -> str:
+        response = await self.generate(contents, **kwargs)
+        return getattr(response, "text", "") or ""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "streams": self.streams,
+            "in_flight": self.scheduler.active,
+            "queued": self.scheduler.waiting(),
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "avg_queue_ms": round(1000 * self.total_queue_seconds / self.calls, 1) if self.calls else 0.0,
+        }
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,296 @@
+from typing import Any, List, Optional, TypeVar
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from pydantic.functional_validators import AfterValidator, BeforeValidator
+from typing_extensions import Annotated
+
+# ==========================================
+# 📐 RESPONSE MODELS FOR STRUCTURED GENERATION
+# ==========================================
+# One model per generated document. services/structured_output.py turns
+# them into Gemini `response_schema`s and validates every response against
+# them. Coercion is lenient because the frontend has always accepted what
+# Gemini sends: a number where text was asked for becomes text, and a
+# single string where a list was asked for becomes a one-item list.
+# Unknown keys are kept (template-locked custom columns, extra notes).
+# Optional fields are the ones the model may leave out. Every other field
+# is marked required in the schema so Gemini always fills it.
+#
+# Defaults keep small omissions from failing a whole document, so content
+# is checked separately: the core section of each document (scheme_weeks,
+# days, steps, records...) is required and must not be empty, and no list
+# item may come back without any text. A response that fails this is
+# re-asked instead of being charged and delivered half empty.
+
+
+def _as_text(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+        return ", ".join(str(v) for v in value)
+    return value
+
+
+def _as_text_list(value: Any) -> Any:
+    if value is None:
+        return []
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return [str(value)] if str(value).strip() else []
+    if isinstance(value, list):
+        return [_as_text(v) for v in value]
+    return value
+
+
+def _as_week_number(value: Any) -> Any:
+    # "Week 3" / "3" / 3.0 -> 3
+    if isinstance(value, str):
+        digits = "".join(ch for ch in value if ch.isdigit())
+        return int(digits) if digits else None
+    if isinstance(value, float):
+        return int(value)
+    return value
+
+
+def _has_text(value: Any) -> bool:
+    # Flags, counts and week numbers alone are not content
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        return any(_has_text(v) for v in value.values())
+    if isinstance(value, list):
+        return any(_has_text(v) for v in value)
+    return isinstance(value, str) and bool(value.strip())
+
+
+def _no_empty_items(items: List[Any]) -> List[Any]:
+    for position, item in enumerate(items):
+        if not _has_text(item):
+            raise ValueError(f"item {position + 1} has no content")
+    return items
+
+
+def _not_empty(items: List[Any]) -> List[Any]:
+    if not items:
+        raise ValueError("section is empty")
+    return items
+
+
+T = TypeVar("T")
+
+Text = Annotated[str, BeforeValidator(_as_text)]
+TextList = Annotated[List[str], BeforeValidator(_as_text_list)]
+WeekNumber = Annotated[Optional[int], BeforeValidator(_as_week_number)]
+# A list whose items must each hold some text; Section must also hold at least one
+Items = Annotated[List[T], AfterValidator(_no_empty_items)]
+Section = Annotated[List[T], AfterValidator(_no_empty_items), AfterValidator(_not_empty)]
+
+
+class LLMModel(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+# ==========================================
+# SCHEME OF WORK
+# ==========================================
+class SchemeIntro(LLMModel):
+    philosophy: Text = ""
+    competence_learning: Text = ""
+    goals: TextList = []
+
+
+class SchemeWeek(LLMModel):
+    week_number: WeekNumber = None
+    topic: Text = ""
+    prescribed_competences: TextList = []
+    specific_competences: TextList = []
+    content: TextList = []
+    learning_activities: TextList = []
+    methods: TextList = []
+    assessment: TextList = []
+    resources: TextList = []
+    references: TextList = []
+
+
+class SchemeOfWork(LLMModel):
+    intro_info: Optional[SchemeIntro] = None
+    scheme_weeks: Section[SchemeWeek]
+
+
+# ==========================================
+# WEEKLY PLAN
+# ==========================================
+class WeeklyMeta(LLMModel):
+    week_number: WeekNumber = None
+    term: Text = ""
+    main_topic: Text = ""
+
+
+class WeeklyDay(LLMModel):
+    day: Text = ""
+    component: Text = ""
+    topic: Text = ""
+    subtopic: Text = ""
+    specific_competence: Text = ""
+    scope_of_lesson: Text = ""
+    learning_activity: Text = ""
+    expected_standard: Text = ""
+    resources: TextList = []
+    strategies: TextList = []
+    reference: Text = ""
+
+
+class WeeklyPlan(LLMModel):
+    meta: WeeklyMeta = Field(default_factory=WeeklyMeta)
+    days: Section[WeeklyDay]
+
+
+# ==========================================
+# LESSON PLAN & NOTES
+# ==========================================
+class Enrolment(LLMModel):
+    boys: int = 0
+    girls: int = 0
+    total: int = 0
+
+
+class LearningEnvironment(LLMModel):
+    natural: Text = ""
+    technological: Text = ""
+    artificial: Text = ""
+
+
+class LessonStep(LLMModel):
+    stage: Text = ""
+    time: Text = ""
+    teacherActivity: Text = ""
+    learnerActivity: Text = ""
+    assessment_criteria: Text = ""
+
+
+class LessonPlan(LLMModel):
+    teacherName: Text = ""
+    schoolName: Text = ""
+    date: Text = ""
+    grade: Text = ""
+    subject: Text = ""
+    topic: Text = ""
+    subtopic: Text = ""
+    time: Text = ""
+    duration: Text = ""
+    enrolment: Enrolment = Field(default_factory=Enrolment)
+    expected_standard: Text = ""
+    rationale: Text = ""
+    learning_environment: LearningEnvironment = Field(default_factory=LearningEnvironment)
+    materials: Text = ""
+    references: Text = ""
+    steps: Section[LessonStep]
+    homework_content: Text = ""
+
+
+class LessonNotes(LLMModel):
+    topic_heading: Text = ""
+    reference: Text = ""
+    explanation_points: Annotated[TextList, AfterValidator(_not_empty)]
+    examples: TextList = []
+    class_exercise: TextList = []
+    homework_question: TextList = []
+
+
+# ==========================================
+# EXAMS
+# ==========================================
+class ExamQuestion(LLMModel):
+    question: Text = ""
+    answer: Text = ""
+    needs_image: bool = False
+    image_prompt: Text = ""
+
+
+class MultipleChoiceQuestion(ExamQuestion):
+    options: TextList = []
+
+
+class MatchingPair(LLMModel):
+    stem: Text = ""
+    match: Text = ""
+
+
+class MatchingBlock(LLMModel):
+    instruction: Text = ""
+    pairs: Items[MatchingPair] = []
+    needs_image: bool = False
+    image_prompt: Text = ""
+
+
+class ComputationalQuestion(LLMModel):
+    question: Text = ""
+    solution_steps: Text = ""
+    final_answer: Text = ""
+    needs_image: bool = False
+    image_prompt: Text = ""
+
+
+class EssayQuestion(LLMModel):
+    question: Text = ""
+    points_allocated: Optional[int] = None
+    grading_rubric: Text = ""
+    needs_image: bool = False
+    image_prompt: Text = ""
+
+
+class CaseStudyQuestion(LLMModel):
+    question: Text = ""
+    answer: Text = ""
+
+
+class CaseStudy(LLMModel):
+    scenario: Text = ""
+    questions: Items[CaseStudyQuestion] = []
+    needs_image: bool = False
+    image_prompt: Text = ""
+
+
+EXAM_SECTIONS = ("multiple_choice", "true_false", "matching", "short_answer", "computational", "essay", "case_study")
+
+
+class ExamPaper(LLMModel):
+    exam_title: Text = ""
+    multiple_choice: Items[MultipleChoiceQuestion] = []
+    true_false: Items[ExamQuestion] = []
+    matching: Items[MatchingBlock] = []
+    short_answer: Items[ExamQuestion] = []
+    computational: Items[ComputationalQuestion] = []
+    essay: Items[EssayQuestion] = []
+    case_study: Items[CaseStudy] = []
+
+    @model_validator(mode="after")
+    def _has_questions(self):
+        # The blueprint may ask for only some sections, but never for none
+        if not any(getattr(self, name) for name in EXAM_SECTIONS):
+            raise ValueError("exam has no questions")
+        return self
+
+
+# ==========================================
+# RECORD OF WORK
+# ==========================================
+class RecordHeader(LLMModel):
+    school: Text = ""
+    teacher: Text = ""
+    details: Text = ""
+
+
+class RecordRow(LLMModel):
+    week: WeekNumber = None
+    week_ending: Text = ""
+    topics_covered: Text = ""
+    references: Text = ""
+    methodology_aids: Text = ""
+    evaluation: Text = ""
+
+
+class RecordOfWork(LLMModel):
+    header: RecordHeader = Field(default_factory=RecordHeader)
+    records: Section[RecordRow]
@@ -1,12 +1,13 @@
 import os
 import json
 import asyncio
-import re
 import math
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import google.generativeai as genai
+from services.llm_gateway import llm_gateway
+from services.json_repair import parse_json
 from .new.teacher_shared import find_structured_module_content
 
 load_dotenv()
@@ -16,7 +17,7 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 DEFAULT_LOGO = "https://res.cloudinary.com/dchkrvf4b/image/upload/v1727734157/coat_of_arms_zambia.png"
 
 def get_model():
-    return genai.GenerativeModel("gemini-2.5-flash")
+    return llm_gateway.model("gemini-2.5-flash")
 
 # =====================================================
 # 🛠️ HELPER: DATE CALCULATOR
@@ -48,29 +49,6 @@ def calculate_week_dates(start_date_str: str, week_num: int) -> Dict[str, str]:
         print(f"⚠️ Date Calc Error: {e}")
         return {"range_display": "", "start_iso": "", "end_iso": "", "month": ""}
 
-# =====================================================
-# 🛠️ HELPER: JSON CLEANER
-# =====================================================
-def extract_json_string(text: str) -> str:
-    try:
-        clean_text = text.replace("```json", "").replace("```", "").strip()
-        start_brace = clean_text.find("{")
-        start_bracket = clean_text.find("[")
-        
-        if start_bracket != -1 and (start_brace == -1 or start_bracket < start_brace):
-            end_idx = clean_text.rfind("]")
-            if end_idx != -1:
-                clean_text = clean_text[start_bracket : end_idx + 1]
-        elif start_brace != -1:
-            end_idx = clean_text.rfind("}")
-            if end_idx != -1:
-                clean_text = clean_text[start_brace : end_idx + 1]
-        
-        clean_text = re.sub(r'(?<!\\)\n', '\\n', clean_text)
-        return clean_text
-    except Exception:
-        return text
-
 # =====================================================
 # 1. PROFESSIONAL SCHEME GENERATOR (PACED DISTRIBUTION)
 # =====================================================
@@ -138,7 +116,6 @@ async def generate_scheme_with_ai(
         Map your generated content logically to these keys.
         """
 
-    model = get_model()
     data_context = json.dumps(term_syllabus_slice)
 
     # ✅ PROMPT UPDATED TO FORCE PACING AND SPREAD
@@ -162,9 +139,8 @@ async def generate_scheme_with_ai(
     """
     
     try:
-        response = await model.generate_content_async(prompt)
-        json_str = extract_json_string(response.text)
-        data = json.loads(json_str)
+        response = await llm_gateway.generate(prompt, label="generate_scheme_with_ai")
+        data = parse_json(response.text)
 
         if not isinstance(data, list): return []
 
@@ -296,7 +272,6 @@ async def generate_weekly_plan_with_ai(
         }}
         """
 
-    model = get_model()
 
     prompt = f"""
     Act as a Senior Teacher in Zambia. Create a Weekly Lesson Forecast (Old Curriculum style).
@@ -316,8 +291,8 @@ async def generate_weekly_plan_with_ai(
     """
     
     try:
-        response = await model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
-        data = json.loads(extract_json_string(response.text))
+        response = await llm_gateway.generate(prompt, generation_config={"response_mime_type": "application/json"}, label="generate_weekly_plan_with_ai")
+        data = parse_json(response.text)
 
         if "days" in data and isinstance(data["days"], list):
             for day in data["days"]:
@@ -362,8 +337,7 @@ async def generate_specific_lesson_plan(
     final_logo = school_logo if school_logo else DEFAULT_LOGO
     print(f"\n📝 [Old Curr Lesson] Processing: {theme} - {subtopic} | Bloom's: {blooms_level}")
     
-    module_info = find_structured_module_content(module_data, subtopic)
-    if not module_info: module_info = find_structured_module_content(module_data, theme)
+    module_info = find_structured_module_content(module_data, subtopic, theme, doc_type="lesson_plan")
 
     boys, girls = attendance.get('boys', 0), attendance.get('girls', 0)
     total = boys + girls
@@ -420,7 +394,6 @@ async def generate_specific_lesson_plan(
       ]
         """
 
-    model = get_model()
     
     # ✅ PROMPT UPDATED: Explicitly request textbook (no page) and website links.
     prompt = f"""
@@ -455,8 +428,8 @@ async def generate_specific_lesson_plan(
     """
     
     try:
-        response = await model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
-        data = json.loads(extract_json_string(response.text))
+        response = await llm_gateway.generate(prompt, generation_config={"response_mime_type": "application/json"}, label="generate_specific_lesson_plan")
+        data = parse_json(response.text)
         
         # ✅ FIX: Only override the references if the AI completely failed to generate them.
         # This protects the AI's generated website links from being overwritten by the Python script!
@@ -517,7 +490,6 @@ async def generate_record_of_work(
       ]
         """
 
-    model = get_model()
     prompt = f"""
     Act as a Zambian Teacher. Generate a Record of Work (Log Book) entry.
     School: {school_name} | Teacher: {teacher_name} | Term: {term} | Year: {year}
@@ -535,8 +507,8 @@ async def generate_record_of_work(
     """
     
     try:
-        response = await model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
-        data = json.loads(extract_json_string(response.text))
+        response = await llm_gateway.generate(prompt, generation_config={"response_mime_type": "application/json"}, label="generate_record_of_work")
+        data = parse_json(response.text)
         
         if "header" not in data: data["header"] = {}
         data["header"]["logo_url"] = final_logo
@@ -558,7 +530,6 @@ async def generate_lesson_notes(
 ) -> Dict[str, Any]:
     print(f"📝 Generating Blackboard Notes | {subject} - {topic} / {subtopic}")
     
-    model = get_model()
     prompt = f"""
     Act as an expert Zambian teacher. Create detailed, highly structured Blackboard/Whiteboard Lesson Notes.
     Grade: {grade}, Subject: {subject}, Topic: {topic}, Subtopic: {subtopic}
@@ -575,8 +546,8 @@ async def generate_lesson_notes(
     """
     
     try:
-        response = await model.generate_content_async(prompt, generation_config={"response_mime_type": "application/json"})
-        return json.loads(extract_json_string(response.text))
+        response = await llm_gateway.generate(prompt, generation_config={"response_mime_type": "application/json"}, label="generate_lesson_notes")
+        return parse_json(response.text)
     except Exception as e:
         print(f"❌ Notes Error: {e}")
         return {}
\ No newline at end of file
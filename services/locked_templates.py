@@ -0,0 +1,146 @@
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import SERVER_TIMESTAMP
+
+from services.firebase_setup import async_db
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# A teacher can lock the columns and rows of an edited plan as their
+# template. The lock used to be found by scanning every ai_training_flywheel
+# capture for (uid, plan_type, grade, subject), which grows with every edit.
+# The current state now lives in one document per template:
+#
+#   locked_templates/{uid}_{plan_type}_{grade}_{subject}
+#       isLocked, customColumns, templateRows, uid, plan_type, grade, subject, updated_at
+#
+# capture-teacher-edits writes it in the same batch as the flywheel record.
+# Generation requests read it with a single get, through a short in-process
+# TTL cache. Teachers whose index document doesn't exist yet (locks captured
+# before the index) get one legacy scan, which writes the document.
+
+LOCKED_TEMPLATES_COLLECTION = "locked_templates"
+FLYWHEEL_COLLECTION = "ai_training_flywheel"
+LOCKED_TEMPLATE_CACHE_TTL_SECONDS = int(os.getenv("LOCKED_TEMPLATE_CACHE_TTL_SECONDS", "300"))
+LOCKED_TEMPLATE_CACHE_MAX_ENTRIES = 20_000
+
+_cache: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+_stats = {"hits": 0, "gets": 0, "backfills": 0, "updates": 0}
+
+
+def locked_template_id(uid: str, plan_type: str, grade: str, subject: str) -> str:
+    # "/" is the only character a document ID can't hold
+    return "_".join(str(part).replace("/", "-") for part in (uid, plan_type, grade, subject))
+
+
+def template_context(human_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a locked edit the generators use."""
+    return {
+        "customColumns": human_data.get("columns", []),
+        "templateRows": human_data.get("rows", human_data.get("days", human_data.get("steps", [])))
+    }
+
+
+def _index_document(uid: str, plan_type: str, grade: str, subject: str, context: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "uid": uid, "plan_type": plan_type, "grade": grade, "subject": subject,
+        "isLocked": context is not None,
+        **(context or {"customColumns": [], "templateRows": []}),
+        "updated_at": SERVER_TIMESTAMP,
+    }
+
+
+def _context_from_index(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not data.get("isLocked"):
+        return None
+    return {"customColumns": data.get("customColumns", []), "templateRows": data.get("templateRows", [])}
+
+
+def _remember(doc_id: str, context: Optional[Dict[str, Any]]):
+    now = time.monotonic()
+    if len(_cache) >= LOCKED_TEMPLATE_CACHE_MAX_ENTRIES:
+        for stale in [key for key, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[stale]
+        if len(_cache) >= LOCKED_TEMPLATE_CACHE_MAX_ENTRIES:
+            _cache.clear()
+    _cache[doc_id] = (now + LOCKED_TEMPLATE_CACHE_TTL_SECONDS, context)
+
+
+# ==========================================
+# 🔒 LOOKUP
+# ==========================================
+
+async def _scan_flywheel(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
+    """The pre-index lookup, kept for teachers whose index document doesn't exist yet."""
+    query = (async_db.collection(FLYWHEEL_COLLECTION)
+             .where("uid", "==", uid)
+             .where("plan_type", "==", plan_type)
+             .where("grade", "==", grade)
+             .where("subject", "==", subject))
+    async for doc in query.stream():
+        human_data = doc.to_dict().get("final_human_data", {})
+        if human_data.get("isLocked") is True:
+            return template_context(human_data)
+    return None
+
+
+async def get_locked_template(uid: str, plan_type: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
+    """{"customColumns", "templateRows"} of the teacher's current lock, or None."""
+    doc_id = locked_template_id(uid, plan_type, grade, subject)
+    cached = _cache.get(doc_id)
+    if cached is not None and cached[0] > time.monotonic():
+        _stats["hits"] += 1
+        return cached[1]
+
+    _stats["gets"] += 1
+    ref = async_db.collection(LOCKED_TEMPLATES_COLLECTION).document(doc_id)
+    snapshot = await ref.get()
+    if snapshot.exists:
+        context = _context_from_index(snapshot.to_dict())
+    else:
+        _stats["backfills"] += 1
+        context = await _scan_flywheel(uid, plan_type, grade, subject)
+        try:
+            # create, not set: a capture that landed during the scan is newer than what we found
+            await ref.create(_index_document(uid, plan_type, grade, subject, context))
+        except AlreadyExists:
+            context = _context_from_index((await ref.get()).to_dict())
+
+    if context is not None:
+        print(f"🔒 FOUND LOCKED TEMPLATE for {uid} -> {plan_type} ({subject})")
+    _remember(doc_id, context)
+    return context
+
+
+# ==========================================
+# ✍️ CAPTURE
+# ==========================================
+
+async def capture_teacher_edit(training_record: Dict[str, Any]):
+    """
+    Stores a flywheel record and, when the edit says whether the template is
+    locked, the new lock state, in one batch.
+    """
+    batch = async_db.batch()
+    batch.set(async_db.collection(FLYWHEEL_COLLECTION).document(), training_record)
+
+    human_data = training_record.get("final_human_data") or {}
+    key = (training_record["uid"], training_record["plan_type"], training_record["grade"], training_record["subject"])
+    doc_id = locked_template_id(*key)
+    context = None
+    if "isLocked" in human_data:
+        context = template_context(human_data) if human_data["isLocked"] is True else None
+        batch.set(async_db.collection(LOCKED_TEMPLATES_COLLECTION).document(doc_id), _index_document(*key, context))
+
+    await batch.commit()
+    if "isLocked" in human_data:
+        _stats["updates"] += 1
+        _remember(doc_id, context)
+
+
+def locked_template_stats() -> Dict[str, Any]:
+    return {**_stats, "cached": len(_cache), "ttl_seconds": LOCKED_TEMPLATE_CACHE_TTL_SECONDS}
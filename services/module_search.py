@@ -0,0 +1,205 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fuzzywuzzy import fuzz
+
+try:
+    # C implementation: bounds a query against every title in one call
+    from rapidfuzz import fuzz as rapid_fuzz, process as rapid_process
+except ImportError:
+    rapid_fuzz = rapid_process = None
+
+from services.curriculum_ir import CurriculumDocument, Subtopic, Topic
+
+# ==========================================
+# 🔎 PER-MODULE SUBTOPIC SEARCH INDEX
+# ==========================================
+# Same answer as the old linear scan in find_structured_module_content:
+#   score = 1.0 on an ID match (exact or parent ID), else fuzz.ratio of the
+#   normalized titles; the first subtopic with the highest score wins and
+#   anything below MATCH_THRESHOLD is "no match".
+#
+# Instead of scoring every subtopic, the index:
+#   1. resolves ID queries from a dict,
+#   2. shortlists likely titles through a character-trigram inverted index
+#      and scores those first to get a good best-so-far,
+#   3. skips every other title whose upper bound (length ratio, then shared
+#      character counts) cannot beat it. fuzz.ratio is 2*M/T with M bounded
+#      by the shared characters, so the pruning never changes the result.
+#
+# When rapidfuzz is installed, steps 2-3 are replaced by a single
+# process.extract call over the cached title list per query. Its indel
+# ratio is not what production scores with: fuzzywuzzy without
+# python-Levenshtein uses difflib, whose matching blocks can cover fewer
+# characters than the longest common subsequence. It is an upper bound on
+# it though, so titles are visited best bound first and fuzz.ratio is only
+# computed while the bound can still beat the best so far. The result is
+# fuzz.ratio's answer either way.
+
+MATCH_THRESHOLD = 0.45
+NGRAM_SIZE = 3
+SHORTLIST_SIZE = 8
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_ID_PATTERN = re.compile(r"\b(\d+(\.\d+)+)\b")
+
+
+def normalize_title(text: str) -> str:
+    if not text:
+        return ""
+    return _NON_ALNUM.sub("", text.lower())
+
+
+def _ngrams(text: str) -> set:
+    if len(text) <= NGRAM_SIZE:
+        return {text} if text else set()
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def _percent_bound(shared: int, total: int) -> int:
+    # Rounded up, so it is never below fuzzywuzzy's rounded percentage
+    return math.ceil(200 * shared / total) if total else 0
+
+
+class ModuleSearchIndex:
+    """Built once per module version (stored on the cached CurriculumDocument)."""
+
+    __slots__ = ("entries", "titles", "lengths", "char_counts", "ids", "ngrams")
+
+    def __init__(self, module: CurriculumDocument):
+        # Flattened in the same order the old nested loop visited them
+        self.entries: List[Tuple[Topic, Subtopic]] = [
+            (topic, sub) for topic in module.topics for sub in topic.subtopics
+        ]
+        self.titles: List[str] = [normalize_title(sub.title) for _, sub in self.entries]
+        self.lengths: List[int] = [len(title) for title in self.titles]
+        self.char_counts: List[Counter] = [Counter(title) for title in self.titles]
+
+        # subtopic id -> first position (earliest wins, like the linear scan)
+        self.ids: Dict[str, int] = {}
+        # trigram -> positions of titles containing it
+        self.ngrams: Dict[str, List[int]] = {}
+
+        for pos, (_, sub) in enumerate(self.entries):
+            self.ids.setdefault(sub.id, pos)
+            for gram in _ngrams(self.titles[pos]):
+                self.ngrams.setdefault(gram, []).append(pos)
+
+    def _id_hit(self, query: str) -> Optional[int]:
+        match = _ID_PATTERN.search(str(query))
+        if not match:
+            return None
+        q_id = match.group(1)
+        parts = q_id.split(".")
+        # The query's own ID or any of its parents ("1.2.3" -> "1.2", "1")
+        candidates = [q_id] + [".".join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+        hits = [self.ids[c] for c in candidates if c in self.ids]
+        return min(hits) if hits else None
+
+    def _score(self, q_norm: str, pos: int) -> int:
+        title = self.titles[pos]
+        if not q_norm or not title:
+            return 0
+        return fuzz.ratio(q_norm, title)
+
+    def search(self, query: str) -> Optional[Tuple[Topic, Subtopic, float]]:
+        """(topic, subtopic, score) of the best match, or None below the threshold."""
+        if not self.entries:
+            return None
+
+        # (percent, position); a candidate wins on a higher score, or an equal score earlier in the module
+        best_score, best_pos = -1, len(self.entries)
+
+        id_pos = self._id_hit(query)
+        if id_pos is not None:
+            best_score, best_pos = 100, id_pos
+
+        q_norm = normalize_title(query)
+        if q_norm:
+            if rapid_process is not None:
+                best_score, best_pos = self._text_best_rapid(q_norm, best_score, best_pos)
+            else:
+                best_score, best_pos = self._text_best_pruned(q_norm, best_score, best_pos)
+
+        if best_score < int(MATCH_THRESHOLD * 100):
+            return None
+
+        topic, sub = self.entries[best_pos]
+        return topic, sub, best_score / 100.0
+
+    def search_first(self, queries: Sequence[str]) -> Optional[Tuple[Topic, Subtopic, float]]:
+        """The first of several queries (e.g. subtopic, then theme) that matches; later ones aren't scored."""
+        for query in queries:
+            match = self.search(query) if query else None
+            if match:
+                return match
+        return None
+
+    def _text_best_rapid(self, q_norm: str, best_score: int, best_pos: int) -> Tuple[int, int]:
+        # Every title whose bound can clear the threshold, highest bound first
+        results = rapid_process.extract(
+            q_norm, self.titles, scorer=rapid_fuzz.ratio, limit=None,
+            score_cutoff=MATCH_THRESHOLD * 100 - 0.5,
+        )
+        for _, raw_bound, pos in results:
+            bound = int(round(raw_bound))
+            if bound < best_score:
+                break
+            if bound == best_score and pos > best_pos:
+                continue
+            score = self._score(q_norm, pos)
+            if score > best_score or (score == best_score and pos < best_pos):
+                best_score, best_pos = score, pos
+        return best_score, best_pos
+
+    def _text_best_pruned(self, q_norm: str, best_score: int, best_pos: int) -> Tuple[int, int]:
+        floor = int(MATCH_THRESHOLD * 100)
+        q_len = len(q_norm)
+        q_counts = Counter(q_norm)
+
+        def consider(pos: int):
+            nonlocal best_score, best_pos
+            score = self._score(q_norm, pos)
+            if score > best_score or (score == best_score and pos < best_pos):
+                best_score, best_pos = score, pos
+
+        def beaten(bound: int, pos: int) -> bool:
+            return bound < floor or bound < best_score or (bound == best_score and pos > best_pos)
+
+        def bounded(pos: int, length: int) -> bool:
+            """True when the title's upper bound can still beat the best so far."""
+            total = q_len + length
+            if beaten(_percent_bound(min(q_len, length), total), pos):
+                return False
+            counts = self.char_counts[pos]
+            common = sum(min(n, counts[ch]) for ch, n in q_counts.items() if ch in counts)
+            return not beaten(_percent_bound(common, total), pos)
+
+        # 1. Trigram shortlist: most shared n-grams first
+        shared = Counter()
+        for gram in _ngrams(q_norm):
+            for pos in self.ngrams.get(gram, ()):
+                shared[pos] += 1
+        shortlist = [pos for pos, _ in shared.most_common(SHORTLIST_SIZE)]
+        for pos in shortlist:
+            if bounded(pos, self.lengths[pos]):
+                consider(pos)
+
+        # 2. Everything else, only when its upper bound can still win
+        seen = set(shortlist)
+        for pos, length in enumerate(self.lengths):
+            if length and pos not in seen and bounded(pos, length):
+                consider(pos)
+
+        return best_score, best_pos
+
+
+def get_search_index(module: CurriculumDocument) -> ModuleSearchIndex:
+    """The module's index, built on first use and kept with the cached IR."""
+    index = module.search_index
+    if index is None:
+        index = ModuleSearchIndex(module)
+        module.search_index = index
+    return index
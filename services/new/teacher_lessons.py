@@ -5,7 +5,17 @@ import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 # Ensure you are importing from the correct shared location
-from .teacher_shared import get_model, extract_json_string, find_structured_module_content
+from services.curriculum_ir import CurriculumDocument
+from services.llm_gateway import llm_gateway
+from services.llm_cache import llm_cache
+from services.llm_schemas import LessonPlan, LessonNotes
+from services.structured_output import generate_structured
+from services.json_repair import parse_json
+from .teacher_shared import find_structured_module_content
+
+# Bump when the prompt text below changes so cached answers stop matching
+LESSON_NOTES_PROMPT_VERSION = "1"
+CHALKBOARD_DIAGRAM_PROMPT_VERSION = "1"
 
 # ==============================================================================
 # 1. GENERATE SPECIFIC LESSON PLAN (Supports Standard & Remedial Loops)
@@ -23,22 +33,21 @@ async def generate_specific_lesson_plan(
     teacher_name: str = "Class Teacher", 
     school_name: str = "Primary School",
     school_logo: Optional[str] = None,
-    module_data: Optional[Dict[str, Any]] = None,
+    module_data: Optional[CurriculumDocument] = None,
     scheme_references: str = "Standard Zambian Syllabus",
     blooms_level: str = "",
     locked_context: Optional[Dict[str, Any]] = None,
     # 🆕 REMEDIAL LOOP SUPPORT
     is_remedial: bool = False,
-    teacher_feedback: Optional[str] = None
+    teacher_feedback: Optional[str] = None,
+    events=None  # GenerationEvents: stream the response and emit each finished step
 ) -> Dict[str, Any]:
     
     mode_label = "REMEDIAL" if is_remedial else "STANDARD"
     print(f"\n🔍 [Lesson Generator - {mode_label}] Processing: {theme} - {subtopic}")
 
     # 1. SMART MODULE SEARCH
-    module_info = find_structured_module_content(module_data, subtopic)
-    if not module_info:
-        module_info = find_structured_module_content(module_data, theme)
+    module_info = find_structured_module_content(module_data, subtopic, theme, doc_type="lesson_plan")
 
     boys = attendance.get('boys', 0)
     girls = attendance.get('girls', 0)
@@ -77,7 +86,6 @@ async def generate_specific_lesson_plan(
         2. Explicitly reference these materials inside the steps.
         """
 
-    model = get_model()
     ref_placeholder = final_reference_string if strict_ref_override else "List specific external sources used..."
 
     # 3. 🆕 INJECT REMEDIAL PEDAGOGY IF NEEDED
@@ -188,11 +196,10 @@ async def generate_specific_lesson_plan(
 
     # 7. EXECUTE
     try:
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
+        data = await generate_structured(
+            prompt, LessonPlan, label="generate_specific_lesson_plan", events=events, sections=("steps",),
+            use_schema=not (locked_context and locked_context.get("customColumns")),
         )
-        data = json.loads(extract_json_string(response.text))
 
         if strict_ref_override:
             data["references"] = final_reference_string
@@ -214,13 +221,11 @@ async def generate_specific_lesson_plan(
 # ==============================================================================
 # 2. GENERATE LESSON NOTES
 # ==============================================================================
-async def generate_lesson_notes(grade: str, subject: str, topic: str, subtopic: str, module_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+async def generate_lesson_notes(grade: str, subject: str, topic: str, subtopic: str, module_data: Optional[CurriculumDocument] = None, regenerate: bool = False) -> Dict[str, Any]:
     print(f"\n📝 [Notes Generator] Generating for: {topic} - {subtopic}")
     
     # 1. Find Module Context
-    module_info = find_structured_module_content(module_data, subtopic)
-    if not module_info: 
-        module_info = find_structured_module_content(module_data, topic)
+    module_info = find_structured_module_content(module_data, subtopic, topic, doc_type="lesson_notes")
 
     reference_str = f"Zambian Syllabus: {subject} {grade}"
     module_context_str = f"⚠️ No module data found. Search for standard definitions and examples from reputable educational sources."
@@ -240,7 +245,6 @@ async def generate_lesson_notes(grade: str, subject: str, topic: str, subtopic:
             """
 
     # 2. Build Prompt
-    model = get_model()
     
     prompt = f"""
     Act as a Teacher in Zambia preparing **Blackboard Notes** for a {grade} class.
@@ -275,15 +279,22 @@ async def generate_lesson_notes(grade: str, subject: str, topic: str, subtopic:
     """
 
     # 3. Execute
+    async def _generate() -> Dict[str, Any]:
+        return await generate_structured(prompt, LessonNotes, label="generate_lesson_notes")
+
     try:
-        response = await model.generate_content_async(
-            prompt, 
-            generation_config={"response_mime_type": "application/json"}
+        # Same subtopic + same module text -> same notes for every teacher
+        data = await llm_cache.get_or_generate(
+            "lesson_notes", LESSON_NOTES_PROMPT_VERSION,
+            {"grade": grade, "subject": subject, "topic": topic, "subtopic": subtopic,
+             "module_context": module_context_str, "reference": reference_str},
+            _generate,
+            regenerate=regenerate,
         )
-        data = json.loads(extract_json_string(response.text))
         
         # Notes usually need strict references, but you can relax this if needed
         data["reference"] = reference_str 
+        data["topic_heading"] = subtopic
         
         return data
 
@@ -300,11 +311,22 @@ async def generate_lesson_notes(grade: str, subject: str, topic: str, subtopic:
 # ==============================================================================
 # 3. 🆕 CHALKBOARD DIAGRAM GENERATOR (IMAGEN 4.0)
 # ==============================================================================
-async def generate_chalkboard_diagram(prompt_text: str) -> Dict[str, str]:
+async def generate_chalkboard_diagram(prompt_text: str, regenerate: bool = False) -> Dict[str, str]:
     """
     Uses Google's Imagen 4.0 model via REST API to generate a line-art diagram.
     Returns a Base64 data URL ready to be displayed on the frontend.
+    Successful images are cached per (normalized) prompt.
     """
+    return await llm_cache.get_or_generate(
+        "chalkboard_diagram", CHALKBOARD_DIAGRAM_PROMPT_VERSION,
+        {"prompt": prompt_text},
+        lambda: _request_imagen_diagram(prompt_text),
+        regenerate=regenerate,
+        cacheable=lambda result: result.get("status") == "success",
+    )
+
+
+async def _request_imagen_diagram(prompt_text: str) -> Dict[str, str]:
     print(f"\n🎨 [Diagram Generator] Requesting Imagen 4.0 for: {prompt_text}")
     
     api_key = os.environ.get("GEMINI_API_KEY")
@@ -368,7 +390,6 @@ async def evaluate_lesson_feedback(topic: str, subtopic: str, grade: str, teache
     Analyzes post-lesson feedback and suggests quick pedagogical fixes.
     """
     print(f"\n🧠 [Lesson Evaluator] Analyzing feedback for {topic}")
-    model = get_model()
 
     prompt = f"""
     Act as a Master Teacher Trainer. 
@@ -394,11 +415,12 @@ async def evaluate_lesson_feedback(topic: str, subtopic: str, grade: str, teache
     """
     
     try:
-        response = await model.generate_content_async(
+        response = await llm_gateway.generate(
             prompt,
-            generation_config={"response_mime_type": "application/json"}
+            generation_config={"response_mime_type": "application/json"},
+            label="evaluate_lesson_feedback"
         )
-        return json.loads(extract_json_string(response.text))
+        return parse_json(response.text)
     except Exception as e:
         print(f"❌ Evaluation Error: {e}")
         return {
@@ -1,6 +1,8 @@
 import json
 from typing import List, Dict, Any
-from .teacher_shared import get_model, extract_json_string, calculate_week_dates
+from services.llm_schemas import RecordOfWork
+from services.structured_output import generate_structured
+from .teacher_shared import calculate_week_dates
 from .teacher_schemes import extract_scheme_details
 
 async def generate_record_of_work(
@@ -22,7 +24,6 @@ async def generate_record_of_work(
     
     print(f"\n📂 [Records Generator] Processing Scheme Data for {subject} Grade {grade}...")
 
-    model = get_model()
     records_context = []
 
     # 1. ITERATE AND EXTRACT RICH DATA
@@ -112,11 +113,7 @@ async def generate_record_of_work(
     """
 
     try:
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        return json.loads(extract_json_string(response.text))
+        return await generate_structured(prompt, RecordOfWork, label="generate_record_of_work")
 
     except Exception as e:
         print(f"❌ [Records Generator] Error: {e}")
@@ -1,106 +1,55 @@
+import os
 import json
 import math
-from typing import List, Dict, Any, Union, Optional
+import asyncio
+from typing import List, Dict, Any, Union, Optional, Tuple
 # Ensure teacher_shared is accessible. 
-from .teacher_shared import get_model, extract_json_string, calculate_week_dates
+from services.curriculum_ir import CurriculumDocument, build_syllabus_ir, item_text
+from services.prompt_context import ContextBuilder
+from services.llm_schemas import SchemeOfWork
+from services.structured_output import generate_structured
+from .teacher_shared import calculate_week_dates
 
-# =====================================================
-# 1. PROFESSIONAL SCHEME GENERATOR (ROBUST VERSION)
-# =====================================================
-async def generate_scheme_with_ai(
-    syllabus_data: Union[List[dict], Dict[str, Any]], 
-    subject: str,
-    grade: str,
-    term: str,
-    num_weeks: int,
-    start_date: str = "2026-01-13",
-    locked_context: Optional[Dict[str, Any]] = None # 🆕 TEMPLATE LOCK SUPPORT
-) -> Dict[str, Any]:
-    
-    print(f"\n📘 [Scheme Generator] Processing for {subject} Grade {grade}...")
-    
-    # 1. Extract Topics and Intro Data Safely
-    topics_list = []
-    provided_intro = {}
-
-    if isinstance(syllabus_data, dict):
-        topics_list = syllabus_data.get("topics", []) or syllabus_data.get("units", []) or []
-        provided_intro = {
-            "philosophy": syllabus_data.get("philosophy", ""),
-            "competence_learning": syllabus_data.get("competence_learning", ""),
-            "goals": syllabus_data.get("goals", [])
-        }
-    elif isinstance(syllabus_data, list):
-        topics_list = syllabus_data
-    
-    # 2. TERM SPLITTING LOGIC
-    total_units = len(topics_list)
-    chunk_size = math.ceil(total_units / 3)
-    term_lower = str(term).lower()
-    
-    start_idx = 0
-    end_idx = chunk_size
-
-    if "2" in term_lower:
-        start_idx = chunk_size
-        end_idx = chunk_size * 2
-    elif "3" in term_lower:
-        start_idx = chunk_size * 2
-        end_idx = total_units
-
-    term_syllabus_data = topics_list[start_idx : min(end_idx, total_units)] if total_units > 0 else []
-    
-    # Fallback if splitting resulted in empty list
-    if not term_syllabus_data and total_units > 0:
-        term_syllabus_data = topics_list
+# ==========================================
+# ⚙️ CHUNKED GENERATION
+# ==========================================
+# A 13-week scheme in one response is the slowest call we make and the most
+# likely to come back truncated. With SCHEME_CHUNK_WEEKS > 0 the term is split
+# into balanced week ranges (13 weeks / 4 -> 4+3+3+3) that are generated
+# concurrently through the gateway. A chunk that fails to parse or comes back
+# short is retried on its own; if it still fails, its weeks are filled from
+# the syllabus so the rest of the scheme survives. 0 = one call per scheme.
+SCHEME_CHUNK_WEEKS = int(os.getenv("SCHEME_CHUNK_WEEKS", "4"))
+SCHEME_CHUNK_ATTEMPTS = int(os.getenv("SCHEME_CHUNK_ATTEMPTS", "2"))
 
-    # 3. PREPARE DATA SUMMARY (Extract Unit Numbers to guide the AI)
-    syllabus_summary = []
-    syllabus_book = f"{subject} Syllabus {grade}"
 
-    for t in term_syllabus_data:
-        if isinstance(t, dict):
-            unit_code = t.get("unit") or t.get("unit_number") or t.get("number") or ""
-            topic_title = t.get("topic_title") or t.get("topic") or ""
-            
-            # Smart Reference Handling
-            syl_page = t.get("syllabus_page") or t.get("page_number") or t.get("page")
-            strict_refs = []
-            if syl_page:
-                strict_refs.append(f"{syllabus_book} Pg {syl_page}")
-            else:
-                strict_refs.append(f"{syllabus_book}")
-
-            # Append module refs if they exist
-            module_refs = t.get("references") or t.get("refs") or t.get("textbook_refs")
-            if module_refs:
-                if isinstance(module_refs, list): strict_refs.extend(module_refs)
-                elif isinstance(module_refs, str): strict_refs.append(module_refs)
-
-            syllabus_summary.append({
-                "unit_prefix": unit_code,
-                "topic": topic_title,
-                "content": t.get("subtopics") or t.get("content") or [],
-                "outcomes": t.get("learning_outcomes") or t.get("specific_outcomes") or "",
-                "forced_references": strict_refs
-            })
-        elif isinstance(t, str):
-            syllabus_summary.append({"unit_prefix": "", "topic": t, "forced_references": [syllabus_book]})
-
-    model = get_model()
-
-    # ⚡️ DYNAMIC TEMPLATE INJECTION
-    format_instruction = f"""
-    OUTPUT JSON FORMAT (Strict):
-    {{
-      "intro_info": {{
+# =====================================================
+# 🧩 PROMPT PIECES
+# =====================================================
+def _format_instruction(syllabus_book: str, locked_context: Optional[Dict[str, Any]], first_week: int = 1, include_intro: bool = True) -> str:
+    intro_block = """
+      "intro_info": {
         "philosophy": "Text...",
         "competence_learning": "Text...",
         "goals": ["Goal 1...", "Goal 2..."]
-      }},
+      },""" if include_intro else ""
+
+    if locked_context and locked_context.get("customColumns"):
+        custom_keys = [c["key"] for c in locked_context["customColumns"]]
+        intro_rule = 'Also ensure to output "intro_info" as standard.' if include_intro else 'Do NOT output "intro_info".'
+        return f"""
+        🚨 CRITICAL TEMPLATE LOCK: The teacher uses a custom spreadsheet. 
+        Instead of the standard format, the objects inside the `scheme_weeks` array MUST use EXACTLY these keys:
+        {json.dumps(custom_keys)}
+        Map your generated content logically to these keys. {intro_rule}
+        """
+
+    return f"""
+    OUTPUT JSON FORMAT (Strict):
+    {{{intro_block}
       "scheme_weeks": [
         {{
-          "week_number": 1,
+          "week_number": {first_week},
           "topic": "Unit 4.1: Sets", 
           "prescribed_competences": ["Critical Thinking", "Communication"],
           "specific_competences": ["4.1.1 Learners should be able to describe sets..."],
@@ -115,17 +64,33 @@ async def generate_scheme_with_ai(
     }}
     """
 
-    if locked_context and locked_context.get("customColumns"):
-        custom_keys = [c["key"] for c in locked_context["customColumns"]]
-        format_instruction = f"""
-        🚨 CRITICAL TEMPLATE LOCK: The teacher uses a custom spreadsheet. 
-        Instead of the standard format, the objects inside the `scheme_weeks` array MUST use EXACTLY these keys:
-        {json.dumps(custom_keys)}
-        Map your generated content logically to these keys. Also ensure to output "intro_info" as standard.
-        """
 
-    # 4. PROMPT (The "Robust" Version)
-    prompt = f"""
+def _syllabus_context(entries: List[Dict[str, Any]]):
+    # Pack the topics into the scheme prompt budget (whole topics, in syllabus order).
+    # Every topic of the term is kept, at worst as its unit, title and references.
+    context_builder = ContextBuilder("scheme")
+    for entry in entries:
+        context_builder.add(
+            entry,
+            {k: v for k, v in entry.items() if k != "outcomes"},
+            {k: entry[k] for k in ("unit_prefix", "topic", "forced_references")},
+            required=True,
+        )
+    return context_builder.build()
+
+
+def _scheme_prompt(subject, grade, term, num_weeks, provided_intro, syllabus_text, format_instruction, first_week=1, last_week=None) -> str:
+    last_week = last_week or num_weeks
+    if first_week == 1 and last_week == num_weeks:
+        structure = f"Create exactly {num_weeks} weeks."
+        mapping = "Map provided Topics to weeks sequentially."
+    else:
+        structure = (f"This is one part of a {num_weeks}-week scheme. Create ONLY weeks {first_week} to {last_week} "
+                     f"({last_week - first_week + 1} weeks), with week_number {first_week} to {last_week}. "
+                     f"The other weeks are written separately.")
+        mapping = "Map the provided Topics (this part of the term) to these weeks sequentially."
+
+    return f"""
     Act as a Senior Head Teacher in Zambia. Create a professional Scheme of Work matching the Ministry Standard.
 
     DETAILS:
@@ -135,11 +100,11 @@ async def generate_scheme_with_ai(
     {json.dumps(provided_intro)}
 
     SYLLABUS DATA: 
-    {json.dumps(syllabus_summary)}
+    {syllabus_text}
 
     INSTRUCTIONS:
-    1. **Structure**: Create exactly {num_weeks} weeks.
-    2. **Content Mapping**: Map provided Topics to weeks sequentially.
+    1. **Structure**: {structure}
+    2. **Content Mapping**: {mapping}
     3. **NO Empty Arrays**: You MUST generate at least 2-3 items for methods, activities, resources, and assessment.
     
     4. **Formatting Rules**:
@@ -149,20 +114,220 @@ async def generate_scheme_with_ai(
 
     {format_instruction}
     """
-    
-    response_text = ""
-    try:
-        # ✅ FIX: Force JSON response type to avoid parsing errors
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
+
+
+# =====================================================
+# 🧩 CHUNK PLANNING, GENERATION AND MERGE
+# =====================================================
+def split_week_ranges(num_weeks: int, chunk_weeks: int) -> List[Tuple[int, int]]:
+    """Balanced inclusive week ranges: (13, 4) -> [(1, 4), (5, 7), (8, 10), (11, 13)]."""
+    if num_weeks <= 0:
+        return []
+    count = max(1, math.ceil(num_weeks / max(1, chunk_weeks)))
+    base, extra = divmod(num_weeks, count)
+    ranges, start = [], 1
+    for k in range(count):
+        size = base + (1 if k < extra else 0)
+        ranges.append((start, start + size - 1))
+        start += size
+    return ranges
+
+
+def _topics_for_weeks(syllabus_summary: List[Dict[str, Any]], num_weeks: int, first_week: int, last_week: int) -> List[Dict[str, Any]]:
+    """Every topic that overlaps these weeks when the term's topics are spread evenly over its weeks."""
+    total = len(syllabus_summary)
+    if total == 0:
+        return []
+    # Topic k spans weeks k*N/T to (k+1)*N/T; a topic split across two ranges goes to both
+    lo = min((first_week - 1) * total // num_weeks, total - 1)
+    hi = max(-(-last_week * total // num_weeks), lo + 1)
+    return syllabus_summary[lo:hi]
+
+
+def _topic_for_week(syllabus_summary: List[Dict[str, Any]], num_weeks: int, week_num: int) -> Optional[Dict[str, Any]]:
+    """The topic taught mid-way through this week under the same even spread."""
+    if not syllabus_summary:
+        return None
+    index = (2 * week_num - 1) * len(syllabus_summary) // (2 * num_weeks)
+    return syllabus_summary[min(index, len(syllabus_summary) - 1)]
+
+
+def _texts(entries: Any) -> List[str]:
+    # Authored entries are strings or dicts ({"subtopic_title": ...}, {"description": ...}), or one string
+    if isinstance(entries, str):
+        entries = [entries]
+    return [text for text in (item_text(e).strip() for e in entries or []) if text]
+
+
+def _placeholder_week(week_num: int, source: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Syllabus-derived row for a week whose chunk could not be generated."""
+    if not source:
+        return {"week_number": week_num}
+    prefix = str(source.get("unit_prefix") or "")
+    if prefix and not prefix.lower().startswith("unit"):
+        prefix = f"Unit {prefix}"
+    return {
+        "week_number": week_num,
+        "topic": f"{prefix}: {source.get('topic')}" if prefix else source.get("topic"),
+        "content": _texts(source.get("content"))[:4],
+        "specific_competences": _texts(source.get("outcomes"))[:4],
+        "references": source.get("forced_references", []),
+    }
+
+
+async def _generate_chunk(prompt: str, first_week: int, last_week: int, use_schema: bool = True) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """(intro_info, weeks renumbered into the range); retried alone when it fails to parse or comes back short."""
+    expected = last_week - first_week + 1
+    best_intro: Dict[str, Any] = {}
+    best_weeks: List[Dict[str, Any]] = []
+
+    for attempt in range(1, SCHEME_CHUNK_ATTEMPTS + 1):
+        try:
+            # This loop is the re-ask, so the structured layer only repairs locally
+            data = await generate_structured(
+                prompt, SchemeOfWork, label="generate_scheme_with_ai_chunk",
+                use_schema=use_schema, wrap_list="scheme_weeks", max_reasks=0,
+            )
+            weeks = [w for w in data.get("scheme_weeks", []) if isinstance(w, dict)][:expected]
+            # Week numbers are positional inside the range, whatever the model numbered them
+            for position, week in enumerate(weeks):
+                week["week_number"] = first_week + position
+            if len(weeks) > len(best_weeks):
+                best_intro, best_weeks = data.get("intro_info") or {}, weeks
+            if len(weeks) == expected:
+                break
+            print(f"⚠️ [Scheme Generator] Weeks {first_week}-{last_week}: got {len(weeks)}/{expected} (attempt {attempt})")
+        except Exception as e:
+            print(f"⚠️ [Scheme Generator] Weeks {first_week}-{last_week} failed (attempt {attempt}): {e}")
+
+    return best_intro, best_weeks
+
+
+async def _generate_chunked(
+    subject: str, grade: str, term: str, num_weeks: int, provided_intro: Any,
+    syllabus_summary: List[Dict[str, Any]], syllabus_book: str, locked_context: Optional[Dict[str, Any]], events=None
+) -> Tuple[Dict[str, Any], List[Optional[Dict[str, Any]]]]:
+    """(scheme data, the syllabus topic each stitched week was planned from)."""
+    ranges = split_week_ranges(num_weeks, SCHEME_CHUNK_WEEKS)
+    custom_columns = bool(locked_context and locked_context.get("customColumns"))
+    print(f"🧩 [Scheme Generator] {len(ranges)} chunks: {ranges}")
+    if events is not None:
+        events.progress("generating", chunks=len(ranges))
+
+    async def run(index: int, first_week: int, last_week: int):
+        topics = _topics_for_weeks(syllabus_summary, num_weeks, first_week, last_week)
+        prompt = _scheme_prompt(
+            subject, grade, term, num_weeks, provided_intro, _syllabus_context(topics).text,
+            _format_instruction(syllabus_book, locked_context, first_week, include_intro=index == 0),
+            first_week, last_week,
         )
-        response_text = response.text
-        json_str = extract_json_string(response_text)
-        data = json.loads(json_str)
+        intro, weeks = await _generate_chunk(prompt, first_week, last_week, use_schema=not custom_columns)
+
+        # Consistency pass: every week of the range exists exactly once
+        size = last_week - first_week + 1
+        weeks += [
+            _placeholder_week(first_week + p, _topic_for_week(syllabus_summary, num_weeks, first_week + p))
+            for p in range(len(weeks), size)
+        ]
+        if events is not None:
+            for week in weeks:
+                events.emit("partial", {"section": "scheme_weeks", "index": week["week_number"] - 1, "item": week})
+        return intro, weeks
+
+    results = await asyncio.gather(*(run(k, a, b) for k, (a, b) in enumerate(ranges)))
+    if events is not None:
+        events.progress("parsing")
+
+    # Stitch in week order; the intro comes from the first chunk
+    data: Dict[str, Any] = {"scheme_weeks": [week for _, weeks in results for week in weeks]}
+    if results and results[0][0]:
+        data["intro_info"] = results[0][0]
+    sources = [_topic_for_week(syllabus_summary, num_weeks, week["week_number"]) for week in data["scheme_weeks"]]
+    return data, sources
 
-        if "scheme_weeks" not in data and isinstance(data, list):
-            data = {"intro_info": {}, "scheme_weeks": data}
+
+# =====================================================
+# 1. PROFESSIONAL SCHEME GENERATOR (ROBUST VERSION)
+# =====================================================
+async def generate_scheme_with_ai(
+    syllabus_data: Union[CurriculumDocument, List[dict], Dict[str, Any]], 
+    subject: str,
+    grade: str,
+    term: str,
+    num_weeks: int,
+    start_date: str = "2026-01-13",
+    locked_context: Optional[Dict[str, Any]] = None, # 🆕 TEMPLATE LOCK SUPPORT
+    events=None  # GenerationEvents: stream the response and emit each finished week
+) -> Dict[str, Any]:
+    
+    print(f"\n📘 [Scheme Generator] Processing for {subject} Grade {grade}...")
+    
+    # 1. Topics and Intro Data come from the pre-normalized curriculum IR
+    if not isinstance(syllabus_data, CurriculumDocument):
+        syllabus_data = build_syllabus_ir(syllabus_data)
+
+    topics_list = syllabus_data.topics
+    provided_intro = syllabus_data.intro
+
+    # 2. TERM SPLITTING LOGIC
+    total_units = len(topics_list)
+    chunk_size = math.ceil(total_units / 3)
+    term_lower = str(term).lower()
+    
+    start_idx = 0
+    end_idx = chunk_size
+
+    if "2" in term_lower:
+        start_idx = chunk_size
+        end_idx = chunk_size * 2
+    elif "3" in term_lower:
+        start_idx = chunk_size * 2
+        end_idx = total_units
+
+    term_syllabus_data = topics_list[start_idx : min(end_idx, total_units)] if total_units > 0 else []
+    
+    # Fallback if splitting resulted in empty list
+    if not term_syllabus_data and total_units > 0:
+        term_syllabus_data = topics_list
+
+    # 3. PREPARE DATA SUMMARY (Extract Unit Numbers to guide the AI)
+    syllabus_summary = []
+    syllabus_book = f"{subject} Syllabus {grade}"
+
+    for t in term_syllabus_data:
+        # Smart Reference Handling
+        strict_refs = [f"{syllabus_book} Pg {t.page}"] if t.page else [f"{syllabus_book}"]
+        # Append module refs if they exist
+        strict_refs.extend(t.references)
+
+        syllabus_summary.append({
+            "unit_prefix": t.unit,
+            "topic": t.title,
+            "content": t.content,
+            "outcomes": t.outcomes,
+            "forced_references": strict_refs
+        })
+
+    try:
+        week_sources = None
+        if SCHEME_CHUNK_WEEKS > 0 and num_weeks > SCHEME_CHUNK_WEEKS:
+            # 4a. CHUNKED: week ranges generated concurrently, then stitched
+            data, week_sources = await _generate_chunked(
+                subject, grade, term, num_weeks, provided_intro,
+                syllabus_summary, syllabus_book, locked_context, events=events,
+            )
+        else:
+            # 4b. SINGLE CALL (The "Robust" Version)
+            prompt = _scheme_prompt(
+                subject, grade, term, num_weeks, provided_intro,
+                _syllabus_context(syllabus_summary).text,
+                _format_instruction(syllabus_book, locked_context),
+            )
+            # ✅ FIX: Schema-constrained JSON (the teacher's own columns when the template is locked)
+            data = await generate_structured(
+                prompt, SchemeOfWork, label="generate_scheme_with_ai", events=events, sections=("scheme_weeks", "$"),
+                use_schema=not (locked_context and locked_context.get("customColumns")), wrap_list="scheme_weeks",
+            )
         
         cleaned_weeks = []
         raw_weeks = data.get("scheme_weeks", [])
@@ -195,8 +360,11 @@ async def generate_scheme_with_ai(
             
             # ✅ REFERENCE INJECTION (The logic you liked)
             # If AI returns empty refs, or if we have strict refs from syllabus, force them in.
-            if i < len(syllabus_summary):
-                source = syllabus_summary[i]
+            # Chunked weeks take them from the topic their chunk planned them from.
+            source = week_sources[i] if week_sources is not None else (
+                syllabus_summary[i] if i < len(syllabus_summary) else None
+            )
+            if source:
                 strict_refs = source.get("forced_references", [])
                 
                 ai_refs = item.get("references")
@@ -210,18 +378,16 @@ async def generate_scheme_with_ai(
             cleaned_weeks.append(item)
             
         return {
-            "intro_info": data.get("intro_info", {
+            "intro_info": data.get("intro_info") or {
                 "philosophy": f"The Grade {grade} {subject} curriculum is designed using a competence-based approach.",
                 "competence_learning": "Focus on skills and practical application.",
                 "goals": ["To apply concepts in real life."]
-            }),
+            },
             "weeks": cleaned_weeks
         }
 
     except Exception as e:
         print(f"❌ [Scheme Generator] Failed: {e}")
-        if response_text:
-            print(f"❌ RAW AI RESPONSE (Partial): {response_text[:500]}...") 
         return {"intro_info": {}, "weeks": []}
 
 # =====================================================
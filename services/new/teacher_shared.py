@@ -2,12 +2,18 @@ import os
 import re
 import json
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 
 from dotenv import load_dotenv
 import google.generativeai as genai
 from fuzzywuzzy import fuzz
 
+from services.llm_gateway import llm_gateway
+from services.json_repair import extract_json_string
+from services.curriculum_ir import CurriculumDocument, ensure_module_ir
+from services.module_search import get_search_index
+from services.prompt_context import module_block_context
+
 
 # ======================================
 # 🔧 BASE CONFIG
@@ -17,7 +23,7 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 
 def get_model():
-    return genai.GenerativeModel("gemini-2.5-flash")
+    return llm_gateway.model("gemini-2.5-flash")
 
 
 # ======================================
@@ -48,118 +54,65 @@ def fuzzy_ratio(a: str, b: str) -> float:
     return fuzz.ratio(a, b) / 100.0
 
 
-# ======================================
-# 🧽 SAFE JSON EXTRACTION
-# ======================================
-def extract_json_string(text: str) -> str:
-    try:
-        cleaned = text.replace("```json", "").replace("```", "").strip()
-        start = min(
-            [i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1],
-            default=-1
-        )
-        if start == -1:
-            return cleaned
-
-        end = cleaned.rfind("}") if cleaned[start] == "{" else cleaned.rfind("]")
-        return cleaned[start:end + 1] if end != -1 else cleaned
-    except Exception:
-        return text
-
-
 # ======================================
 # 📘 MASTER MODULE SEARCH ENGINE
 # ======================================
 def find_structured_module_content(
-    module: Dict[str, Any],
-    query: str
+    module: Union[CurriculumDocument, Dict[str, Any], None],
+    query: str,
+    *fallback_queries: str,
+    doc_type: Optional[str] = None
 ) -> Optional[Dict[str, Any]]:
     """
     Matches a syllabus subtopic to a module subtopic and
     RETURNS THE FULL SUBTOPIC BLOCK for LLM prompting.
+
+    `module` is the cached IR from load_module_ir (raw module dicts from
+    older call sites are converted on the fly). `fallback_queries` (e.g. the
+    theme after the subtopic) are tried in order; the first query that
+    matches wins. `doc_type` selects the prompt token budget for the
+    context (see services.prompt_context); None returns the full block.
     """
-    if not module or "topics" not in module:
+    module = ensure_module_ir(module)
+    if not module or not module.topics:
         print("❌ [Module Search] Invalid or empty module structure")
         return None
 
-    q_id = extract_id(query)
-    q_norm = normalize(query)
-    parent_ids = get_parent_ids(q_id) if q_id else []
-
-    best_match = None
-    best_score = 0.0
-
     # --------------------------------------
-    # 🔍 SEARCH
+    # 🔍 SEARCH (per-module index, built once per module version)
     # --------------------------------------
-    for topic in module.get("topics", []):
-        for sub in topic.get("sub_topics", []):
-            sub_id = str(sub.get("subtopic_id", ""))
-            sub_title = sub.get("subtopic_title", "")
-            sub_norm = normalize(sub_title)
-
-            id_match = False
-            if q_id:
-                if q_id == sub_id or sub_id in parent_ids:
-                    id_match = True
-
-            text_score = fuzzy_ratio(q_norm, sub_norm)
-            score = 1.0 if id_match else text_score
-
-            if score > best_score:
-                best_score = score
-                best_match = (topic, sub)
-
-    if not best_match or best_score < 0.45:
+    match = get_search_index(module).search_first((query,) + fallback_queries)
+    if not match:
         print("⚠️ [Module Search] No suitable match found")
         return None
 
-    topic, sub = best_match
+    topic, sub, best_score = match
 
     # --------------------------------------
-    # 🧱 EXTRACT *FULL SUBTOPIC BLOCK*
+    # 🧱 FULL SUBTOPIC BLOCK (serialized once per module version, trimmed to the endpoint budget)
     # --------------------------------------
-    instructional_blocks = sub.get("instructional_blocks", [])
-
-    context_chunks = []
-    for block in instructional_blocks:
-        context_chunks.append({
-            "activity_id": block.get("activity_number") or block.get("block_id"),
-            "page": block.get("page") or block.get("page_number"),
-            "hook": block.get("hook"),
-            "teacher_steps": block.get("teacher_steps", []),
-            "learner_tasks": block.get("learner_tasks", []),
-            "examples": block.get("examples", []),
-            "short_notes": block.get("short_notes", "")
-        })
-
-    context_text = json.dumps(context_chunks, indent=2, ensure_ascii=False)
+    context = module_block_context(sub, doc_type)
+    context_text = context.text
 
     print("✅ [Module Search] FULL SUBTOPIC BLOCK EXTRACTED")
-    print(f"   ↳ Topic: {topic.get('topic_title')}")
-    print(f"   ↳ Subtopic: {sub.get('subtopic_title')} ({sub.get('subtopic_id')})")
-    print(f"   ↳ Activities Extracted: {len(context_chunks)}")
-    print("📦 [Module Search] Context sent to AI ↓↓↓")
-    print(context_text[:1200] + ("..." if len(context_text) > 1200 else ""))
+    print(f"   ↳ Topic: {topic.title}")
+    print(f"   ↳ Subtopic: {sub.title} ({sub.id})")
+    print(f"   ↳ Activities Extracted: {context.included}/{len(sub.blocks)} | Context: ~{context.tokens_used} tokens")
 
     return {
         "found": True,
         "match_score": round(best_score, 3),
 
-        "topic_title": topic.get("topic_title", ""),
-        "topic_id": topic.get("topic_id", ""),
+        "topic_title": topic.title,
+        "topic_id": topic.id,
 
-        "subtopic_title": sub.get("subtopic_title", ""),
-        "subtopic_id": sub.get("subtopic_id", ""),
-        "pages": (
-            sub.get("page")
-            or sub.get("page_number")
-            or topic.get("page_number")
-            or "N/A"
-        ),
+        "subtopic_title": sub.title,
+        "subtopic_id": sub.id,
+        "pages": sub.page or topic.page or "N/A",
 
         # 🔥 THIS IS WHAT YOUR LLM EXPECTS
-        "context_text": context_text
+        "context_text": context_text,
+        "context_tokens": context.tokens_used
     }
 
 
@@ -1,7 +1,11 @@
 import json
 from typing import List, Dict, Any, Optional
 # Ensure these imports point to the correct locations
-from .teacher_shared import get_model, extract_json_string, find_structured_module_content
+from services.curriculum_ir import CurriculumDocument
+from services.llm_cache import llm_cache
+from services.llm_schemas import WeeklyPlan
+from services.structured_output import generate_structured
+from .teacher_shared import find_structured_module_content
 from .teacher_schemes import extract_scheme_details
 
 # =====================================================
@@ -11,12 +15,13 @@ async def generate_weekly_plan_from_scheme(
     school: str, subject: str, grade: str, term: str, 
     week_number: int, days: int, start_date: str, 
     scheme_data: List[dict] = None,
-    module_data: Optional[Dict[str, Any]] = None,
+    module_data: Optional[CurriculumDocument] = None,
     school_logo: Optional[str] = None,
     manual_topic: Optional[str] = None,
     manual_subtopic: Optional[str] = None,
     locked_context: Optional[Dict[str, Any]] = None,
-    objectives: Optional[List[str]] = None # 👈 ADDED OBJECTIVES HERE
+    objectives: Optional[List[str]] = None, # 👈 ADDED OBJECTIVES HERE
+    events=None  # GenerationEvents: stream the response and emit each finished day
 ) -> Dict[str, Any]:
     
     print(f"\n🗓️ [Weekly Generator] Request: Week {week_number}...")
@@ -39,7 +44,9 @@ async def generate_weekly_plan_from_scheme(
     target_topic_for_module = manual_subtopic if manual_subtopic else details['topic']
 
     # 4. FETCH STRUCTURED MODULE CONTENT
-    module_info = find_structured_module_content(module_data, target_topic_for_module)
+    # A manual subtopic falls back to the week's topic in the same search pass
+    fallback_queries = [details['topic']] if manual_subtopic else []
+    module_info = find_structured_module_content(module_data, target_topic_for_module, *fallback_queries, doc_type="weekly")
     
     module_prompt_insert = ""
     
@@ -92,7 +99,6 @@ async def generate_weekly_plan_from_scheme(
         obj_list = "\n    - ".join(objectives)
         objectives_instruction = f"\n    TARGET OBJECTIVES / OUTCOMES:\n    - {obj_list}\n    (Distribute these specific objectives logically across the {days} daily lessons. DO NOT hallucinate other topics.)"
 
-    model = get_model() 
     
     # 6. ⚡️ DYNAMIC TEMPLATE INJECTION
     format_instruction = f"""
@@ -167,12 +173,18 @@ async def generate_weekly_plan_from_scheme(
     {format_instruction}
     """
     
-    try:
-        response = await model.generate_content_async(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
+    async def _generate() -> Dict[str, Any]:
+        return await generate_structured(
+            prompt, WeeklyPlan, label="generate_weekly_plan_from_scheme", events=events, sections=("days",),
+            use_schema=not (locked_context and locked_context.get("customColumns")),
         )
-        plan_json = json.loads(extract_json_string(response.text))
+
+    try:
+        if events is not None:
+            plan_json = await _generate()
+        else:
+            # Teachers in the same workshop asking for the same week share one call
+            plan_json = await llm_cache.coalesce("weekly_plan", {"prompt": prompt}, _generate)
         
         if "meta" in plan_json:
             plan_json["meta"]["main_topic"] = details['topic']
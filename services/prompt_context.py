@@ -0,0 +1,163 @@
+import os
+import json
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fuzzywuzzy import fuzz
+
+from services.curriculum_ir import Subtopic
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Token budget for the curriculum material inlined into each kind of prompt.
+# Defaults sit above what ~97-99% of our syllabus chunks / module subtopics
+# need, so only the outliers get trimmed. Override per deployment, e.g.
+# PROMPT_BUDGET_SCHEME=4000.
+
+PROMPT_TOKEN_BUDGETS = {
+    "scheme": int(os.getenv("PROMPT_BUDGET_SCHEME", "3000")),
+    "weekly": int(os.getenv("PROMPT_BUDGET_WEEKLY", "1500")),
+    "lesson_plan": int(os.getenv("PROMPT_BUDGET_LESSON_PLAN", "1500")),
+    "lesson_notes": int(os.getenv("PROMPT_BUDGET_LESSON_NOTES", "1500")),
+    "sba": int(os.getenv("PROMPT_BUDGET_SBA", "2500")),
+}
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PROMPT_BUDGET_DEFAULT", "2000"))
+
+# Gemini averages ~4 characters per token on English prose and JSON. A local
+# estimate keeps the builder free of network calls (count_tokens is an API hit).
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def budget_for(doc_type: str) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(doc_type, DEFAULT_TOKEN_BUDGET)
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+# ==========================================
+# 🧮 BUDGETED CONTEXT BUILDER
+# ==========================================
+
+@dataclass(slots=True)
+class PromptContext:
+    text: str            # always a complete JSON array
+    tokens_used: int
+    budget: int
+    included: int = 0
+    reduced: int = 0     # items that only fit in a shorter variant
+    dropped: int = 0
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "tokens_used": self.tokens_used,
+            "budget": self.budget,
+            "included": self.included,
+            "reduced": self.reduced,
+            "dropped": self.dropped,
+        }
+
+
+class ContextBuilder:
+    """
+    Packs prompt material into a token budget, highest priority first.
+
+    Each item is added with one or more variants, most detailed first. The
+    builder keeps the first variant that still fits, and skips the item when
+    none do. A `required` item is never skipped: room for its last (shortest)
+    variant is set aside before anything else is packed, so earlier items
+    can't crowd it out, and it goes in even if that variant alone overruns
+    the budget. Items are serialized whole, so the output is always valid
+    JSON (no more slicing a dump at an arbitrary character).
+    """
+
+    def __init__(self, doc_type: str, budget: Optional[int] = None):
+        self.doc_type = doc_type
+        self.budget = budget if budget is not None else budget_for(doc_type)
+        self._items: List[Tuple[Sequence[Any], bool]] = []
+
+    def add(self, *variants: Any, required: bool = False) -> "ContextBuilder":
+        if variants:
+            self._items.append((variants, required))
+        return self
+
+    def build(self) -> PromptContext:
+        parts: List[str] = []
+        # "[" + "]" plus one "," per additional part
+        used_chars = 2
+        limit_chars = self.budget * CHARS_PER_TOKEN
+        result = PromptContext(text="[]", tokens_used=0, budget=self.budget)
+        # Shortest form of every required item, each with its separator
+        reserved = sum(len(_compact(variants[-1])) + 1 for variants, required in self._items if required)
+
+        for variants, required in self._items:
+            separator = 1 if parts else 0
+            if required:
+                reserved -= len(_compact(variants[-1])) + 1
+            for level, variant in enumerate(variants):
+                text = _compact(variant)
+                last = level == len(variants) - 1
+                if used_chars + separator + len(text) + reserved <= limit_chars or (required and last):
+                    parts.append(text)
+                    used_chars += separator + len(text)
+                    result.included += 1
+                    if level:
+                        result.reduced += 1
+                    break
+            else:
+                result.dropped += 1
+
+        result.text = "[" + ",".join(parts) + "]"
+        result.tokens_used = estimate_tokens(result.text)
+        print(
+            f"🧮 [Context:{self.doc_type}] {result.tokens_used}/{self.budget} tokens | "
+            f"{result.included} items ({result.reduced} reduced, {result.dropped} dropped)"
+        )
+        return result
+
+
+def rank_by_relevance(items: Sequence[Any], query: Optional[str], title_of) -> List[Any]:
+    """Items most similar to `query` first; original order is kept among equals."""
+    if not query:
+        return list(items)
+    scored = [(fuzz.token_set_ratio(query, title_of(item) or ""), i, item) for i, item in enumerate(items)]
+    scored.sort(key=lambda entry: (-entry[0], entry[1]))
+    return [item for _, _, item in scored]
+
+
+# ==========================================
+# 📦 PRESETS
+# ==========================================
+
+def module_block_context(sub: Subtopic, doc_type: Optional[str]) -> PromptContext:
+    """
+    A module subtopic's instructional blocks within the endpoint's budget.
+    The cached full serialization is used as-is whenever it fits.
+    """
+    full_text = sub.context_text()
+    budget = budget_for(doc_type) if doc_type else None
+    full_tokens = estimate_tokens(full_text)
+
+    if budget is None or full_tokens <= budget:
+        return PromptContext(
+            text=full_text, tokens_used=full_tokens, budget=budget or full_tokens,
+            included=len(sub.blocks),
+        )
+
+    builder = ContextBuilder(doc_type, budget)
+    for block in sub.blocks:
+        context = block.as_context()
+        builder.add(
+            context,
+            # Steps without the worked examples and notes
+            {k: context[k] for k in ("activity_id", "page", "hook", "teacher_steps", "learner_tasks")},
+            {k: context[k] for k in ("activity_id", "page", "hook")},
+        )
+    return builder.build()
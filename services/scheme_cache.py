@@ -0,0 +1,170 @@
+import os
+import re
+import copy
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Weekly plans and records of work all start from the teacher's latest
+# scheme for (subject, grade, term). A term's 13 weekly plans plus records
+# used to run the same ordered Firestore query 20+ times. Rows are now
+# read through this per-instance cache. save_generated_scheme refreshes
+# the entry on this instance; the TTL bounds how long another instance
+# can serve rows that are out of date.
+
+SCHEME_CACHE_TTL_SECONDS = int(os.getenv("SCHEME_CACHE_TTL_SECONDS", "600"))
+# "No scheme yet" is remembered for less time, so a scheme saved on another instance shows up soon
+SCHEME_CACHE_EMPTY_TTL_SECONDS = int(os.getenv("SCHEME_CACHE_EMPTY_TTL_SECONDS", "60"))
+SCHEME_CACHE_MAX_ENTRIES = int(os.getenv("SCHEME_CACHE_MAX_ENTRIES", "5000"))
+
+# Owner used for the cross-teacher fallback (any scheme for subject/grade/term)
+ANY_TEACHER = "*"
+
+SchemeKey = Tuple[str, str, str, str]
+
+
+# ==========================================
+# 📐 ROW SHAPE
+# ==========================================
+
+def _week_number(row: Dict[str, Any]) -> Optional[int]:
+    for field in ("week_number", "weekNumber", "week"):
+        value = row.get(field)
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float):
+            return int(value)
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            if match:
+                return int(match.group())
+    return None
+
+
+def normalize_scheme_rows(scheme: Any) -> List[Dict[str, Any]]:
+    """
+    The rows of a scheme in whichever shape it was stored or passed around:
+    a list of rows, a generated_schemes document (schemeData as a list or as
+    {"rows": [...]}) or a generator result (rows / weeks / scheme_weeks).
+    Every row is a dict with an int `week_number` when one can be read.
+    """
+    rows: Any = scheme
+    if isinstance(scheme, dict):
+        rows = scheme.get("schemeData") or scheme.get("rows") or scheme.get("weeks") or scheme.get("scheme_weeks") or []
+        if isinstance(rows, dict):
+            rows = rows.get("rows") or rows.get("weeks") or []
+    if not isinstance(rows, list):
+        return []
+
+    normalized = []
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        if not isinstance(row.get("week_number"), int) or isinstance(row.get("week_number"), bool):
+            week = _week_number(row)
+            if week is not None:
+                row = {**row, "week_number": week}
+        normalized.append(row)
+    return normalized
+
+
+# ==========================================
+# 🗂️ READ-THROUGH CACHE
+# ==========================================
+
+class SchemeCache:
+    """
+    (uid, subject, grade, term) -> normalized rows, with TTL and LRU bound.
+    Concurrent misses for one key share a single load. Callers get their own
+    deep copy of the rows (nested lists included), so they can edit rows
+    without touching the cache.
+    """
+
+    def __init__(self, ttl_seconds: int, empty_ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.empty_ttl_seconds = empty_ttl_seconds
+        self.max_entries = max_entries
+        # key -> (expires_at, rows)
+        self._entries: "OrderedDict[SchemeKey, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[SchemeKey, asyncio.Task] = {}
+        # Bumped by put/invalidate so a load that started before a save can't overwrite it
+        self._versions: Dict[SchemeKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(uid: str, subject: str, grade: str, term: str) -> SchemeKey:
+        return (str(uid), str(subject), str(grade), str(term))
+
+    async def get_or_load(self, key: SchemeKey, load: Callable[[], Awaitable[Any]]) -> List[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_load(key, done))
+        else:
+            self.coalesced += 1
+        rows = await asyncio.shield(task)
+        return copy.deepcopy(rows)
+
+    async def _load(self, key: SchemeKey, load: Callable[[], Awaitable[Any]]) -> List[Dict[str, Any]]:
+        version = self._versions.get(key, 0)
+        rows = normalize_scheme_rows(await load())
+        if self._versions.get(key, 0) == version:
+            self._store(key, rows)
+        return rows
+
+    def _finish_load(self, key: SchemeKey, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every waiter may have been cancelled; retrieve the error so it isn't reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def put(self, key: SchemeKey, scheme: Any):
+        """Write-through after a save: the next lookup needs no round trip."""
+        self._versions[key] = self._versions.get(key, 0) + 1
+        self._store(key, copy.deepcopy(normalize_scheme_rows(scheme)))
+
+    def invalidate(self, key: SchemeKey):
+        self._versions[key] = self._versions.get(key, 0) + 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def _store(self, key: SchemeKey, rows: List[Dict[str, Any]]):
+        ttl = self.ttl_seconds if rows else self.empty_ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._versions.pop(evicted, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+scheme_cache = SchemeCache(SCHEME_CACHE_TTL_SECONDS, SCHEME_CACHE_EMPTY_TTL_SECONDS, SCHEME_CACHE_MAX_ENTRIES)
@@ -4,10 +4,13 @@ import asyncio
 import re
 import tempfile
 import urllib.request
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import google.generativeai as genai
+from services.llm_gateway import llm_gateway
+from services.blocking_io import run_blocking
+from services.json_repair import parse_json
 
 # ==========================================
 # ⚙️ CONFIGURATION & AGENT SETUP
@@ -18,46 +21,21 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 AUTHOR_MODEL = "gemini-2.5-flash"
 
+# Scheme fan-out: weeks written per LLM call, and how many of those calls
+# may run at once across ALL schemes in this worker (10 subjects x 13 weeks
+# used to mean 130 simultaneous requests).
+SCHEME_WEEKS_PER_CALL = int(os.getenv("SCHOOL_SCHEME_WEEKS_PER_CALL", "4"))
+SCHEME_MAX_CONCURRENT_CALLS = int(os.getenv("SCHOOL_SCHEME_MAX_CONCURRENT_CALLS", "4"))
+
+_scheme_slots: Optional[asyncio.Semaphore] = None
+
 def get_model():
-    return genai.GenerativeModel(AUTHOR_MODEL)
+    return llm_gateway.model(AUTHOR_MODEL)
 
 # ==========================================
 # 🛠️ HELPERS
 # ==========================================
 
-def extract_json_string(text: str) -> str:
-    """
-    Extract JSON safely and LOG everything.
-    """
-    print("\n🧪 [JSON EXTRACTOR] RAW MODEL OUTPUT ↓↓↓")
-    print(text[:2000])
-    print("🧪 [JSON EXTRACTOR] END RAW OUTPUT ↑↑↑\n")
-
-    if not text:
-        raise ValueError("Model returned empty text")
-
-    # Remove code fences
-    cleaned = text.strip().replace("```json", "").replace("```", "").strip()
-
-    # Fast path
-    if cleaned.startswith("{") and cleaned.endswith("}"):
-        print("✅ [JSON EXTRACTOR] Clean JSON detected")
-        return cleaned
-
-    # Regex fallback
-    match = re.search(r'\{[\s\S]*\}', cleaned)
-    if not match:
-        raise ValueError("❌ No JSON object found in model output")
-
-    extracted = match.group(0)
-
-    print("🧪 [JSON EXTRACTOR] EXTRACTED JSON ↓↓↓")
-    print(extracted[:2000])
-    print("🧪 [JSON EXTRACTOR] END EXTRACTED JSON ↑↑↑\n")
-
-    return extracted
-
-
 def calculate_week_dates(start_date_str: str, week_num: int) -> Dict[str, str]:
     try:
         if not start_date_str:
@@ -96,7 +74,6 @@ async def _agent_author_core(
     print(f"🤖 [AUTHOR AGENT] {role_instruction}")
     print("=" * 80)
 
-    model = get_model()
 
     prompt = f"""
 You are a JSON generator.
@@ -114,21 +91,20 @@ JSON TEMPLATE:
 {json.dumps(json_schema, indent=2)}
 """
 
-    print("📤 [PROMPT SENT TO GEMINI]")
-    print(prompt[:2000])
-    print("📤 [END PROMPT]\n")
+    print(f"📤 [PROMPT SENT TO GEMINI] {len(prompt)} chars")
 
     try:
-        response = await model.generate_content_async(
+        response = await llm_gateway.generate(
             prompt,
-            generation_config={"temperature": 0.4}
+            generation_config={"temperature": 0.4},
+            model=AUTHOR_MODEL,
+            label="_agent_author_core"
         )
 
         raw_text = getattr(response, "text", "")
-        print("📥 [RAW RESPONSE RECEIVED]")
+        print(f"📥 [RAW RESPONSE RECEIVED] {len(raw_text)} chars")
 
-        extracted_json = extract_json_string(raw_text)
-        parsed = json.loads(extracted_json)
+        parsed = parse_json(raw_text)
 
         print("✅ [JSON PARSED SUCCESSFULLY]")
         print(f"🔑 Keys returned: {list(parsed.keys())}")
@@ -160,19 +136,22 @@ def _download_file_to_temp(url: str) -> Optional[str]:
 
 async def convert_pdf_to_template(file_url: str, doc_type: str) -> str:
     print(f"📄 [TEMPLATE AGENT] Converting {doc_type}")
-    local_path = _download_file_to_temp(file_url)
+    local_path = await run_blocking(_download_file_to_temp, file_url)
     if not local_path:
         return ""
 
     try:
-        uploaded_file = genai.upload_file(local_path, mime_type="application/pdf")
+        uploaded_file = await run_blocking(genai.upload_file, local_path, mime_type="application/pdf")
         await asyncio.sleep(2)
 
-        model = get_model()
-        response = await model.generate_content_async([
-            uploaded_file,
-            f"Convert this {doc_type} template into HTML using Tailwind. Output raw HTML only."
-        ])
+        response = await llm_gateway.generate(
+            [
+                uploaded_file,
+                f"Convert this {doc_type} template into HTML using Tailwind. Output raw HTML only."
+            ],
+            model=AUTHOR_MODEL,
+            label="convert_pdf_to_template"
+        )
 
         html = response.text.replace("```html", "").replace("```", "").strip()
         print("🧩 [HTML GENERATED LENGTH]:", len(html))
@@ -206,15 +185,92 @@ async def generate_scheme_with_ai(
         print("⚠️ No syllabus topics")
         return []
 
-    tasks = []
-    for i in range(num_weeks):
-        tasks.append(_agent_author_core(
-            f"Write scheme for week {i+1}",
-            f"Topic: {topics[min(i, len(topics)-1)]}",
-            {"week": "", "topic": "", "content": [], "outcomes": [], "references": []}
+    def week_topic(i: int):
+        return topics[min(i, len(topics) - 1)]
+
+    batches = [list(range(i, min(i + max(1, SCHEME_WEEKS_PER_CALL), num_weeks)))
+               for i in range(0, num_weeks, max(1, SCHEME_WEEKS_PER_CALL))]
+    print(f"🧩 [SERVICE] SCHEME → {num_weeks} weeks in {len(batches)} calls "
+          f"({SCHEME_WEEKS_PER_CALL}/call, max {SCHEME_MAX_CONCURRENT_CALLS} concurrent)")
+
+    results = await asyncio.gather(*(_author_scheme_batch(batch, week_topic) for batch in batches))
+    # Batches come back in submission order, so the flattened list is in week order
+    return [week for batch_weeks in results for week in batch_weeks]
+
+
+def _returned_week_number(week: dict) -> Optional[int]:
+    # "Week 3" / "3" / 3 / 3.0; None when the model left it out
+    value = week.get("week_number") or week.get("week")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        digits = re.search(r"\d+", value)
+        return int(digits.group()) if digits else None
+    return None
+
+
+def _scheme_week_template(i: int) -> Dict[str, Any]:
+    return {"week": f"Week {i + 1}", "topic": "", "content": [], "outcomes": [], "references": []}
+
+
+async def _author_scheme_call(role_instruction: str, context_data: str, json_schema: Dict[str, Any]) -> Dict[str, Any]:
+    global _scheme_slots
+    if _scheme_slots is None:
+        _scheme_slots = asyncio.Semaphore(SCHEME_MAX_CONCURRENT_CALLS)
+    async with _scheme_slots:
+        return await _agent_author_core(role_instruction, context_data, json_schema)
+
+
+async def _author_scheme_batch(batch: List[int], week_topic) -> List[dict]:
+    """
+    One LLM call for several weeks. If the call fails or comes back short,
+    only the missing weeks are retried one call each; a week that still fails
+    keeps its empty template row (the old per-week behaviour).
+    """
+    template = {"weeks": [_scheme_week_template(i) for i in batch]}
+    result = await _author_scheme_call(
+        f"Write scheme for weeks {batch[0] + 1} to {batch[-1] + 1}, one entry per week in order",
+        "\n".join(f"Week {i + 1} - Topic: {week_topic(i)}" for i in batch),
+        template,
+    )
+
+    returned = result.get("weeks") if result is not template and isinstance(result, dict) else None
+    returned = [w for w in returned if isinstance(w, dict)] if isinstance(returned, list) else []
+
+    # Place each week by the number it came back with; position is only a fallback for unnumbered
+    # weeks, so a skipped or reordered week can't shift the ones after it
+    slots: Dict[int, List[dict]] = {}
+    unnumbered: List[Tuple[int, dict]] = []
+    for position, week in enumerate(returned):
+        if not week.get("topic"):
+            continue
+        number = _returned_week_number(week)
+        if number is None:
+            if position < len(batch):
+                unnumbered.append((position, week))
+        elif number - 1 in batch:
+            slots.setdefault(batch.index(number - 1), []).append(week)
+    for position, week in unnumbered:
+        slots.setdefault(position, []).append(week)
+
+    weeks: List[Optional[dict]] = [None] * len(batch)
+    for position, candidates in slots.items():
+        # Two answers for one week: neither is trusted, the week is retried
+        if len(candidates) == 1:
+            candidates[0]["week"] = f"Week {batch[position] + 1}"
+            weeks[position] = candidates[0]
+
+    missing = [position for position, week in enumerate(weeks) if week is None]
+    if missing:
+        print(f"⚠️ [SERVICE] SCHEME → weeks {[batch[p] + 1 for p in missing]} missing from batch, retrying individually")
+        singles = await asyncio.gather(*(
+            _author_scheme_call(f"Write scheme for week {batch[p] + 1}", f"Topic: {week_topic(batch[p])}", _scheme_week_template(batch[p]))
+            for p in missing
         ))
+        for position, week in zip(missing, singles):
+            weeks[position] = week
 
-    return await asyncio.gather(*tasks)
+    return weeks
 
 
 async def generate_weekly_plan_with_ai(
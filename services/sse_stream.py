@@ -0,0 +1,114 @@
+import json
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from services.llm_gateway import llm_gateway
+from services.json_stream import IncrementalJSONParser
+
+# ==========================================
+# 📡 SERVER-SENT EVENTS FOR LONG GENERATIONS
+# ==========================================
+# Streaming endpoints run exactly the same route logic as their JSON
+# counterparts (credits, persistence, validation) in a background task, and
+# relay what happens on the way as SSE:
+#
+#   event: progress   {"stage": "started" | "generating" | "saving" | ...}
+#   event: partial    {"section": "days", "index": 0, "item": {...}}   (one per closed array element,
+#                     see services/json_stream.py for the section paths)
+#   event: progress   {"stage": "retrying", "discard_partials": true}
+#                     the answer streamed so far was rejected (cut off / invalid) and the
+#                     model is asked again: drop every partial received so far, the
+#                     re-ask streams its own from index 0
+#   event: result     the same body the JSON endpoint returns
+#   event: error      {"status_code": 500, "detail": "..."}
+#
+# The first event goes out immediately, so time-to-first-byte no longer
+# waits on Gemini.
+
+HEARTBEAT_SECONDS = 15
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+
+
+class GenerationEvents:
+    """Event sink handed to generators and route helpers running in streaming mode."""
+
+    def __init__(self):
+        self.queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+
+    def emit(self, event: str, data: Any):
+        self.queue.put_nowait((event, data))
+
+    def progress(self, stage: str, **info):
+        self.emit("progress", {"stage": stage, **info})
+
+    async def stream_llm(
+        self,
+        prompt: Any,
+        *,
+        label: str,
+        sections: Sequence[str] = (),
+        generation_config: Optional[Any] = None,
+    ) -> str:
+        """Streams the generation, emitting each closed element of `sections`; returns the full text."""
+        self.progress("generating")
+        parser = IncrementalJSONParser(sections) if sections else None
+        parts: List[str] = []
+        async for text in llm_gateway.stream(prompt, generation_config=generation_config, label=label):
+            parts.append(text)
+            if parser is not None:
+                for element in parser.feed(text):
+                    self.emit("partial", {"section": element.path, "index": element.index, "item": element.value})
+        self.progress("parsing")
+        return "".join(parts)
+
+
+def _error_payload(error: BaseException) -> Dict[str, Any]:
+    if isinstance(error, HTTPException):
+        return {"status_code": error.status_code, "detail": error.detail}
+    return {"status_code": 500, "detail": str(error)}
+
+
+def sse_response(run: Callable[[GenerationEvents], Awaitable[Any]]) -> StreamingResponse:
+    """
+    Runs `run(events)` in a task and streams its events, then its return value
+    as `result` (or its exception as `error`). If the client disconnects the
+    task keeps going, so the document is still saved and charged exactly as
+    the JSON endpoint would.
+    """
+    events = GenerationEvents()
+
+    async def body() -> AsyncIterator[bytes]:
+        yield sse_event("progress", {"stage": "started"})
+        task = asyncio.ensure_future(run(events))
+
+        while True:
+            getter = asyncio.ensure_future(events.queue.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield sse_event(*getter.result())
+                continue
+            getter.cancel()
+
+            if task not in done:
+                yield b": keep-alive\n\n"
+                continue
+
+            while not events.queue.empty():
+                yield sse_event(*events.queue.get_nowait())
+            if task.exception() is not None:
+                yield sse_event("error", _error_payload(task.exception()))
+            else:
+                yield sse_event("result", task.result())
+            return
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
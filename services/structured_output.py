@@ -0,0 +1,187 @@
+import json
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from services.llm_gateway import llm_gateway
+from services.json_repair import repair_json
+
+# ==========================================
+# 🧱 SCHEMA-CONSTRAINED GENERATION
+# ==========================================
+# generate_structured(prompt, LessonPlan, ...) sends the model's JSON Schema
+# as Gemini's `response_schema`. It validates the answer into the model and
+# returns a plain dict (only the keys the model actually sent, coerced to
+# the declared types). A response that does not parse gets the local
+# repair pass from services.json_repair first (fences, chatter, comments,
+# trailing commas). A response that was cut off is never accepted, even
+# though repair can close it: the model is asked again, once, as it is
+# when repair fails or the content checks in services.llm_schemas do.
+#
+# Per-label counters record how often the old json.loads(extract_json_string())
+# path would have failed on the first response ("legacy_failures"), and how
+# often each fallback was actually needed.
+
+MAX_REASKS = 1
+
+_SCHEMA_KEYS = ("type", "format", "description", "nullable", "enum", "items", "properties", "required")
+
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+class StructuredOutputError(ValueError):
+    """The response could not be parsed or validated, even after repair and re-asking."""
+
+
+# ==========================================
+# SCHEMA CONVERSION (Pydantic -> Gemini)
+# ==========================================
+
+def _to_gemini(node: Dict[str, Any], defs: Dict[str, Any]) -> Dict[str, Any]:
+    if "$ref" in node:
+        return _to_gemini(defs[node["$ref"].split("/")[-1]], defs)
+
+    variants = node.get("anyOf")
+    if variants:
+        # Optional[X] -> X with nullable; Gemini has no general unions
+        concrete = [v for v in variants if v.get("type") != "null"]
+        out = _to_gemini(concrete[0], defs) if concrete else {"type": "string"}
+        if len(concrete) < len(variants):
+            out["nullable"] = True
+        return out
+
+    out: Dict[str, Any] = {k: node[k] for k in ("type", "format", "description", "enum") if k in node}
+    if "items" in node:
+        out["items"] = _to_gemini(node["items"], defs)
+    if "properties" in node:
+        out["type"] = "object"
+        out["properties"] = {name: _to_gemini(prop, defs) for name, prop in node["properties"].items()}
+        out["required"] = [name for name, prop in out["properties"].items() if not prop.get("nullable")]
+    out.setdefault("type", "string")
+    return {k: v for k, v in out.items() if k in _SCHEMA_KEYS}
+
+
+@lru_cache(maxsize=None)
+def _cached_schema(model: Type[BaseModel]) -> str:
+    schema = model.model_json_schema()
+    return json.dumps(_to_gemini(schema, schema.get("$defs", {})))
+
+
+def gemini_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """The OpenAPI subset Gemini accepts as `response_schema` (no $refs, titles, defaults or unions)."""
+    return json.loads(_cached_schema(model))
+
+
+# ==========================================
+# PARSE + VALIDATE
+# ==========================================
+
+def _counter(label: str) -> Dict[str, int]:
+    return _stats.setdefault(label, {
+        "responses": 0, "legacy_failures": 0, "clean": 0, "repaired": 0, "reasked": 0, "failed": 0,
+    })
+
+
+def _legacy_parse_failed(text: str) -> bool:
+    """Whether the extractor every generator used before this module would have rejected `text`."""
+    try:
+        cleaned = text.replace("```json", "").replace("```", "").strip()
+        start = min([i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1], default=-1)
+        if start != -1:
+            end = cleaned.rfind("}") if cleaned[start] == "{" else cleaned.rfind("]")
+            cleaned = cleaned[start:end + 1] if end != -1 else cleaned
+        json.loads(cleaned)
+        return False
+    except Exception:
+        return True
+
+
+def _validate(data: Any, model: Type[BaseModel], wrap_list: Optional[str]) -> Dict[str, Any]:
+    if isinstance(data, list) and wrap_list:
+        data = {wrap_list: data}
+    return model.model_validate(data).model_dump(exclude_unset=True)
+
+
+def parse_structured(text: str, model: Type[BaseModel], *, wrap_list: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """(validated dict, repaired?) for one response. Raises StructuredOutputError."""
+    try:
+        return _validate(json.loads(text), model, wrap_list), False
+    except (ValueError, ValidationError):
+        pass
+    try:
+        repaired, truncated = repair_json(text)
+        data = _validate(json.loads(repaired), model, wrap_list)
+    except (ValueError, ValidationError) as e:
+        raise StructuredOutputError(str(e)[:300]) from e
+    if truncated:
+        # Closing the brackets would hand the teacher a partial document
+        raise StructuredOutputError("response was cut off before the JSON value closed")
+    return data, True
+
+
+async def _generate_text(prompt: Any, generation_config: Dict[str, Any], *, label: str, events=None, sections: Sequence[str] = ()) -> str:
+    if events is not None:
+        return await events.stream_llm(prompt, label=label, sections=sections, generation_config=generation_config)
+    response = await llm_gateway.generate(prompt, generation_config=generation_config, label=label)
+    return response.text
+
+
+async def generate_structured(
+    prompt: str,
+    model: Type[BaseModel],
+    *,
+    label: str,
+    events=None,
+    sections: Sequence[str] = (),
+    use_schema: bool = True,
+    wrap_list: Optional[str] = None,
+    max_reasks: int = MAX_REASKS,
+) -> Dict[str, Any]:
+    """
+    Generates, validates against `model` and returns a dict. `use_schema=False`
+    for template-locked documents whose keys are the teacher's own (the
+    response is still validated, and unknown keys are kept). With `events`
+    every attempt is streamed, as in services.sse_stream; a re-ask is
+    announced with progress "retrying" / discard_partials first.
+    """
+    generation_config: Dict[str, Any] = {"response_mime_type": "application/json"}
+    if use_schema:
+        generation_config["response_schema"] = gemini_schema(model)
+
+    counter = _counter(label)
+    attempt_prompt = prompt
+    for attempt in range(max_reasks + 1):
+        text = await _generate_text(attempt_prompt, generation_config, label=label, events=events, sections=sections)
+        counter["responses"] += 1
+        if attempt == 0 and _legacy_parse_failed(text):
+            counter["legacy_failures"] += 1
+        try:
+            data, repaired = parse_structured(text, model, wrap_list=wrap_list)
+        except StructuredOutputError as e:
+            print(f"⚠️ [Structured:{label}] attempt {attempt + 1}: unusable response ({len(text)} chars): {e}")
+            if attempt == max_reasks:
+                counter["failed"] += 1
+                raise
+            counter["reasked"] += 1
+            if events is not None:
+                # The partials already sent came from the rejected answer; the re-ask streams its own
+                events.progress("retrying", discard_partials=True)
+            attempt_prompt = f"{prompt}\n\nYour previous answer was incomplete or not valid JSON for the required structure. Return ONLY the complete JSON object, with every section filled in."
+            continue
+        counter["repaired" if repaired else "clean"] += 1
+        if repaired:
+            print(f"🩹 [Structured:{label}] response repaired locally")
+        return data
+
+
+def structured_output_stats() -> Dict[str, Any]:
+    out = {}
+    for label, c in _stats.items():
+        first = c["responses"] - c["reasked"]
+        out[label] = {
+            **c,
+            "legacy_failure_rate": round(c["legacy_failures"] / first, 3) if first else 0.0,
+            "failure_rate": round(c["failed"] / first, 3) if first else 0.0,
+        }
+    return out
@@ -3,6 +3,10 @@ import os
 from pathlib import Path
 from typing import List, Dict, Any, Union, Optional
 
+from services.curriculum_catalog import CurriculumCatalog, get_catalog
+from services.curriculum_ir import CurriculumDocument, load_syllabus_ir_file, load_module_ir_file
+from services.document_cache import document_cache
+
 # ==========================================
 # 1. CURRICULUM ROUTING LOGIC
 # ==========================================
@@ -53,60 +57,25 @@ SYLLABI_ROOT_DIR = get_root_dir("syllabi")
 MODULES_ROOT_DIR = get_root_dir("modules")
 
 # ==========================================
-# 3. ROBUST FILE FINDER
+# 3. ROBUST FILE FINDER (CATALOG-BACKED)
 # ==========================================
 
+def get_curriculum_catalog() -> CurriculumCatalog:
+    """
+    The syllabi/modules tree is scanned once per process; lookups after that
+    are dict hits instead of a glob + substring scan per request.
+    """
+    return get_catalog(SYLLABI_ROOT_DIR, MODULES_ROOT_DIR)
+
 def find_file(root_dir: Path, country: str, grade: str, subject: str, must_include: str = "") -> Optional[Path]:
     if not root_dir.exists():
         return None
 
-    curr_type = get_curriculum_folder(grade)
-    target_dir = root_dir / curr_type
-    
-    if not target_dir.exists():
-        target_dir = root_dir
+    catalog = get_curriculum_catalog()
+    if must_include == "module" or root_dir == MODULES_ROOT_DIR:
+        return catalog.find_module_file(country, grade, subject)
 
-    search_country = country.lower().strip()
-    search_subject = subject.lower().strip().replace(" ", "_")
-    
-    # Clean input for search
-    raw_input = str(grade).lower().replace(" ", "")
-    
-    # STRICT TAG GENERATION
-    # If input is "form1", only look for form tags. If "grade1", only grade tags.
-    possible_grade_tags = []
-    
-    # Extract number (e.g. "1" from "form1")
-    raw_num = raw_input.replace("grade", "").replace("form", "")
-
-    if "form" in raw_input:
-        # Looking for Form files (e.g., ...grade_form_1.json or ...form_1.json)
-        possible_grade_tags = [f"form{raw_num}", f"form_{raw_num}"] 
-    elif "grade" in raw_input:
-        # Looking for Grade files (e.g., ...grade_1.json)
-        possible_grade_tags = [f"grade{raw_num}", f"grade_{raw_num}"]
-    else:
-        # Fallback if just "1" is passed
-        possible_grade_tags = [f"grade{raw_num}", f"grade_{raw_num}", f"form{raw_num}"]
-
-    for file_path in target_dir.glob("*.json"):
-        filename = file_path.name.lower()
-        
-        if must_include and must_include not in filename: continue
-        if search_country not in filename and "zambia" not in filename: pass 
-        if search_subject not in filename: continue
-            
-        # Strict Grade Check
-        if any(tag in filename for tag in possible_grade_tags):
-            # Anti-collision check: If looking for "Grade 1", ensure we didn't hit "Grade Form 1"
-            if "grade" in raw_input and "form" not in raw_input:
-                if "form" in filename:
-                    continue # Skip Form files when asking for Grade
-                    
-            print(f"✅ Found {must_include if must_include else 'Syllabus'} File: {filename}")
-            return file_path
-            
-    return None
+    return catalog.find_syllabus_file(get_curriculum_folder(grade), country, grade, subject)
 
 def find_syllabus_file(country: str, grade: str, subject: str) -> Optional[Path]:
     return find_file(SYLLABI_ROOT_DIR, country, grade, subject)
@@ -120,16 +89,16 @@ def find_module_file(country: str, grade: str, subject: str) -> Optional[Path]:
 
 def load_syllabus(country: str, grade: str, subject: str) -> List[Dict[str, Any]]:
     file_path = find_syllabus_file(country, grade, subject)
-    if file_path and file_path.exists():
+    if file_path:
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    if "topics" in data: return data["topics"]
-                    elif "content" in data: return data["content"]
-                    else: return [data]
-                elif isinstance(data, list):
-                    return data
+            # Parsed once per file version and shared (read-only) across requests
+            data = document_cache.get(file_path)
+            if isinstance(data, dict):
+                if "topics" in data: return data["topics"]
+                elif "content" in data: return data["content"]
+                else: return [data]
+            elif isinstance(data, list):
+                return data
         except Exception as e:
             print(f"❌ JSON Error in {file_path.name}: {e}")
             return []
@@ -137,94 +106,101 @@ def load_syllabus(country: str, grade: str, subject: str) -> List[Dict[str, Any]
 
 def load_module(country: str, grade: str, subject: str) -> Optional[Dict[str, Any]]:
     file_path = find_module_file(country, grade, subject)
-    if file_path and file_path.exists():
+    if file_path:
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return document_cache.get(file_path)
+        except Exception:
+            return None
+    return None
+
+def load_syllabus_ir(country: str, grade: str, subject: str) -> Optional[CurriculumDocument]:
+    """Typed Topic -> Subtopic tree of the syllabus, normalized once per file version."""
+    file_path = find_syllabus_file(country, grade, subject)
+    if file_path:
+        try:
+            return load_syllabus_ir_file(file_path)
+        except Exception as e:
+            print(f"❌ JSON Error in {file_path.name}: {e}")
+    return None
+
+def load_module_ir(country: str, grade: str, subject: str) -> Optional[CurriculumDocument]:
+    """Typed Topic -> Subtopic -> InstructionalBlock tree of the module."""
+    file_path = find_module_file(country, grade, subject)
+    if file_path:
+        try:
+            return load_module_ir_file(file_path)
         except Exception:
             return None
     return None
 
 def get_subjects_for_grade(grade: str) -> list[str]:
     """
-    Scans syllabus folder to see what subjects exist for a grade.
+    Lists the subjects that have a syllabus for a grade.
     STRICTLY separates 'Form' vs 'Grade' files.
-    
-    Robust Update: Correctly identifies subjects with numbers (e.g., "Mathematics 1")
-    by strictly stripping prefixes/suffixes rather than filtering tokens.
+
+    Served from the catalog's precomputed subject index (subject names come from
+    the same filename parser used for file lookups, e.g. "Mathematics 1").
     """
     curr_type = get_curriculum_folder(grade)
-    target_dir = SYLLABI_ROOT_DIR / curr_type
-    
-    if not target_dir.exists():
-        return []
 
-    found_subjects = set()
-    
     # Normalize input
     grade_input = str(grade).lower().strip()
-    
+
     # Extract the pure number (e.g., "1")
     raw_num = grade_input.replace("grade", "").replace("form", "").replace(" ", "").strip()
-    
-    # ⚡️ STRICT SEARCH TAGS
-    # We define exactly what the end of the filename should look like
-    search_tags = []
-    
-    if "form" in grade_input:
-        # Matches: zambia_chemistry_grade_form_1.json or zambia_history_form_1.json
-        search_tags = [f"form_{raw_num}", f"form{raw_num}"]
-    else:
-        # Matches: zambia_math_grade_1.json
-        search_tags = [f"grade_{raw_num}", f"grade{raw_num}"]
-
-    for file_path in target_dir.glob("*.json"):
-        filename = file_path.stem.lower() # e.g. "zambia_mathematics_1_grade_10"
-        
-        # 1. Check if file matches our strict tags
-        matched_tag = next((tag for tag in search_tags if tag in filename), None)
-        
-        if matched_tag:
-            
-            # ⚡️ ANTI-COLLISION SAFETY
-            # If we want "Grade 1", reject files containing "Form"
-            if "grade" in grade_input and "form" not in grade_input:
-                if "form" in filename: continue 
-
-            # If we want "Form 1", reject files that don't have "Form"
-            if "form" in grade_input and "form" not in filename: continue
-
-            # 2. STRICT EXTRACTION (The Fix)
-            # Instead of splitting by "_", we strip the known ends.
-            
-            temp_name = filename
-            
-            # Step A: Remove the matched grade suffix (e.g., remove "_grade_10")
-            # We use rsplit to ensure we cut from the right side
-            if temp_name.endswith(matched_tag):
-                temp_name = temp_name[:-len(matched_tag)]
-            
-            # Step B: Clean trailing underscores left behind (e.g. "math_")
-            temp_name = temp_name.rstrip("_")
-            
-            # Step C: Remove the "grade" word if it was stuck to the tag (e.g. "math_grade")
-            # This handles cases like "zambia_math_grade_10" -> stripped "10" -> "zambia_math_grade"
-            if temp_name.endswith("_grade"):
-                temp_name = temp_name[:-6] # remove "_grade"
-            
-            # Step D: Remove prefix "zambia_"
-            if temp_name.startswith("zambia_"):
-                temp_name = temp_name[7:] # len("zambia_") is 7
-                
-            # Step E: Formatting
-            # Now we have strict subject key (e.g. "mathematics_1")
-            # This preserves the "1" because we never filtered by isdigit()
-            subject_name = temp_name.replace("_", " ").title()
-            
-            # Edge Case: Fix "Ict" to "ICT" if needed
-            if subject_name.lower() == "ict": subject_name = "ICT"
-            
-            if subject_name: 
-                found_subjects.add(subject_name)
-
-    return sorted(list(found_subjects))
\ No newline at end of file
+    level = "form" if "form" in grade_input else "grade"
+
+    return list(get_curriculum_catalog().subjects_for(curr_type, level, raw_num))
+
+# ==========================================
+# 5. GRADE -> SUBJECTS INDEX (SHARED BY BOTH /get-subjects ENDPOINTS)
+# ==========================================
+
+# ⚡️ STRICT MAPPING: legacy grade names -> the syllabus they are served from
+GRADE_MAP = {
+    "grade 8": "Form 1",
+    "grade 9": "Form 2",
+    "form 3": "Grade 10",
+    "form 4": "Grade 11",
+    "form 5": "Grade 12",
+    "form 6": "Grade 13", 
+}
+
+# normalized grade string -> (target grade, sorted subjects). Treat values as read-only.
+_GRADE_SUBJECT_INDEX: Dict[str, tuple] = {}
+MAX_GRADE_INDEX_ENTRIES = 512
+
+def _resolve_grade_subjects(grade: str) -> tuple:
+    """GRADE_MAP aliasing, falling back to the original grade when the mapped one is empty."""
+    target_grade = GRADE_MAP.get(grade.lower().strip(), grade)
+    subjects = get_subjects_for_grade(target_grade)
+    if not subjects and target_grade != grade:
+        subjects = get_subjects_for_grade(grade)
+    return target_grade, subjects
+
+def build_grade_subject_index() -> Dict[str, tuple]:
+    """
+    Precomputes the answer for every grade we have syllabi for (plus the
+    GRADE_MAP aliases and configured curriculum grades). Called at startup.
+    """
+    labels = set(GRADE_MAP) | NEW_CURRICULUM_GRADES | OLD_CURRICULUM_GRADES
+    for _, level, number in get_curriculum_catalog().grade_levels():
+        labels.add(f"{level} {number}")
+
+    for label in labels:
+        _GRADE_SUBJECT_INDEX[label] = _resolve_grade_subjects(label)
+    return _GRADE_SUBJECT_INDEX
+
+def lookup_subjects_for_grade(grade: str) -> tuple:
+    """
+    Returns (target_grade, subjects) for a grade as typed by the frontend.
+    One dict access for known grades; anything else is resolved once and memoized.
+    """
+    key = str(grade).lower().strip()
+    cached = _GRADE_SUBJECT_INDEX.get(key)
+    if cached is None:
+        cached = _resolve_grade_subjects(str(grade))
+        # Keys come from the URL, so don't let arbitrary input grow the index forever
+        if len(_GRADE_SUBJECT_INDEX) < MAX_GRADE_INDEX_ENTRIES:
+            _GRADE_SUBJECT_INDEX[key] = cached
+    return cached
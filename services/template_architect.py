@@ -2,16 +2,17 @@ import google.generativeai as genai
 import requests
 from PIL import Image
 import io
+from services.llm_gateway import llm_gateway
+from services.blocking_io import run_blocking
 
 # Helper to get image from URL
 def load_image_from_url(url):
-    response = requests.get(url)
+    response = requests.get(url, timeout=30)
     return Image.open(io.BytesIO(response.content))
 
 async def generate_html_template_from_pdf(pdf_url: str, doc_type: str):
     
-    model = genai.GenerativeModel("gemini-1.5-pro") 
-    image = load_image_from_url(pdf_url)
+    image = await run_blocking(load_image_from_url, pdf_url)
 
     # --- PROMPT STRATEGY: DYNAMIC INSTRUCTIONS ---
     
@@ -94,7 +95,7 @@ async def generate_html_template_from_pdf(pdf_url: str, doc_type: str):
     full_prompt = base_instructions + "\n" + specific_instructions
 
     # Generate
-    response = await model.generate_content_async([full_prompt, image])
+    response = await llm_gateway.generate([full_prompt, image], model="gemini-1.5-pro", label="generate_html_template_from_pdf")
     
     # Clean up markdown if AI adds it
     clean_html = response.text.replace("```html", "").replace("```", "")
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from fastapi import Response
+
+from services.curriculum_ir import CurriculumDocument, load_syllabus_ir_file
+from services.syllabus_manager import GRADE_MAP, get_curriculum_catalog, load_syllabus_ir
+
+# ==========================================
+# 🌳 PRE-SERIALIZED TOPIC TREES
+# ==========================================
+# The frontend asks for a subject's topic tree on every subject selection.
+# The aggregated tree (and the flat exam topic list) is computed once per
+# syllabus file version, kept on the cached CurriculumDocument as ready-to-send
+# JSON bytes plus an ETag, and answered with 304 when the client already
+# holds that version. Only GET routes use the ETag (browsers and HTTP caches
+# never revalidate a POST); POST routes get the same bytes as a plain 200.
+#
+# Payloads are built on the first request for each syllabus. Parsing every
+# syllabus at startup adds to cold-start time, so it is opt-in.
+TOPIC_TREE_WARM = os.getenv("TOPIC_TREE_WARM", "0") == "1"
+
+
+class CachedPayload(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def _payload(value: Any) -> CachedPayload:
+    body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return CachedPayload(body, f'"{hashlib.sha1(body).hexdigest()[:20]}"')
+
+
+EMPTY_TOPIC_TREE = _payload({"topics": []})
+EMPTY_TOPIC_LIST = _payload([])
+
+
+def aggregate_topic_tree(syllabus: CurriculumDocument) -> List[Dict[str, Any]]:
+    """Merges duplicate topic titles into single entries, keeping first-seen subtopic order."""
+    topics_map: Dict[str, Dict[str, Any]] = {}  # Key: Topic Title, Value: Topic Dict
+
+    for topic in syllabus.topics:
+        title = topic.title or "General Topic"
+        clean_subtopics = [sub.title for sub in topic.subtopics]
+
+        if title in topics_map:
+            # If topic exists, extend subtopics (avoiding duplicates)
+            entry = topics_map[title]
+            current_subs = set(entry["subtopics"])
+            for s in clean_subtopics:
+                if s not in current_subs:
+                    entry["subtopics"].append(s)
+                    current_subs.add(s)
+        elif title != "General Topic" or clean_subtopics:
+            topics_map[title] = {"title": title, "subtopics": clean_subtopics}
+
+    return list(topics_map.values())
+
+
+def _derived(syllabus: CurriculumDocument, name: str, build) -> CachedPayload:
+    payload = syllabus.derived.get(name)
+    if payload is None:
+        payload = _payload(build(syllabus))
+        syllabus.derived[name] = payload
+    return payload
+
+
+def _tree_payload(syllabus: CurriculumDocument) -> CachedPayload:
+    return _derived(syllabus, "topic_tree", lambda doc: {"topics": aggregate_topic_tree(doc)})
+
+
+def _topic_list_payload(syllabus: CurriculumDocument) -> CachedPayload:
+    return _derived(syllabus, "topic_list", lambda doc: [t["title"] for t in aggregate_topic_tree(doc)])
+
+
+def syllabus_topic_tree(country: str, grade: str, subject: str) -> CachedPayload:
+    """{"topics": [{"title", "subtopics"}]} for /api/v1/get-syllabus-topics."""
+    target_grade = GRADE_MAP.get(grade.lower().strip(), grade)
+    syllabus = load_syllabus_ir(country, target_grade, subject)
+    if not syllabus or not syllabus.topics:
+        return EMPTY_TOPIC_TREE
+    return _tree_payload(syllabus)
+
+
+def syllabus_topic_list(country: str, grade: str, subject: str) -> CachedPayload:
+    """Flat list of topic titles for /api/exams/topics."""
+    syllabus = load_syllabus_ir(country, grade, subject)
+    if not syllabus or not syllabus.topics:
+        return EMPTY_TOPIC_LIST
+    return _topic_list_payload(syllabus)
+
+
+def warm_topic_trees() -> int:
+    """Precomputes both payloads for every syllabus in the catalog. Called at startup when TOPIC_TREE_WARM=1."""
+    warmed = 0
+    for entry in get_curriculum_catalog().syllabus_entries():
+        try:
+            syllabus = load_syllabus_ir_file(entry.path)
+        except Exception as e:
+            print(f"⚠️ [Topic Tree] Skipping {entry.path.name}: {e}")
+            continue
+        _tree_payload(syllabus)
+        _topic_list_payload(syllabus)
+        warmed += 1
+    return warmed
+
+
+def payload_response(payload: CachedPayload) -> Response:
+    """200 with the cached bytes, for POST routes."""
+    return Response(content=payload.body, media_type="application/json")
+
+
+def etag_response(payload: CachedPayload, if_none_match: Optional[str]) -> Response:
+    """For GET routes: 200 with the cached bytes, or 304 when the client's If-None-Match already names this version."""
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if if_none_match and payload.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
@@ -0,0 +1,404 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Generated documents are persisted after the response has been sent: the
+# handler enqueues the payload, a background worker commits the queue to
+# Firestore in batches. Every item is journaled to a spill file before it
+# is acknowledged, and a journal whose worker stops heartbeating is
+# replayed by another worker sharing the spill directory.
+#
+# That only holds if PERSIST_SPILL_DIR outlives the instance. On Cloud Run
+# the local filesystem (and /tmp) is in memory and goes away with the
+# instance, so it must be a mounted volume shared by the instances (e.g.
+# Filestore over NFS), and the service needs CPU outside requests
+# (--no-cpu-throttling) for the worker to flush. Without PERSIST_SPILL_DIR
+# write-behind stays off and saves are committed before the response.
+#
+# A network volume can stall on any call, so every journal read/write,
+# fsync, glob and stat runs on the queue's own writer thread (one thread, so
+# records stay in order), never on the event loop. During a long outage the
+# queue stops taking new items at PERSIST_MAX_PENDING and callers save
+# synchronously instead.
+#
+#   PERSIST_WRITE_BEHIND=0     write synchronously even with a spill dir
+
+PERSIST_SPILL_DIR = os.getenv("PERSIST_SPILL_DIR", "")
+PERSIST_WRITE_BEHIND = bool(PERSIST_SPILL_DIR) and os.getenv("PERSIST_WRITE_BEHIND", "1") != "0"
+PERSIST_BATCH_SIZE = int(os.getenv("PERSIST_BATCH_SIZE", "25"))            # items per commit (<= 2 writes each)
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.25"))  # seconds to gather a batch
+PERSIST_MAX_PENDING = int(os.getenv("PERSIST_MAX_PENDING", "1000"))        # queued items before enqueue is refused
+# Attempts for a payload Firestore rejects; outages are retried for as long as they last
+PERSIST_MAX_ATTEMPTS = int(os.getenv("PERSIST_MAX_ATTEMPTS", "10"))
+PERSIST_MAX_BACKOFF = float(os.getenv("PERSIST_MAX_BACKOFF", "30"))
+# Cloud Run SIGKILLs 10 s after SIGTERM; what isn't flushed by then is left for another instance
+PERSIST_DRAIN_TIMEOUT = float(os.getenv("PERSIST_DRAIN_TIMEOUT", "7"))
+PERSIST_FSYNC = os.getenv("PERSIST_FSYNC", "0") == "1"
+# A live worker touches its journal every HEARTBEAT seconds; one untouched for ORPHAN seconds is adopted
+PERSIST_HEARTBEAT_SECONDS = float(os.getenv("PERSIST_HEARTBEAT_SECONDS", "10"))
+PERSIST_ORPHAN_SECONDS = float(os.getenv("PERSIST_ORPHAN_SECONDS", "120"))
+
+# Firestore unavailable / overloaded / contended, as HTTP status (google.api_core errors carry it as .code)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Rewrite the journal once it holds this much already-flushed history
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+LATENCY_WINDOW = 200
+
+
+# ==========================================
+# 🧾 JOURNAL ENCODING
+# ==========================================
+# Payloads carry datetimes (createdAt); everything else must be plain JSON.
+# Anything else (e.g. a Firestore SERVER_TIMESTAMP sentinel) is refused at
+# enqueue rather than written back later as a string.
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"write-behind payloads can't carry {type(value).__name__} values")
+
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def is_retryable(error: BaseException) -> bool:
+    """An outage or timeout, not a problem with the payload: retry without counting it against the item."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    # google.api_core.exceptions.RetryError wraps the last error as .cause
+    cause = getattr(error, "cause", None)
+    return isinstance(cause, BaseException) and is_retryable(cause)
+
+
+def _worker_id() -> str:
+    # Unique across instances sharing the spill dir; '.' separates the parts of a file name
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}".replace(".", "-")
+
+
+# ==========================================
+# 📬 QUEUE
+# ==========================================
+
+class QueueFull(RuntimeError):
+    """The queue holds PERSIST_MAX_PENDING items; save synchronously instead."""
+
+
+class WriteBehindQueue:
+    """
+    One per kind of write. `commit(items)` must persist a list of items
+    atomically and idempotently (retries re-send the same items, so give
+    documents their IDs at enqueue time).
+    """
+
+    def __init__(self, name: str, commit: Callable[[List[Dict[str, Any]]], Awaitable[None]], spill_dir: Optional[str] = None):
+        self.name = name
+        self._commit = commit
+        spill_dir = spill_dir or PERSIST_SPILL_DIR
+        self._dir = Path(spill_dir) / name if spill_dir else None
+        self._worker_id = _worker_id()
+        self._journal_path = self._dir / f"{self._worker_id}.jsonl" if self._dir else None
+        self._journal = None  # only touched on the writer thread
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"write-behind-{name}")
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._draining = False
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {
+            "enqueued": 0, "flushed": 0, "batches": 0, "retries": 0,
+            "dead_lettered": 0, "replayed": 0, "refused": 0, "last_error": None,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done() and not self._draining
+
+    def has_room(self) -> bool:
+        return len(self._pending) < PERSIST_MAX_PENDING
+
+    async def _io(self, fn: Callable[..., Any], *args) -> Any:
+        # Journal work runs in submission order on the writer thread
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    # ------------------------------------------
+    # lifecycle
+    # ------------------------------------------
+
+    async def start(self):
+        if self._worker is not None:
+            return
+        if self._dir is None:
+            raise RuntimeError("write-behind needs PERSIST_SPILL_DIR (a volume that outlives the instance)")
+        await self._io(lambda: self._dir.mkdir(parents=True, exist_ok=True))
+        self._wakeup = asyncio.Event()
+        await self._rewrite_journal()
+        await self._adopt_orphans()
+        self._draining = False
+        self._worker = asyncio.create_task(self._run(), name=f"write-behind:{self.name}")
+        self._heartbeat = asyncio.create_task(self._beat(), name=f"write-behind-heartbeat:{self.name}")
+
+    async def drain(self, timeout: float = PERSIST_DRAIN_TIMEOUT):
+        """Flush everything still queued, then stop. What is left after `timeout` is handed to another worker."""
+        if self._worker is None:
+            return
+        self._draining = True
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline and not self._worker.done():
+            await asyncio.sleep(0.05)
+        for task in (self._worker, self._heartbeat):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._worker = self._heartbeat = None
+        if self._pending:
+            await self._rewrite_journal()
+            await self._io(self._hand_off)
+            print(f"⚠️ [WriteBehind:{self.name}] {len(self._pending)} writes left in {self._journal_path} for another worker")
+        else:
+            await self._io(self._remove_journal)
+
+    def _hand_off(self):
+        self._journal.close()
+        self._journal = None
+        # Backdated so the next worker's heartbeat adopts it right away
+        os.utime(self._journal_path, (0, 0))
+
+    def _remove_journal(self):
+        self._journal.close()
+        self._journal = None
+        self._journal_path.unlink(missing_ok=True)
+
+    # ------------------------------------------
+    # producer side
+    # ------------------------------------------
+
+    async def enqueue(self, item: Dict[str, Any]) -> str:
+        """
+        Journal `item`, queue it and return its id. Never waits on the network.
+        Raises TypeError for a payload that isn't plain JSON (plus datetimes)
+        and QueueFull when PERSIST_MAX_PENDING items are already waiting.
+        """
+        if not self.has_room():
+            self._stats["refused"] += 1
+            raise QueueFull(f"{len(self._pending)} writes already queued")
+        item = {**item, "id": item.get("id") or uuid.uuid4().hex, "queued_at": time.time(), "attempts": 0}
+        line = self._record({"op": "put", "item": item})
+        # Queued before the write is submitted, so a journal rewrite submitted meanwhile includes it
+        self._pending.append(item)
+        self._stats["enqueued"] += 1
+        await self._io(self._write, line)
+        self._wakeup.set()
+        return item["id"]
+
+    # ------------------------------------------
+    # worker
+    # ------------------------------------------
+
+    async def _run(self):
+        backoff = 0.0
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if backoff:
+                await asyncio.sleep(min(backoff, 1.0) if self._draining else backoff)
+            elif len(self._pending) < PERSIST_BATCH_SIZE and not self._draining:
+                # Let concurrent requests join this commit
+                await asyncio.sleep(PERSIST_FLUSH_INTERVAL)
+
+            # Items from a failed batch are committed one at a time, so a bad payload can't hold back the rest
+            size = 1 if self._pending[0].get("isolate") else PERSIST_BATCH_SIZE
+            batch = [self._pending[i] for i in range(min(size, len(self._pending)))]
+
+            started = time.perf_counter()
+            try:
+                await self._commit(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                backoff = await self._failed(batch, e, backoff)
+                continue
+
+            backoff = 0.0
+            self._latencies.append(time.perf_counter() - started)
+            self._stats["batches"] += 1
+            self._stats["flushed"] += len(batch)
+            for _ in batch:
+                self._pending.popleft()
+            journal_bytes = await self._io(self._write, self._record({"op": "done", "ids": [item["id"] for item in batch]}))
+            if not self._pending and journal_bytes > JOURNAL_COMPACT_BYTES:
+                await self._rewrite_journal()
+
+    async def _failed(self, batch: List[Dict[str, Any]], error: Exception, backoff: float) -> float:
+        self._stats["last_error"] = f"{error.__class__.__name__}: {str(error)[:200]}"
+        if is_retryable(error):
+            # Firestore is down or overloaded: nothing is wrong with the items, keep them however long it takes
+            self._stats["retries"] += 1
+            print(f"⚠️ [WriteBehind:{self.name}] commit of {len(batch)} failed, will retry: {self._stats['last_error']}")
+            return min(PERSIST_MAX_BACKOFF, max(0.5, backoff * 2))
+        # Rejected. Only a failure on its own counts against an item; a batch failure may be someone else's payload
+        for item in batch:
+            item["isolate"] = True
+        head = batch[0]
+        if len(batch) == 1:
+            head["attempts"] += 1
+        if head["attempts"] >= PERSIST_MAX_ATTEMPTS:
+            self._pending.popleft()
+            await self._dead_letter(head)
+            return 0.0
+        self._stats["retries"] += 1
+        print(f"⚠️ [WriteBehind:{self.name}] commit of {len(batch)} failed: {self._stats['last_error']}")
+        return min(PERSIST_MAX_BACKOFF, max(0.5, backoff * 2))
+
+    async def _dead_letter(self, item: Dict[str, Any]):
+        self._stats["dead_lettered"] += 1
+        done = self._record({"op": "done", "ids": [item["id"]]})
+        await self._io(self._write_dead_letter, self._record(item), done)
+        print(f"❌ [WriteBehind:{self.name}] gave up on {item['id']} after {item['attempts']} attempts; kept in dead_letter.jsonl")
+
+    # ------------------------------------------
+    # spill file (the sync methods below run on the writer thread, via _io)
+    # ------------------------------------------
+
+    @staticmethod
+    def _record(record: Dict[str, Any]) -> str:
+        return json.dumps(record, default=_encode, ensure_ascii=False) + "\n"
+
+    def _write(self, line: str) -> int:
+        """Appends one record; returns the journal's size."""
+        if self._journal is None:
+            return 0
+        self._journal.write(line)
+        self._journal.flush()
+        if PERSIST_FSYNC:
+            os.fsync(self._journal.fileno())
+        return self._journal.tell()
+
+    def _write_dead_letter(self, line: str, done: str):
+        with open(self._dir / "dead_letter.jsonl", "a", encoding="utf-8") as f:
+            f.write(line)
+        self._write(done)
+
+    async def _rewrite_journal(self):
+        lines = [self._record({"op": "put", "item": item}) for item in self._pending]
+        await self._io(self._rewrite_sync, lines)
+
+    def _rewrite_sync(self, lines: List[str]):
+        tmp = self._journal_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        if self._journal is not None:
+            self._journal.close()
+        os.replace(tmp, self._journal_path)
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(PERSIST_HEARTBEAT_SECONDS)
+            try:
+                await self._io(os.utime, self._journal_path)
+                await self._adopt_orphans()
+            except OSError as e:
+                print(f"⚠️ [WriteBehind:{self.name}] heartbeat failed: {e}")
+
+    async def _adopt_orphans(self):
+        """Queue the unflushed writes of every journal whose worker stopped heartbeating."""
+        claimed_paths, items = await self._io(self._claim_orphans)
+        if not claimed_paths:
+            return
+        known = {item["id"] for item in self._pending}
+        before = len(self._pending)
+        self._pending.extend(item for item_id, item in items.items() if item_id not in known)
+        # Replayed items go into this worker's journal before the old files are dropped
+        await self._rewrite_journal()
+        await self._io(lambda: [path.unlink(missing_ok=True) for path in claimed_paths])
+        replayed = len(self._pending) - before
+        if replayed:
+            self._stats["replayed"] += replayed
+            self._wakeup.set()
+            print(f"♻️ [WriteBehind:{self.name}] replaying {replayed} unflushed writes from disk")
+
+    def _claim_orphans(self):
+        claimed_paths: List[Path] = []
+        items: Dict[str, Dict[str, Any]] = {}
+        stale_before = time.time() - PERSIST_ORPHAN_SECONDS
+        for path in sorted(self._dir.glob("*.jsonl")) + sorted(self._dir.glob("*.claim")):
+            # <worker>.jsonl, or <worker>.<claimer>.claim left by a worker that died mid-replay
+            if path.name == "dead_letter.jsonl" or path == self._journal_path:
+                continue
+            try:
+                if path.stat().st_mtime > stale_before:
+                    continue  # a live worker's journal
+            except FileNotFoundError:
+                continue
+            # Claim it first so two workers can't both replay it
+            claimed = self._dir / f"{path.name.split('.')[0]}.{self._worker_id}.claim"
+            try:
+                os.replace(path, claimed)
+                os.utime(claimed)
+            except FileNotFoundError:
+                continue
+            self._replay(claimed, items)
+            claimed_paths.append(claimed)
+        return claimed_paths, items
+
+    @staticmethod
+    def _replay(path: Path, items: Dict[str, Dict[str, Any]]):
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            return  # taken by another worker in the same instant
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line, object_hook=_decode)
+                except ValueError:
+                    continue  # torn last line from a crash
+                if record.get("op") == "put":
+                    items[record["item"]["id"]] = record["item"]
+                elif record.get("op") == "done":
+                    for item_id in record.get("ids", []):
+                        items.pop(item_id, None)
+
+    # ------------------------------------------
+    # metrics
+    # ------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        oldest = self._pending[0]["queued_at"] if self._pending else None
+        return {
+            "enabled": PERSIST_WRITE_BEHIND,
+            "running": self.running,
+            "queue_depth": len(self._pending),
+            "max_pending": PERSIST_MAX_PENDING,
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+            **self._stats,
+            "flush_ms_avg": round(1000 * sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "flush_ms_p95": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 1) if latencies else 0.0,
+            "flush_ms_max": round(1000 * latencies[-1], 1) if latencies else 0.0,
+        }